@@ -0,0 +1,2 @@
+# Puts the app directory on sys.path so the tests import the service as src.*,
+# the same way uvicorn and the worker run it
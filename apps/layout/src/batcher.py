@@ -0,0 +1,181 @@
+"""
+Dynamic micro-batching for layout prediction.
+
+Concurrent /predict requests are collected into a queue and coalesced into a
+single LayoutPredictor.predict_batch call. A batch is dispatched as soon as it
+reaches LAYOUT_MAX_BATCH_SIZE requests or the oldest request has waited
+LAYOUT_MAX_BATCH_WAIT_MS, whichever comes first. Batches run on the shared
+InferenceExecutor; at most LAYOUT_MAX_BATCH_QUEUE requests may wait for a batch.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from .executor import InferenceExecutor, QueueFullError
+from .inference import PageImage, predict_batch
+from .metrics import BATCH_QUEUE_WAIT, BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest batch in the moving average of the batch fill ratio
+FILL_RATIO_ALPHA = 0.2
+
+
+@dataclass
+class _PendingRequest:
+    image: PageImage
+    request_id: str
+    future: asyncio.Future
+    timings: dict[str, float] | None = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """Coalesce single-image requests into batched forward passes."""
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue: int = 64,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.max_batch_size = max_batch_size
+        self.max_wait_sec = max(0.0, max_wait_ms) / 1000
+        self.max_queue = max_queue
+        self._executor = executor
+        self._queue: asyncio.Queue[_PendingRequest] = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self.fill_ratio = 0.0
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a batch."""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="layout-batcher")
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Layout batcher stopped"))
+
+    async def submit(
+        self,
+        image: PageImage,
+        request_id: str,
+        timings: dict[str, float] | None = None,
+    ) -> dict:
+        """
+        Enqueue an image and wait for its own prediction result.
+        If timings is given, the batch wait ("queue") and the stage timings of
+        the batch's forward pass are added to it.
+        Raises QueueFullError if max_queue requests are already waiting.
+        """
+        if self._queue.qsize() >= self.max_queue:
+            raise QueueFullError()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(image, request_id, future, timings))
+        if self._queue.qsize() >= self.max_batch_size - 1:
+            self._batch_full.set()
+        return await future
+
+    async def _collect(self) -> list[_PendingRequest]:
+        batch = [await self._queue.get()]
+
+        # The wait budget starts when the oldest request was enqueued, so time
+        # spent queued behind a running batch counts against it.
+        remaining = self.max_wait_sec - (time.perf_counter() - batch[0].enqueued_at)
+        if self.max_batch_size > 1 and remaining > 0:
+            self._batch_full.clear()
+            if self._queue.qsize() < self.max_batch_size - 1:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        # Callers that went away while queued do not get a slot in the batch
+        return [pending for pending in batch if not pending.future.done()]
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            dispatched_at = time.perf_counter()
+            for pending in batch:
+                BATCH_QUEUE_WAIT.observe(dispatched_at - pending.enqueued_at)
+            BATCH_SIZE.observe(len(batch))
+            # Close to 1 means batches leave full: requests arrive faster than
+            # the model drains them
+            self.fill_ratio += FILL_RATIO_ALPHA * (
+                len(batch) / self.max_batch_size - self.fill_ratio
+            )
+
+            batch_timings: dict[str, float] = {}
+            try:
+                # Admission already happened in submit(), a formed batch always runs
+                results = await self._executor.run(
+                    predict_batch,
+                    [pending.image for pending in batch],
+                    [pending.request_id for pending in batch],
+                    batch_timings,
+                    bounded=False,
+                )
+            except Exception as e:
+                logger.exception("Batch of %d failed: %s", len(batch), e)
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            for pending, result in zip(batch, results):
+                if pending.timings is not None:
+                    # Every request of the batch shares the same forward pass
+                    pending.timings["queue"] = pending.timings.get("queue", 0.0) + (
+                        dispatched_at - pending.enqueued_at
+                    )
+                    for stage, seconds in batch_timings.items():
+                        pending.timings[stage] = pending.timings.get(stage, 0.0) + seconds
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+
+def create_batcher(executor: InferenceExecutor) -> MicroBatcher:
+    """Create a MicroBatcher configured from the environment."""
+    max_batch_size = int(os.environ.get("LAYOUT_MAX_BATCH_SIZE", "8"))
+    max_wait_ms = float(os.environ.get("LAYOUT_MAX_BATCH_WAIT_MS", "10"))
+    max_queue = int(os.environ.get("LAYOUT_MAX_BATCH_QUEUE", "64"))
+    logger.info(
+        "Layout micro-batching with max_batch_size=%s, max_wait_ms=%s, max_queue=%s",
+        max_batch_size,
+        max_wait_ms,
+        max_queue,
+    )
+    return MicroBatcher(
+        executor,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        max_queue=max_queue,
+    )
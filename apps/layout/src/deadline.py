@@ -0,0 +1,158 @@
+"""
+Request deadlines and cancellation of abandoned requests.
+
+A request's deadline is X-Request-Timeout (seconds) if the client sends one,
+else LAYOUT_REQUEST_TIMEOUT_SECONDS (0 disables it). Routes that take up to
+LAYOUT_MAX_BATCH_PAGES pages (/predict_batch, /document, V2 infer) default to
+LAYOUT_BATCH_REQUEST_TIMEOUT_SECONDS instead, no deadline unless set: one
+fixed limit can not fit both a single page and a 300-page document. A client
+can only shorten the server default. The deadline is stored as an absolute
+time.monotonic() value in request.state.deadline. /document hands it to
+TFPredictor.multi_table_predict, which checks it between tables and between
+decode steps and raises DeadlineExceeded (a TimeoutError).
+
+The request itself runs as a task that is cancelled when the client
+disconnects or the deadline passes before the response has started.
+Cancelling drops work still waiting in the tenant scheduler, the micro-batcher
+or the executor queue; work already running on an executor thread stops at
+its next deadline check.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from .encoding import dumps
+from .metrics import REQUESTS_TOTAL
+
+HEADER = "x-request-timeout"
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("LAYOUT_REQUEST_TIMEOUT_SECONDS", "120"))
+# Default for routes whose work grows with the number of pages
+BATCH_TIMEOUT_SECONDS = float(
+    os.environ.get("LAYOUT_BATCH_REQUEST_TIMEOUT_SECONDS", "0")
+)
+
+logger = logging.getLogger("layout")
+
+
+def request_timeout(
+    headers: list[tuple[bytes, bytes]],
+    default_timeout: float = DEFAULT_TIMEOUT_SECONDS,
+) -> float | None:
+    """Seconds this request may take, None if it has no deadline."""
+    default = default_timeout if default_timeout > 0 else None
+    for name, value in headers:
+        if name.decode("latin-1").lower() != HEADER:
+            continue
+        try:
+            timeout = float(value)
+        except ValueError:
+            return default
+        if timeout <= 0:
+            return default
+        return timeout if default is None else min(timeout, default)
+    return default
+
+
+class DeadlineMiddleware:
+    """
+    Set request.state.deadline and cancel requests nobody is waiting for.
+    path_timeouts replaces the server default for the given paths.
+    """
+
+    def __init__(self, app, path_timeouts: dict[str, float] | None = None):
+        self.app = app
+        self.path_timeouts = path_timeouts or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = request_timeout(
+            scope["headers"],
+            self.path_timeouts.get(scope["path"], DEFAULT_TIMEOUT_SECONDS),
+        )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        scope.setdefault("state", {})["deadline"] = deadline
+
+        body_received = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def receive_wrapper():
+            # Once the body is in, the watcher below owns receive()
+            if body_received.is_set():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_received.set()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        async def watch_disconnect():
+            await body_received.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        task = asyncio.create_task(self.app(scope, receive_wrapper, send_wrapper))
+        watcher = asyncio.create_task(watch_disconnect())
+        gone = asyncio.create_task(disconnected.wait())
+        try:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            await asyncio.wait(
+                {task, gone}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if task.done() or response_started:
+                # A started response is finished, streaming responses handle
+                # the disconnect themselves
+                await task
+                return
+
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+            if disconnected.is_set():
+                logger.info(
+                    "path=%s status=cancelled reason=client_disconnected",
+                    scope["path"],
+                )
+                REQUESTS_TOTAL.labels(status="cancelled").inc()
+                return
+
+            logger.warning(
+                "path=%s status_code=504 timeout_s=%.3f error=Deadline exceeded",
+                scope["path"],
+                timeout,
+            )
+            REQUESTS_TOTAL.labels(status="timeout").inc()
+            if not response_started:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 504,
+                        "headers": [(b"content-type", b"application/json")],
+                    }
+                )
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": dumps({"detail": "Deadline exceeded"}),
+                    }
+                )
+        finally:
+            watcher.cancel()
+            gone.cancel()
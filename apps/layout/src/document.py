@@ -0,0 +1,162 @@
+"""
+In-process layout -> table pipeline behind /document.
+
+The page is decoded once and run through LayoutPredictor; the regions labelled
+Table are passed straight to TFPredictor.multi_table_predict on the same
+decoded pixels. Without this the client uploads the full page twice (layout
+service, then table service) and it is decoded twice. Pages without tables
+never touch the table model.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from .inference import PageImage, _page_scale
+from .metrics import DOCUMENT_TABLES
+
+TABLE_LABEL = "Table"
+# TFPredictor resizes the page to this height before cropping the tables
+TABLE_PAGE_HEIGHT = 1024
+
+
+def draft_size(layout_input_size: tuple[int, int] | None) -> tuple[int, int] | None:
+    """
+    Smallest decode size that loses nothing for either model: the layout
+    input size, but at least TABLE_PAGE_HEIGHT high.
+    """
+    if layout_input_size is None:
+        return None
+    width, height = layout_input_size
+    return width, max(height, TABLE_PAGE_HEIGHT)
+
+
+def count_tables(layout_result: dict) -> int:
+    return sum(1 for box in layout_result["boxes"] if box["text"] == TABLE_LABEL)
+
+
+def _to_bgr(image: PageImage) -> np.ndarray:
+    # TFPredictor expects BGR pixels (cv2 format)
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+def _build_iocr_page(image: np.ndarray, table_bboxes: list[list[int]]) -> dict:
+    """Minimal iocr_page for TFPredictor: the page image and no text tokens."""
+    height, width = image.shape[:2]
+    return {
+        "width": width,
+        "height": height,
+        "image": image,
+        "tokens": [],
+        "table_bboxes": [list(bbox) for bbox in table_bboxes],
+    }
+
+
+def _table_result(
+    table_index: int, box_index: int, tf_output: dict, scale: tuple[float, float]
+) -> dict:
+    """One table, shaped like schemas.DocumentTable, in original page coordinates."""
+    sx, sy = scale
+    cells = []
+    for r in tf_output["tf_responses"]:
+        bbox = r.get("bbox", {})
+        if isinstance(bbox, dict):
+            b = {
+                "l": float(bbox["l"]) * sx,
+                "t": float(bbox["t"]) * sy,
+                "r": float(bbox["r"]) * sx,
+                "b": float(bbox["b"]) * sy,
+            }
+        else:
+            b = {"l": 0.0, "t": 0.0, "r": 0.0, "b": 0.0}
+        cells.append(
+            {
+                "bbox": b,
+                "start_row_offset_idx": int(r.get("start_row_offset_idx", 0)),
+                "end_row_offset_idx": int(r.get("end_row_offset_idx", 0)),
+                "start_col_offset_idx": int(r.get("start_col_offset_idx", 0)),
+                "end_col_offset_idx": int(r.get("end_col_offset_idx", 0)),
+                "row_span": int(r.get("row_span", 1)),
+                "col_span": int(r.get("col_span", 1)),
+                "column_header": bool(r.get("column_header", False)),
+                "row_header": bool(r.get("row_header", False)),
+                "row_section": bool(r.get("row_section", False)),
+            }
+        )
+    predict_details = tf_output["predict_details"]
+    return {
+        "table_index": table_index,
+        "box_index": box_index,
+        "num_rows": int(predict_details.get("num_rows", 0)),
+        "num_cols": int(predict_details.get("num_cols", 0)),
+        "cells": cells,
+    }
+
+
+def predict_tables(
+    image: PageImage,
+    layout_result: dict,
+    timings: dict[str, float] | None = None,
+    deadline: float | None = None,
+) -> tuple[list[dict], float]:
+    """
+    Run TableFormer on the Table regions of a layout result.
+    Returns the tables and the table model latency in ms; ([], 0.0) without
+    loading the model if the page has no tables.
+    If timings is given, seconds per stage are added to it as table_<stage>.
+    deadline (absolute time.monotonic()) is checked between tables and decode steps.
+    """
+    regions = [
+        (box_index, box)
+        for box_index, box in enumerate(layout_result["boxes"])
+        if box["text"] == TABLE_LABEL
+    ]
+    DOCUMENT_TABLES.observe(len(regions))
+    if not regions:
+        return [], 0.0
+
+    from .model_loader import get_table_predictor
+
+    predictor = get_table_predictor()
+
+    # Layout boxes are in original page coordinates, the pixels may be a
+    # reduced decode
+    sx, sy = _page_scale(image)
+    table_bboxes = [
+        [round(box["x1"] / sx), round(box["y1"] / sy), round(box["x2"] / sx), round(box["y2"] / sy)]
+        for _, box in regions
+    ]
+
+    t0 = time.perf_counter()
+    page = _to_bgr(image)
+    iocr_page = _build_iocr_page(page, table_bboxes)
+    table_timings = {"preprocess": time.perf_counter() - t0}
+
+    t0 = time.perf_counter()
+    # multi_table_predict scales the bboxes in place
+    tf_outputs = predictor.multi_table_predict(
+        iocr_page,
+        [list(bbox) for bbox in table_bboxes],
+        do_matching=True,
+        correct_overlapping_cells=False,
+        sort_row_col_indexes=True,
+        timings=table_timings,
+        deadline=deadline,
+    )
+    latency_sec = time.perf_counter() - t0
+
+    tables = [
+        _table_result(table_index, box_index, tf_output, (sx, sy))
+        for table_index, ((box_index, _), tf_output) in enumerate(
+            zip(regions, tf_outputs)
+        )
+    ]
+    table_timings["postprocess"] = (
+        table_timings.get("postprocess", 0.0) + time.perf_counter() - t0 - latency_sec
+    )
+    if timings is not None:
+        for stage, seconds in table_timings.items():
+            key = f"table_{stage}"
+            timings[key] = timings.get(key, 0.0) + seconds
+    return tables, latency_sec * 1000
@@ -0,0 +1,74 @@
+"""
+Mapping of request handler errors to HTTP responses.
+
+Every POST handler runs inside request_errors(), so the status codes, the
+REQUESTS_TOTAL labels, the log lines and the Retry-After header are the same
+for all routes:
+
+- HTTPException: raised as-is, status "error"
+- TenantQueueFullError: 429 with Retry-After, status "throttled"
+- QueueFullError: 503 with Retry-After, status "rejected"
+- TimeoutError (DeadlineExceeded from TFPredictor): 504, status "timeout"
+- anything else: 500, status "error"
+"""
+
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from .executor import QueueFullError
+from .metrics import REQUESTS_TOTAL
+from .scheduler import TenantQueueFullError
+
+logger = logging.getLogger("layout")
+
+
+def _retry_later(status_code: int, e: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@contextmanager
+def request_errors(
+    tenant_id: str,
+    request_id: str | None = None,
+    start_time: float | None = None,
+) -> Iterator[None]:
+    """Turn the errors raised in the block into HTTP errors, see module docstring."""
+    ids = f"tenant_id={tenant_id}"
+    if request_id is not None:
+        ids = f"request_id={request_id} {ids}"
+    try:
+        yield
+    except HTTPException:
+        REQUESTS_TOTAL.labels(status="error").inc()
+        raise
+    except TenantQueueFullError as e:
+        logger.warning("%s status_code=429 error=%s", ids, e)
+        REQUESTS_TOTAL.labels(status="throttled").inc()
+        raise _retry_later(429, e)
+    except QueueFullError as e:
+        logger.warning("%s status_code=503 error=%s", ids, e)
+        REQUESTS_TOTAL.labels(status="rejected").inc()
+        raise _retry_later(503, e)
+    except TimeoutError as e:
+        # The request ran out of time
+        logger.warning("%s status_code=504 error=%s", ids, e)
+        REQUESTS_TOTAL.labels(status="timeout").inc()
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        if start_time is None:
+            logger.exception("%s status_code=500 error=%s", ids, str(e))
+        else:
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            logger.exception(
+                "%s status_code=500 latency_ms=%.2f error=%s", ids, latency_ms, str(e)
+            )
+        REQUESTS_TOTAL.labels(status="error").inc()
+        raise HTTPException(status_code=500, detail=str(e))
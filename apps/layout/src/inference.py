@@ -4,13 +4,76 @@ Inference logic for layout prediction.
 
 import time
 
+import numpy as np
 from PIL import Image
 
+from .ingest import original_size
 from .metrics import INFERENCE_LATENCY, REGIONS_PER_REQUEST
-from .schemas import Box, PredictResponse
 
+# Decoded page, or raw pixels passed straight through to LayoutPredictor
+PageImage = Image.Image | np.ndarray
 
-def predict(image: Image.Image, request_id: str) -> PredictResponse:
+
+def _page_scale(image: PageImage) -> tuple[float, float]:
+    """Factors mapping coordinates of a reduced decode back to the original page."""
+    if isinstance(image, np.ndarray):
+        return 1.0, 1.0
+    orig_w, orig_h = original_size(image)
+    w, h = image.size
+    return orig_w / w, orig_h / h
+
+
+def _add_postprocess(timings: dict[str, float] | None, since: float) -> None:
+    """Count building the API response as part of post-processing."""
+    if timings is not None:
+        timings["postprocess"] = (
+            timings.get("postprocess", 0.0) + time.perf_counter() - since
+        )
+
+
+def _to_response(
+    raw_predictions: list[dict],
+    request_id: str,
+    latency_ms: float,
+    scale: tuple[float, float] = (1.0, 1.0),
+    page_index: int | None = None,
+) -> dict:
+    """
+    Build the API response (shaped like schemas.PredictResponse) from raw
+    LayoutPredictor predictions. Plain dicts skip pydantic model construction
+    and validation; the predictor output is already well-formed.
+    page_index is only set for the pages of a document.
+    """
+    sx, sy = scale
+    boxes = [
+        {
+            "x1": pred["l"] * sx,
+            "y1": pred["t"] * sy,
+            "x2": pred["r"] * sx,
+            "y2": pred["b"] * sy,
+            "text": pred["label"],
+            "conf": pred["confidence"],
+        }
+        for pred in raw_predictions
+    ]
+
+    confidences = [pred["confidence"] for pred in raw_predictions]
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    text = ", ".join(pred["label"] for pred in raw_predictions)
+
+    response = {
+        "request_id": request_id,
+        "text": text,
+        "confidence": round(avg_confidence, 4),
+        "latency_ms": round(latency_ms, 2),
+        "boxes": boxes,
+    }
+    if page_index is not None:
+        response["page_index"] = page_index
+    return response
+
+
+def predict(image: PageImage, request_id: str) -> dict:
     """Run layout prediction on an image."""
     from .model_loader import get_predictor
 
@@ -19,33 +82,95 @@ def predict(image: Image.Image, request_id: str) -> PredictResponse:
     t0 = time.perf_counter()
     raw_predictions = list(predictor.predict(image))
     latency_sec = time.perf_counter() - t0
-    latency_ms = latency_sec * 1000
 
     INFERENCE_LATENCY.observe(latency_sec)
     REGIONS_PER_REQUEST.observe(len(raw_predictions))
 
-    boxes = []
-    confidences = []
-    for pred in raw_predictions:
-        boxes.append(
-            Box(
-                x1=pred["l"],
-                y1=pred["t"],
-                x2=pred["r"],
-                y2=pred["b"],
-                text=pred["label"],
-                conf=pred["confidence"],
+    return _to_response(
+        raw_predictions, request_id, latency_sec * 1000, _page_scale(image)
+    )
+
+
+def predict_batch(
+    images: list[PageImage],
+    request_ids: list[str],
+    timings: dict[str, float] | None = None,
+    first_page_index: int | None = None,
+) -> list[dict]:
+    """
+    Run layout prediction on several images in one forward pass.
+    Returns one response per image, in input order.
+    If timings is given, seconds per stage are added to it.
+    If first_page_index is given, the images are consecutive pages of a document
+    and every response gets its page_index.
+    """
+    from .model_loader import get_predictor
+
+    predictor = get_predictor()
+
+    t0 = time.perf_counter()
+    batch_predictions = predictor.predict_batch(images, timings=timings)
+    latency_sec = time.perf_counter() - t0
+
+    INFERENCE_LATENCY.observe(latency_sec)
+
+    responses = []
+    for offset, (image, raw_predictions, request_id) in enumerate(
+        zip(images, batch_predictions, request_ids)
+    ):
+        REGIONS_PER_REQUEST.observe(len(raw_predictions))
+        responses.append(
+            _to_response(
+                raw_predictions,
+                request_id,
+                latency_sec * 1000,
+                _page_scale(image),
+                page_index=None if first_page_index is None else first_page_index + offset,
             )
         )
-        confidences.append(pred["confidence"])
+    _add_postprocess(timings, t0 + latency_sec)
+    return responses
+
+
+def plan_chunks(
+    page_sizes: list[tuple[int, int]],
+    memory_budget_bytes: int,
+    page_overhead_bytes: int,
+) -> list[range]:
+    """
+    Split pages into consecutive chunks that fit the memory budget.
+    A page costs its decoded RGB size (w * h * 3) plus a fixed per-page
+    overhead for the model input and activations. Every chunk holds at least
+    one page, even if that page alone exceeds the budget.
+    """
+    chunks = []
+    start = 0
+    used = 0
+    for i, (w, h) in enumerate(page_sizes):
+        cost = w * h * 3 + page_overhead_bytes
+        if i > start and used + cost > memory_budget_bytes:
+            chunks.append(range(start, i))
+            start = i
+            used = 0
+        used += cost
+    if start < len(page_sizes):
+        chunks.append(range(start, len(page_sizes)))
+    return chunks
 
-    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-    text = ", ".join(pred["label"] for pred in raw_predictions)
 
-    return PredictResponse(
-        request_id=request_id,
-        text=text,
-        confidence=round(avg_confidence, 4),
-        latency_ms=round(latency_ms, 2),
-        boxes=boxes,
+def predict_pages(
+    images: list[Image.Image],
+    request_id: str,
+    first_page_index: int = 0,
+    timings: dict[str, float] | None = None,
+) -> list[dict]:
+    """
+    Run one predict_batch call over a chunk of pages of the same document.
+    If timings is given, seconds per stage are added to it.
+    """
+    return predict_batch(
+        images,
+        [request_id] * len(images),
+        timings=timings,
+        first_page_index=first_page_index,
     )
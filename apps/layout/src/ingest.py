@@ -0,0 +1,187 @@
+"""
+Upload ingest for the layout service: read the body once, decode once.
+
+- The upload is read in a single call from Starlette's spooled temp file into
+  one bytes object (no incremental concatenation).
+- JPEGs are decoded with PIL draft() at the largest DCT reduction that still
+  covers the model input size, since the image processor downscales anyway.
+  The original page size is kept so boxes are reported in page coordinates.
+- The decoded RGB image is handed to LayoutPredictor as-is (no further
+  conversion or numpy round-trip).
+- Raw uint8 pixels (.npy, or octet-stream with X-Image-Shape) skip the codec
+  entirely: the upload bytes are wrapped with np.frombuffer.
+"""
+
+import io
+import math
+
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+_ORIGINAL_SIZE_KEY = "original_size"
+
+PIXEL_CONTENT_TYPES = {"application/octet-stream", "application/x-npy"}
+SHAPE_HEADER = "X-Image-Shape"
+DTYPE_HEADER = "X-Image-Dtype"
+CHANNEL_ORDER_HEADER = "X-Image-Channel-Order"
+
+_NPY_MAGIC = b"\x93NUMPY"
+_NPY_HEADER_READERS = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded file into memory, enforcing the size limit before reading."""
+    max_mb = max_bytes // (1024 * 1024)
+    if file.size is not None:
+        if file.size > max_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"Image too large. Max size: {max_mb}MB"
+            )
+        content = await file.read()
+    else:
+        buf = bytearray()
+        while chunk := await file.read(1024 * 1024):
+            buf += chunk
+            if len(buf) > max_bytes:
+                raise HTTPException(
+                    status_code=413, detail=f"Image too large. Max size: {max_mb}MB"
+                )
+        content = bytes(buf)
+
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty file")
+    return content
+
+
+def decode_image(
+    content: bytes, draft_size: tuple[int, int] | None = None
+) -> Image.Image:
+    """
+    Decode an encoded image to RGB.
+
+    draft_size: (width, height) the model resizes its input to. For JPEGs the
+    decoder may then produce a smaller image (1/2, 1/4 or 1/8 scale) that is
+    still at least that large in both dimensions.
+    """
+    image = Image.open(io.BytesIO(content))
+    original_size = image.size
+    if draft_size is not None and image.format == "JPEG":
+        image.draft("RGB", draft_size)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+    image.info[_ORIGINAL_SIZE_KEY] = original_size
+    return image
+
+
+def original_size(image: Image.Image) -> tuple[int, int]:
+    """Size of the page before any reduced decoding."""
+    return image.info.get(_ORIGINAL_SIZE_KEY, image.size)
+
+
+def is_pixel_upload(file: UploadFile) -> bool:
+    """Whether the upload is a raw pixel buffer (.npy or octet-stream) rather than an encoded image."""
+    content_type = (file.content_type or "").split(";")[0].strip().lower()
+    filename = (file.filename or "").lower()
+    return content_type in PIXEL_CONTENT_TYPES or filename.endswith(".npy")
+
+
+def _wrap_buffer(content: bytes, shape: tuple[int, ...], offset: int = 0) -> np.ndarray:
+    if (
+        len(shape) not in (2, 3)
+        or min(shape) < 1
+        or (len(shape) == 3 and shape[2] not in (1, 3, 4))
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Pixels must be HxW or HxWxC with C in (1, 3, 4), got shape {shape}",
+        )
+    expected = math.prod(shape)
+    if len(content) - offset != expected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Pixel buffer has {len(content) - offset} bytes, shape {shape} needs {expected}",
+        )
+    return np.frombuffer(content, dtype=np.uint8, count=expected, offset=offset).reshape(
+        shape
+    )
+
+
+def _wrap_npy(content: bytes) -> np.ndarray:
+    fp = io.BytesIO(content)
+    try:
+        version = np.lib.format.read_magic(fp)
+        read_header = _NPY_HEADER_READERS.get(version)
+        if read_header is None:
+            raise ValueError(f"unsupported format version {version}")
+        shape, fortran_order, dtype = read_header(fp)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid .npy payload: {e}")
+    if fortran_order:
+        raise HTTPException(
+            status_code=400, detail="Fortran-ordered .npy arrays are not supported"
+        )
+    if dtype != np.uint8:
+        raise HTTPException(
+            status_code=400, detail=f"Only uint8 pixels are supported, got {dtype}"
+        )
+    return _wrap_buffer(content, shape, offset=fp.tell())
+
+
+def _wrap_raw(content: bytes, headers) -> np.ndarray:
+    shape_header = headers.get(SHAPE_HEADER)
+    if not shape_header:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{SHAPE_HEADER} header (H,W,C) is required for raw pixel input",
+        )
+    try:
+        shape = tuple(int(dim) for dim in shape_header.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid {SHAPE_HEADER}: {shape_header!r}"
+        )
+    dtype = headers.get(DTYPE_HEADER, "uint8").strip().lower()
+    if dtype != "uint8":
+        raise HTTPException(
+            status_code=400, detail=f"Only uint8 pixels are supported, got {dtype}"
+        )
+    return _wrap_buffer(content, shape)
+
+
+def wrap_pixels(content: bytes, headers) -> np.ndarray:
+    """
+    Wrap a raw uint8 pixel buffer as an HxW or HxWxC array without copying.
+
+    .npy payloads carry their own shape and dtype; otherwise the buffer is
+    described by X-Image-Shape (H,W,C) and X-Image-Dtype (only uint8).
+    """
+    if content.startswith(_NPY_MAGIC):
+        return _wrap_npy(content)
+    return _wrap_raw(content, headers)
+
+
+def channel_order(headers) -> str:
+    """Channel order of raw pixel input: RGB (default) or BGR."""
+    order = headers.get(CHANNEL_ORDER_HEADER, "RGB").strip().upper()
+    if order not in ("RGB", "BGR"):
+        raise HTTPException(
+            status_code=400, detail=f"{CHANNEL_ORDER_HEADER} must be RGB or BGR"
+        )
+    return order
+
+
+def pixels_to_rgb(array: np.ndarray, order: str) -> np.ndarray:
+    """View raw pixels in the RGB(A) order LayoutPredictor expects, copying only BGRA."""
+    if array.ndim == 3 and array.shape[2] == 1:
+        return array[..., 0]
+    if order == "RGB" or array.ndim == 2:
+        return array
+    if array.shape[2] == 3:
+        return array[..., ::-1]
+    return array[..., [2, 1, 0, 3]]
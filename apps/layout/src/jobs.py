@@ -0,0 +1,367 @@
+"""
+Durable job queue behind the asynchronous /jobs API.
+
+POST /jobs stores the uploaded pages and returns a job id right away; worker
+processes (python -m src.worker) claim queued jobs, run inference and store
+the result, which clients poll with GET /jobs/{id}. Bursts wait in the queue
+instead of in open connections, and workers scale on the queue depth
+(layout_job_queue_depth{status="queued"}) independently of the API pods.
+
+Backends implement JobQueue and are selected by LAYOUT_JOB_BACKEND:
+- sqlite (default): job rows in a SQLite database under LAYOUT_JOBS_DIR, page
+  and result bytes as files next to it; needs no external service. API and
+  workers must share the directory (same host or a volume with working file
+  locks, not NFS).
+
+A claimed job is leased for LAYOUT_JOB_LEASE_SECONDS and the worker renews the
+lease while it runs. If the worker dies, the job is handed out again once the
+lease expires, at most LAYOUT_JOB_MAX_ATTEMPTS times in total.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .metrics import JOB_QUEUE_DEPTH, JOB_QUEUE_OLDEST
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    params: dict = field(default_factory=dict)
+    tenant_id: str = ""
+    num_inputs: int = 0
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+    attempts: int = 0
+    error: str | None = None
+
+
+@dataclass
+class QueueStats:
+    counts: dict[str, int]
+    oldest_queued_seconds: float = 0.0
+
+
+class JobQueue(ABC):
+    """Storage and hand-out of jobs; shared by the API and the workers."""
+
+    # Workers renew the lease of a running job well within this interval
+    lease_seconds: float = 60.0
+
+    @abstractmethod
+    def submit(self, inputs: list[bytes], params: dict, tenant_id: str = "") -> Job:
+        """Store a new job with its input payloads and queue it."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Job | None:
+        """Current state of a job, or None if it does not exist (or was purged)."""
+
+    @abstractmethod
+    def inputs(self, job_id: str) -> list[bytes]:
+        """Input payloads of a job, in submission order."""
+
+    @abstractmethod
+    def result(self, job_id: str) -> bytes | None:
+        """Serialized result of a succeeded job."""
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Job | None:
+        """Lease the oldest runnable job to a worker; None if there is none."""
+
+    @abstractmethod
+    def renew(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease of a running job; False if the worker lost it."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: bytes) -> None:
+        """Store the result of a job and mark it succeeded."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Mark a job failed."""
+
+    @abstractmethod
+    def stats(self) -> QueueStats:
+        """Number of jobs per status and age of the oldest queued job."""
+
+    @abstractmethod
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs older than the given age; returns how many."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    num_inputs INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+_JOB_COLUMNS = (
+    "id, status, params, tenant_id, num_inputs, created_at, started_at, "
+    "finished_at, attempts, error"
+)
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job rows in SQLite (WAL mode), payloads and results as files."""
+
+    def __init__(
+        self,
+        jobs_dir: str,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = self.jobs_dir / "jobs.db"
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: callers are executor threads,
+        # worker processes and forked API workers
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id[:2] / job_id
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        return Job(
+            id=row[0],
+            status=row[1],
+            params=json.loads(row[2]),
+            tenant_id=row[3],
+            num_inputs=row[4],
+            created_at=row[5],
+            started_at=row[6],
+            finished_at=row[7],
+            attempts=row[8],
+            error=row[9],
+        )
+
+    def submit(self, inputs: list[bytes], params: dict, tenant_id: str = "") -> Job:
+        job = Job(
+            id=uuid.uuid4().hex,
+            status=QUEUED,
+            params=params,
+            tenant_id=tenant_id,
+            num_inputs=len(inputs),
+            created_at=time.time(),
+        )
+        # Payloads are written before the row exists, so a worker never
+        # claims a job whose inputs are incomplete
+        job_dir = self._job_dir(job.id)
+        job_dir.mkdir(parents=True)
+        for i, content in enumerate(inputs):
+            self._write_atomic(job_dir / f"input-{i:05d}", content)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, tenant_id, num_inputs, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.status,
+                    json.dumps(params),
+                    tenant_id,
+                    job.num_inputs,
+                    job.created_at,
+                ),
+            )
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def inputs(self, job_id: str) -> list[bytes]:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        job_dir = self._job_dir(job_id)
+        return [
+            (job_dir / f"input-{i:05d}").read_bytes() for i in range(job.num_inputs)
+        ]
+
+    def result(self, job_id: str) -> bytes | None:
+        try:
+            return (self._job_dir(job_id) / "result.json").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def claim(self, worker_id: str) -> Job | None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so two workers can not
+            # select the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, lease_expires = NULL, "
+                    "error = 'Worker lost while running the job' "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, now, RUNNING, now, self.max_attempts),
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? "
+                    "OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, "
+                    "worker_id = ?, lease_expires = ? WHERE id = ?",
+                    (RUNNING, now, worker_id, now + self.lease_seconds, row[0]),
+                )
+                job_row = conn.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (row[0],)
+                ).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(job_row)
+
+    def renew(self, job_id: str, worker_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, worker_id, RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def _finish(
+        self, job_id: str, worker_id: str, status: str, error: str | None
+    ) -> None:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_expires = NULL, "
+                "error = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (status, time.time(), error, job_id, worker_id, RUNNING),
+            )
+        if cursor.rowcount != 1:
+            logger.warning(
+                "job_id=%s worker_id=%s lost its lease, %s result dropped",
+                job_id,
+                worker_id,
+                status,
+            )
+
+    def complete(self, job_id: str, worker_id: str, result: bytes) -> None:
+        self._write_atomic(self._job_dir(job_id) / "result.json", result)
+        self._finish(job_id, worker_id, SUCCEEDED, None)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._finish(job_id, worker_id, FAILED, error)
+
+    def stats(self) -> QueueStats:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*), MIN(created_at) FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        oldest_queued = 0.0
+        for status, count, oldest in rows:
+            counts[status] = count
+            if status == QUEUED and oldest is not None:
+                oldest_queued = max(0.0, time.time() - oldest)
+        return QueueStats(counts=counts, oldest_queued_seconds=oldest_queued)
+
+    def purge(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with closing(self._connect()) as conn:
+            job_ids = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (SUCCEEDED, FAILED, cutoff),
+                )
+            ]
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in job_ids])
+        for job_id in job_ids:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        return len(job_ids)
+
+
+def observe_queue(job_queue: JobQueue) -> QueueStats:
+    """Publish the queue depth gauges; called on /metrics scrapes and by workers."""
+    stats = job_queue.stats()
+    for status, count in stats.counts.items():
+        JOB_QUEUE_DEPTH.labels(status=status).set(count)
+    JOB_QUEUE_OLDEST.set(stats.oldest_queued_seconds)
+    return stats
+
+
+_BACKENDS: dict[str, type[JobQueue]] = {"sqlite": SQLiteJobQueue}
+
+
+def create_job_queue() -> JobQueue:
+    """Create the JobQueue backend configured from the environment."""
+    backend = os.environ.get("LAYOUT_JOB_BACKEND", "sqlite").lower()
+    if backend not in _BACKENDS:
+        raise ValueError(
+            f"Unknown LAYOUT_JOB_BACKEND={backend!r}, expected one of {sorted(_BACKENDS)}"
+        )
+    jobs_dir = os.environ.get("LAYOUT_JOBS_DIR", "/tmp/layout-jobs")
+    lease_seconds = float(os.environ.get("LAYOUT_JOB_LEASE_SECONDS", "60"))
+    max_attempts = int(os.environ.get("LAYOUT_JOB_MAX_ATTEMPTS", "3"))
+    logger.info(
+        "Layout job queue with backend=%s, jobs_dir=%s, lease_seconds=%s, max_attempts=%s",
+        backend,
+        jobs_dir,
+        lease_seconds,
+        max_attempts,
+    )
+    return _BACKENDS[backend](
+        jobs_dir=jobs_dir, lease_seconds=lease_seconds, max_attempts=max_attempts
+    )
@@ -2,30 +2,91 @@
 FastAPI Layout inference service.
 
 Endpoints:
-- GET  /healthz  - Health check
-- POST /predict  - Layout prediction (multipart/form-data: file=@image)
+- GET  /healthz  - Health check (never loads the model)
+- GET  /livez    - Liveness probe
+- GET  /readyz   - Readiness probe: passes once the model is loaded and warmed up
+- POST /predict  - Layout prediction (multipart/form-data: file=@image, or raw uint8 pixels as .npy / octet-stream)
+- POST /predict_batch - Multi-page layout prediction (multipart/form-data: files=@page1 files=@page2 ...)
+                        ?stream=true or Accept: application/x-ndjson streams one JSON line per page
+- POST /jobs     - Queue a multi-page layout job (multipart/form-data: files=@page1 ...), returns a job id
+- GET  /jobs/{job_id} - Job status, and the result once it succeeded
+- POST /document - Layout prediction plus the structure of every detected table (file=@image)
 - GET  /metrics  - Prometheus metrics
+- GET  /saturation - Saturation signals of this worker for autoscaling (JSON)
+- KServe V2 / Open Inference Protocol, with the binary tensor data extension (see v2.py):
+  GET /v2, /v2/health/live, /v2/health/ready, /v2/models/{name}, /v2/models/{name}/ready
+  POST /v2/models/{name}/infer
 """
 
+import asyncio
+import functools
 import io
 import logging
+import os
 import time
 import uuid
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, File, HTTPException, Request, UploadFile
-from fastapi.responses import Response
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import StreamingResponse
 from PIL import Image
-from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from .inference import predict
-from .metrics import REQUESTS_TOTAL
-from .model_loader import get_predictor, is_ready
-from .schemas import PredictResponse
+from . import v2
+from .batcher import create_batcher
+from .cache import ResultCache, create_cache, is_bypassed
+from .deadline import BATCH_TIMEOUT_SECONDS, DeadlineMiddleware
+from .document import count_tables, draft_size, predict_tables
+from .encoding import (
+    StreamCompressor,
+    compress,
+    dumps,
+    encoding_headers,
+    loads,
+    negotiate,
+)
+from .errors import request_errors
+from .executor import QueueFullError, create_executor
+from .ingest import (
+    channel_order,
+    decode_image,
+    is_pixel_upload,
+    pixels_to_rgb,
+    read_upload,
+    wrap_pixels,
+)
+from .inference import plan_chunks, predict_pages
+from .jobs import QUEUED, SUCCEEDED, Job, JobQueue, create_job_queue, observe_queue
+from .metrics import JOBS_TOTAL, REQUESTS_TOTAL, render_metrics
+from .model_loader import (
+    input_size,
+    model_backend,
+    model_identity,
+    model_name,
+    table_model_identity,
+)
+from .scheduler import create_scheduler
+from .schemas import (
+    BatchPredictResponse,
+    DocumentResponse,
+    JobResponse,
+    PredictResponse,
+)
+from .saturation import InflightMiddleware, SaturationMonitor
+from .timing import ArrivalTimeMiddleware, StageTimer
+from .warmup import load_and_warm_up
 
 MAX_IMAGE_SIZE_MB = 50
 MAX_IMAGE_SIZE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024
 ALLOWED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/jpg", "image/webp"}
+MAX_BATCH_PAGES = int(os.environ.get("LAYOUT_MAX_BATCH_PAGES", "300"))
+BATCH_MEMORY_BYTES = int(os.environ.get("LAYOUT_BATCH_MEMORY_MB", "1024")) * 1024 * 1024
+PAGE_OVERHEAD_BYTES = int(os.environ.get("LAYOUT_PAGE_MEMORY_MB", "64")) * 1024 * 1024
+JPEG_DRAFT = os.environ.get("LAYOUT_JPEG_DRAFT", "1").lower() in {"1", "true", "yes"}
+MAX_QUEUED_JOBS = int(os.environ.get("LAYOUT_JOB_MAX_QUEUED", "10000"))
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,11 +95,180 @@ logging.basicConfig(
 logger = logging.getLogger("layout")
 
 
+def _decode_image(content: bytes) -> Image.Image:
+    return decode_image(content, input_size() if JPEG_DRAFT else None)
+
+
+def _decode_document(content: bytes) -> Image.Image:
+    return decode_image(content, draft_size(input_size()) if JPEG_DRAFT else None)
+
+
+def _cache_key(content: bytes, *parts: str) -> str:
+    return ResultCache.make_key(content, model_identity(), *parts)
+
+
+def _page_sizes(contents: list[bytes]) -> list[tuple[int, int]]:
+    # Image.open only parses the header, pixels are decoded later per chunk
+    return [Image.open(io.BytesIO(content)).size for content in contents]
+
+
+def _predict_chunk(
+    contents: list[bytes],
+    request_id: str,
+    first_page_index: int,
+    timings: dict[str, float],
+) -> list[dict]:
+    t0 = time.perf_counter()
+    images = [_decode_image(content) for content in contents]
+    timings["decode"] = timings.get("decode", 0.0) + time.perf_counter() - t0
+    return predict_pages(images, request_id, first_page_index, timings)
+
+
+def _predict_pixel_chunk(
+    pixels: list,
+    request_id: str,
+    first_page_index: int,
+    timings: dict[str, float],
+    order: str,
+) -> list[dict]:
+    images = [pixels_to_rgb(page, order) for page in pixels]
+    return predict_pages(images, request_id, first_page_index, timings)
+
+
+async def _iter_chunk_results(
+    executor,
+    scheduler,
+    tenant_id: str,
+    contents: list,
+    chunks: list[range],
+    request_id: str,
+    timer: StageTimer,
+    predict_chunk=_predict_chunk,
+) -> AsyncIterator[list[dict]]:
+    """Yield the page results of each chunk as soon as its predict_batch call finishes."""
+    for chunk in chunks:
+        # One fair-queued slot per chunk, so other tenants interleave with long documents
+        wait_start = time.perf_counter()
+        async with scheduler.slot(tenant_id, cost=len(chunk), bounded=False):
+            timer.add("queue", time.perf_counter() - wait_start)
+            chunk_pages = await executor.run(
+                predict_chunk,
+                contents[chunk.start : chunk.stop],
+                request_id,
+                chunk.start,
+                timer.stages,
+                bounded=False,
+            )
+        # Drop the pages already processed so memory does not grow with the document
+        contents[chunk.start : chunk.stop] = [b""] * len(chunk)
+        yield chunk_pages
+
+
+async def _stream_ndjson(
+    results: AsyncIterator[list[dict]],
+    request_id: str,
+    tenant_id: str,
+    start_time: float,
+    payload_size: int,
+    timer: StageTimer,
+    compressor: StreamCompressor,
+) -> AsyncIterator[bytes]:
+    """Serialize page results as NDJSON, one line per page."""
+    num_pages = 0
+    try:
+        async for chunk_pages in results:
+            for page in chunk_pages:
+                num_pages += 1
+                with timer.stage("serialize"):
+                    line = compressor.compress(dumps(page) + b"\n")
+                yield line
+    except Exception as e:
+        # Headers are already sent, so the error is reported in-band
+        logger.exception(
+            "request_id=%s tenant_id=%s status_code=500 pages=%d error=%s",
+            request_id,
+            tenant_id,
+            num_pages,
+            str(e),
+        )
+        REQUESTS_TOTAL.labels(status="error").inc()
+        error = dumps({"request_id": request_id, "error": str(e)}) + b"\n"
+        yield compressor.compress(error) + compressor.finish()
+        return
+
+    tail = compressor.finish()
+    if tail:
+        yield tail
+
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(
+        "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d pages=%d stream=true",
+        request_id,
+        tenant_id,
+        latency_ms,
+        payload_size,
+        num_pages,
+    )
+    # The Server-Timing header went out with the first line, so only the
+    # histogram sees the full breakdown of a streamed response
+    timer.observe(model_name())
+    REQUESTS_TOTAL.labels(status="success").inc()
+
+
+async def _read_image_upload(file: UploadFile) -> bytes:
+    """Validate content type and read an uploaded image, enforcing the size limit."""
+    content_type = file.content_type or ""
+    if not any(
+        ct in content_type for ct in ["image/png", "image/jpeg", "image/jpg", "image/webp"]
+    ) and not is_pixel_upload(file):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid content type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
+        )
+
+    return await read_upload(file, MAX_IMAGE_SIZE_BYTES)
+
+
+def _submit_job(job_queue: JobQueue, contents: list[bytes], tenant_id: str) -> Job:
+    if job_queue.stats().counts[QUEUED] >= MAX_QUEUED_JOBS:
+        raise QueueFullError("Job queue is full, retry later", retry_after=30)
+    return job_queue.submit(contents, {}, tenant_id)
+
+
+def _job_response(job: Job, result: bytes | None = None) -> dict:
+    """Shaped like schemas.JobResponse."""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "num_pages": job.num_inputs,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "attempts": job.attempts,
+        "error": job.error,
+        "result": loads(result) if result is not None else None,
+    }
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting Layout service")
+    app.state.executor = create_executor()
+    app.state.cache = create_cache()
+    app.state.scheduler = create_scheduler()
+    app.state.job_queue = create_job_queue()
+    # Load and warm up in the background so /livez answers while this runs
+    app.state.startup = asyncio.create_task(load_and_warm_up(app.state.executor))
+    app.state.batcher = create_batcher(app.state.executor)
+    app.state.batcher.start()
+    app.state.saturation = SaturationMonitor(app.state)
+    app.state.saturation.start()
     yield
     logger.info("Shutting down Layout service")
+    app.state.startup.cancel()
+    await app.state.saturation.stop()
+    await app.state.batcher.stop()
+    app.state.executor.shutdown()
 
 
 app = FastAPI(
@@ -47,83 +277,594 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan,
 )
+app.add_middleware(ArrivalTimeMiddleware)
+app.add_middleware(
+    DeadlineMiddleware,
+    path_timeouts=dict.fromkeys(
+        ("/predict_batch", "/document", f"/v2/models/{v2.MODEL_NAME}/infer"),
+        BATCH_TIMEOUT_SECONDS,
+    ),
+)
+app.add_middleware(InflightMiddleware)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def v2_error_handler(request: Request, exc: StarletteHTTPException):
+    """Errors on the V2 protocol routes have an error field instead of detail."""
+    if not request.url.path.startswith("/v2"):
+        return await http_exception_handler(request, exc)
+    return Response(
+        content=dumps({"error": str(exc.detail)}),
+        status_code=exc.status_code,
+        media_type="application/json",
+        headers=getattr(exc, "headers", None),
+    )
+
+
+def _startup_state(app: FastAPI) -> str:
+    """loading, ready or failed."""
+    startup = app.state.startup
+    if not startup.done():
+        return "loading"
+    if startup.cancelled() or startup.exception() is not None:
+        return "failed"
+    return "ready"
 
 
 @app.get("/healthz")
-async def healthz():
-    try:
-        get_predictor()
-        return {"status": "ok", "ready": is_ready()}
-    except Exception as e:
-        logger.exception("Health check failed: %s", e)
-        raise HTTPException(status_code=503, detail=str(e))
+async def healthz(request: Request):
+    state = _startup_state(request.app)
+    if state == "failed":
+        raise HTTPException(status_code=503, detail="Model startup failed")
+    return {"status": "ok", "ready": state == "ready"}
+
+
+@app.get("/livez")
+async def livez(request: Request):
+    """The process is serving and model startup has not failed."""
+    if _startup_state(request.app) == "failed":
+        raise HTTPException(status_code=503, detail="Model startup failed")
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    """The model is loaded and warmed up, so requests will not pay for it."""
+    state = _startup_state(request.app)
+    if state != "ready":
+        raise HTTPException(status_code=503, detail=f"Model {state}")
+    return {"status": "ready"}
 
 
 @app.post("/predict", response_model=PredictResponse)
 async def predict_endpoint(request: Request, file: UploadFile = File(...)):
-    """Run layout prediction on an uploaded image."""
+    """
+    Run layout prediction on an uploaded image.
+
+    Raw uint8 pixels skip image decoding: send a .npy file, or an
+    application/octet-stream file with X-Image-Shape: H,W,C (and optionally
+    X-Image-Dtype: uint8, X-Image-Channel-Order: RGB|BGR).
+    Results are cached by image content; send X-Cache-Bypass: 1 to skip the cache.
+    The time spent in each stage is returned in the Server-Timing header.
+    The body is compressed with zstd or gzip if Accept-Encoding allows it.
+    """
     request_id = str(uuid.uuid4())
     tenant_id = request.headers.get("X-Tenant-ID", "")
     start_time = time.perf_counter()
+    executor = request.app.state.executor
+    cache = request.app.state.cache
+    timer = StageTimer.for_request(request)
 
-    try:
-        content_type = file.content_type or ""
-        if not any(ct in content_type for ct in ["image/png", "image/jpeg", "image/jpg", "image/webp"]):
+    with request_errors(tenant_id, request_id, start_time):
+        with timer.stage("upload"):
+            content = await _read_image_upload(file)
+
+        pixels = None
+        key_parts = ()
+        if is_pixel_upload(file):
+            # Wraps the upload bytes in place; shape and order are part of the cache key
+            pixels = wrap_pixels(content, request.headers)
+            order = channel_order(request.headers)
+            key_parts = (f"pixels={pixels.shape}|{order}",)
+        else:
+            # The draft decode changes the pixels the model sees
+            key_parts = (f"draft={JPEG_DRAFT}",)
+
+        cache_key = None
+        result = None
+        cache_status = "bypass" if is_bypassed(request.headers) else "miss"
+        if cache.enabled and cache_status == "miss":
+            with timer.stage("cache"):
+                cache_key = await executor.run(_cache_key, content, *key_parts)
+                cached = await executor.run(cache.get, cache_key, bounded=False)
+            if cached is not None:
+                # A hit skips decode and inference entirely
+                result = loads(cached)
+                result["request_id"] = request_id
+                result["latency_ms"] = 0.0
+                cache_status = "hit"
+
+        if result is None:
+            wait_start = time.perf_counter()
+            async with request.app.state.scheduler.slot(tenant_id):
+                timer.add("queue", time.perf_counter() - wait_start)
+                with timer.stage("decode"):
+                    if pixels is not None:
+                        image = await executor.run(pixels_to_rgb, pixels, order)
+                    else:
+                        image = await executor.run(_decode_image, content)
+                result = await request.app.state.batcher.submit(
+                    image, request_id, timer.stages
+                )
+
+        with timer.stage("serialize"):
+            body = dumps(result)
+        if cache_key is not None and cache_status == "miss":
+            await executor.run(cache.put, cache_key, body, bounded=False)
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d cache=%s",
+            request_id,
+            tenant_id,
+            latency_ms,
+            len(content),
+            cache_status,
+        )
+        timer.observe(model_name())
+        REQUESTS_TOTAL.labels(status="success").inc()
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={
+                "X-Cache": cache_status,
+                "Server-Timing": timer.header(),
+                **encoding_headers(encoding),
+            },
+        )
+
+
+@app.post("/predict_batch", response_model=BatchPredictResponse)
+async def predict_batch_endpoint(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    stream: bool = False,
+):
+    """
+    Run layout prediction on the pages of a multi-page document.
+
+    Pages are decoded and run through LayoutPredictor.predict_batch in chunks
+    sized to LAYOUT_BATCH_MEMORY_MB; results are returned in input order.
+    With stream=true (or Accept: application/x-ndjson) each page is emitted as
+    one JSON line as soon as its chunk finishes. The body is compressed with
+    zstd or gzip if Accept-Encoding allows it.
+    """
+    request_id = str(uuid.uuid4())
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    start_time = time.perf_counter()
+    executor = request.app.state.executor
+    timer = StageTimer.for_request(request)
+
+    with request_errors(tenant_id, request_id, start_time):
+        if len(files) > MAX_BATCH_PAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many pages. Max pages per request: {MAX_BATCH_PAGES}",
+            )
+        # Chunks are planned from the encoded image headers
+        if any(is_pixel_upload(file) for file in files):
             raise HTTPException(
                 status_code=400,
-                detail=f"Invalid content type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
+                detail="/predict_batch accepts encoded images only, not raw pixels",
+            )
+
+        scheduler = request.app.state.scheduler
+        scheduler.check_admission(tenant_id)
+
+        with timer.stage("upload"):
+            contents = [await _read_image_upload(file) for file in files]
+        payload_size = sum(len(content) for content in contents)
+
+        # Admission happens on the first executor call; once accepted, the
+        # remaining chunks of the document are not rejected half-way through.
+        page_sizes = await executor.run(_page_sizes, contents)
+        chunks = plan_chunks(page_sizes, BATCH_MEMORY_BYTES, PAGE_OVERHEAD_BYTES)
+        results = _iter_chunk_results(
+            executor, scheduler, tenant_id, contents, chunks, request_id, timer
+        )
+
+        if stream or "application/x-ndjson" in request.headers.get("Accept", ""):
+            encoding = negotiate(request.headers.get("Accept-Encoding", ""))
+            return StreamingResponse(
+                _stream_ndjson(
+                    results,
+                    request_id,
+                    tenant_id,
+                    start_time,
+                    payload_size,
+                    timer,
+                    StreamCompressor(encoding),
+                ),
+                media_type="application/x-ndjson",
+                headers={
+                    "X-Request-ID": request_id,
+                    "Server-Timing": timer.header(),
+                    **encoding_headers(encoding),
+                },
+            )
+
+        pages: list[dict] = []
+        inference_ms = 0.0
+        async for chunk_pages in results:
+            # Pages of one chunk share a single forward pass and its latency
+            inference_ms += chunk_pages[0]["latency_ms"]
+            pages.extend(chunk_pages)
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d pages=%d chunks=%d",
+            request_id,
+            tenant_id,
+            latency_ms,
+            payload_size,
+            len(pages),
+            len(chunks),
+        )
+        with timer.stage("serialize"):
+            body = dumps(
+                {
+                    "request_id": request_id,
+                    "latency_ms": round(inference_ms, 2),
+                    "num_pages": len(pages),
+                    "pages": pages,
+                }
             )
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
+        timer.observe(model_name())
+        REQUESTS_TOTAL.labels(status="success").inc()
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"Server-Timing": timer.header(), **encoding_headers(encoding)},
+        )
+
+
+@app.post("/document", response_model=DocumentResponse)
+async def document_endpoint(request: Request, file: UploadFile = File(...)):
+    """
+    Run layout prediction, then table structure recognition on every region
+    labelled Table, in one request.
+
+    The page is uploaded and decoded once and both models run on the same
+    pixels; pages without tables skip the table model. Accepts the same
+    uploads as /predict. Table cell bboxes are in page coordinates and
+    tables[i].box_index points at the Table region in boxes.
+    """
+    request_id = str(uuid.uuid4())
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    start_time = time.perf_counter()
+    executor = request.app.state.executor
+    cache = request.app.state.cache
+    scheduler = request.app.state.scheduler
+    timer = StageTimer.for_request(request)
+
+    with request_errors(tenant_id, request_id, start_time):
+        with timer.stage("upload"):
+            content = await _read_image_upload(file)
+
+        pixels = None
+        key_parts = ("document", table_model_identity())
+        if is_pixel_upload(file):
+            pixels = wrap_pixels(content, request.headers)
+            order = channel_order(request.headers)
+            key_parts += (f"pixels={pixels.shape}|{order}",)
+        else:
+            # The draft decode changes the pixels the model sees
+            key_parts += (f"draft={JPEG_DRAFT}",)
 
-        content = b""
-        while chunk := await file.read(8192):
-            content += chunk
-            if len(content) > MAX_IMAGE_SIZE_BYTES:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"Image too large. Max size: {MAX_IMAGE_SIZE_MB}MB",
+        cache_key = None
+        result = None
+        cache_status = "bypass" if is_bypassed(request.headers) else "miss"
+        if cache.enabled and cache_status == "miss":
+            with timer.stage("cache"):
+                cache_key = await executor.run(_cache_key, content, *key_parts)
+                cached = await executor.run(cache.get, cache_key, bounded=False)
+            if cached is not None:
+                result = loads(cached)
+                result["request_id"] = request_id
+                result["latency_ms"] = 0.0
+                cache_status = "hit"
+
+        if result is None:
+            wait_start = time.perf_counter()
+            async with scheduler.slot(tenant_id):
+                timer.add("queue", time.perf_counter() - wait_start)
+                with timer.stage("decode"):
+                    if pixels is not None:
+                        image = await executor.run(pixels_to_rgb, pixels, order)
+                    else:
+                        image = await executor.run(_decode_document, content)
+                result = await request.app.state.batcher.submit(
+                    image, request_id, timer.stages
                 )
 
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
+            tables, tables_ms = [], 0.0
+            num_tables = count_tables(result)
+            if num_tables:
+                # Each table is one encoder/decoder run, as in the table service
+                wait_start = time.perf_counter()
+                async with scheduler.slot(tenant_id, cost=num_tables):
+                    timer.add("queue", time.perf_counter() - wait_start)
+                    tables, tables_ms = await executor.run(
+                        predict_tables,
+                        image,
+                        result,
+                        timer.stages,
+                        deadline=request.state.deadline,
+                    )
+            result["latency_ms"] = round(result["latency_ms"] + tables_ms, 2)
+            result["tables"] = tables
 
-        image = Image.open(io.BytesIO(content)).convert("RGB")
-        result = predict(image, request_id)
+        with timer.stage("serialize"):
+            body = dumps(result)
+        if cache_key is not None and cache_status == "miss":
+            await executor.run(cache.put, cache_key, body, bounded=False)
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
 
         latency_ms = (time.perf_counter() - start_time) * 1000
         logger.info(
-            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d",
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d tables=%d cache=%s",
             request_id,
             tenant_id,
             latency_ms,
             len(content),
+            len(result["tables"]),
+            cache_status,
         )
+        timer.observe(model_name())
         REQUESTS_TOTAL.labels(status="success").inc()
-        return result
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={
+                "X-Cache": cache_status,
+                "Server-Timing": timer.header(),
+                **encoding_headers(encoding),
+            },
+        )
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job_endpoint(request: Request, files: list[UploadFile] = File(...)):
+    """
+    Queue the pages of a document for layout prediction and return at once.
+
+    Poll GET /jobs/{job_id} (also sent as the Location header) for the status;
+    once succeeded, its result has the same shape as the /predict_batch
+    response. Jobs are run by separate worker processes (python -m src.worker).
+    """
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    executor = request.app.state.executor
+
+    with request_errors(tenant_id):
+        if len(files) > MAX_BATCH_PAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many pages. Max pages per request: {MAX_BATCH_PAGES}",
+            )
+        if any(is_pixel_upload(file) for file in files):
+            raise HTTPException(
+                status_code=400, detail="Jobs accept encoded images only, not raw pixels"
+            )
+
+        contents = [await _read_image_upload(file) for file in files]
+        job = await executor.run(
+            _submit_job, request.app.state.job_queue, contents, tenant_id, bounded=False
+        )
+
+        logger.info(
+            "job_id=%s tenant_id=%s status_code=202 payload_size=%d pages=%d",
+            job.id,
+            tenant_id,
+            sum(len(content) for content in contents),
+            len(contents),
+        )
+        JOBS_TOTAL.labels(status="submitted").inc()
+        return Response(
+            content=dumps(_job_response(job)),
+            status_code=202,
+            media_type="application/json",
+            headers={"Location": f"/jobs/{job.id}"},
+        )
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_endpoint(request: Request, job_id: str):
+    """Status of a job, with its result once it succeeded."""
+    executor = request.app.state.executor
+    job_queue = request.app.state.job_queue
+
+    job = await executor.run(job_queue.get, job_id, bounded=False)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    result = None
+    if job.status == SUCCEEDED:
+        result = await executor.run(job_queue.result, job_id, bounded=False)
+
+    body = dumps(_job_response(job, result))
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+    return Response(
+        content=compress(body, encoding),
+        media_type="application/json",
+        headers=encoding_headers(encoding),
+    )
+
+
+@app.get("/v2")
+async def v2_server_metadata():
+    return v2.server_metadata(app.version)
+
+
+@app.get("/v2/health/live")
+async def v2_live(request: Request):
+    return await livez(request)
+
+
+@app.get("/v2/health/ready")
+async def v2_ready(request: Request):
+    return await readyz(request)
+
+
+@app.get("/v2/models/{name}")
+async def v2_model_metadata(name: str):
+    v2.check_model(name)
+    return v2.model_metadata(model_backend())
+
+
+@app.get("/v2/models/{name}/ready")
+async def v2_model_ready(request: Request, name: str):
+    v2.check_model(name)
+    await readyz(request)
+    return {"name": name, "ready": True}
+
+
+@app.post("/v2/models/{name}/infer")
+async def v2_infer_endpoint(request: Request, name: str):
+    """
+    Run layout prediction on a V2 infer request (see v2.py for the tensors).
+
+    Send pages as one image UINT8 [N,H,W,C] tensor, or an encoded_image BYTES
+    [N] tensor, preferably as binary data (Inference-Header-Content-Length).
+    A single page goes through the micro-batcher like /predict; several pages
+    run in memory-bounded chunks like /predict_batch. Results are not cached.
+    """
+    request_id = str(uuid.uuid4())
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    start_time = time.perf_counter()
+    executor = request.app.state.executor
+    scheduler = request.app.state.scheduler
+    timer = StageTimer.for_request(request)
+
+    with request_errors(tenant_id, request_id, start_time):
+        v2.check_model(name)
+        with timer.stage("upload"):
+            body = await v2.read_body(request)
+        payload_size = len(body)
+        infer = v2.parse_infer_request(body, v2.header_length(request.headers))
+        pixels = v2.page_pixels(infer)
+        contents = v2.encoded_pages(infer)
+        if (pixels is None) == (contents is None):
+            raise HTTPException(
+                status_code=400, detail="Send exactly one of image or encoded_image"
+            )
+        num_pages = len(pixels) if pixels is not None else len(contents)
+        if num_pages > MAX_BATCH_PAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many pages. Max pages per request: {MAX_BATCH_PAGES}",
+            )
+
+        if num_pages == 1:
+            wait_start = time.perf_counter()
+            async with scheduler.slot(tenant_id):
+                timer.add("queue", time.perf_counter() - wait_start)
+                with timer.stage("decode"):
+                    if pixels is not None:
+                        order = v2.pixel_channel_order(infer)
+                        image = await executor.run(pixels_to_rgb, pixels[0], order)
+                    else:
+                        image = await executor.run(_decode_image, contents[0])
+                pages = [
+                    await request.app.state.batcher.submit(
+                        image, request_id, timer.stages
+                    )
+                ]
+        else:
+            scheduler.check_admission(tenant_id)
+            if pixels is not None:
+                height, width = pixels.shape[1:3]
+                page_sizes = [(width, height)] * num_pages
+                contents = list(pixels)
+                predict_chunk = functools.partial(
+                    _predict_pixel_chunk, order=v2.pixel_channel_order(infer)
+                )
+            else:
+                page_sizes = await executor.run(_page_sizes, contents)
+                predict_chunk = _predict_chunk
+            chunks = plan_chunks(page_sizes, BATCH_MEMORY_BYTES, PAGE_OVERHEAD_BYTES)
+            pages = []
+            async for chunk_pages in _iter_chunk_results(
+                executor,
+                scheduler,
+                tenant_id,
+                contents,
+                chunks,
+                request_id,
+                timer,
+                predict_chunk,
+            ):
+                pages.extend(chunk_pages)
+
+        with timer.stage("serialize"):
+            body, json_length = v2.encode_infer_response(
+                infer, infer.id or request_id, v2.pages_to_outputs(pages)
+            )
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
+
+        headers = {"Server-Timing": timer.header(), **encoding_headers(encoding)}
+        media_type = "application/json"
+        if json_length is not None:
+            headers[v2.HEADER_LENGTH] = str(json_length)
+            media_type = v2.BINARY_CONTENT_TYPE
 
-    except HTTPException:
-        REQUESTS_TOTAL.labels(status="error").inc()
-        raise
-    except Exception as e:
         latency_ms = (time.perf_counter() - start_time) * 1000
-        logger.exception(
-            "request_id=%s tenant_id=%s status_code=500 latency_ms=%.2f error=%s",
+        logger.info(
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d pages=%d protocol=v2",
             request_id,
             tenant_id,
             latency_ms,
-            str(e),
+            payload_size,
+            len(pages),
         )
-        REQUESTS_TOTAL.labels(status="error").inc()
-        raise HTTPException(status_code=500, detail=str(e))
+        timer.observe(model_name())
+        REQUESTS_TOTAL.labels(status="success").inc()
+        return Response(content=body, media_type=media_type, headers=headers)
 
 
 @app.get("/metrics")
-async def metrics():
+async def metrics(request: Request):
+    # Queue depth lives in the job queue, shared by all API and worker processes
+    await request.app.state.executor.run(
+        observe_queue, request.app.state.job_queue, bounded=False
+    )
     return Response(
-        content=generate_latest(),
+        content=render_metrics(),
         media_type=CONTENT_TYPE_LATEST,
     )
 
 
+@app.get("/saturation")
+async def saturation(request: Request):
+    """Saturation signals of the worker that answers (for KEDA metrics-api)."""
+    return Response(
+        content=dumps(request.app.state.saturation.observe()),
+        media_type="application/json",
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -2,7 +2,17 @@
 Prometheus metrics for Layout inference service.
 """
 
-from prometheus_client import Counter, Histogram
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
 
 REQUESTS_TOTAL = Counter(
     "layout_requests_total",
@@ -21,3 +31,132 @@ REGIONS_PER_REQUEST = Histogram(
     "Number of layout regions detected per request",
     buckets=(1, 5, 10, 20, 50, 100, 200),
 )
+
+DOCUMENT_TABLES = Histogram(
+    "layout_document_tables",
+    "Number of tables detected per /document page",
+    buckets=(0, 1, 2, 5, 10, 20),
+)
+
+BATCH_SIZE = Histogram(
+    "layout_batch_size",
+    "Number of requests coalesced into one predict_batch call",
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+
+BATCH_QUEUE_WAIT = Histogram(
+    "layout_batch_queue_wait_seconds",
+    "Time a request waits in the micro-batching queue before dispatch",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+CACHE_LOOKUPS = Counter(
+    "layout_cache_lookups_total",
+    "Result cache lookups by outcome and tier",
+    ["result", "tier"],
+)
+
+CACHE_BYTES = Gauge(
+    "layout_cache_memory_bytes",
+    "Bytes held by the in-memory result cache",
+)
+
+STARTUP_SECONDS = Gauge(
+    "layout_startup_seconds",
+    "Time spent loading and warming up the model at startup",
+    ["phase"],
+)
+
+
+TENANT_QUEUE_DEPTH = Gauge(
+    "layout_tenant_queue_depth",
+    "Requests waiting for an inference slot, per tenant",
+    ["tenant"],
+    multiprocess_mode="livesum",
+)
+
+TENANT_QUEUE_WAIT = Histogram(
+    "layout_tenant_queue_wait_seconds",
+    "Time a request waits for an inference slot, per tenant",
+    ["tenant"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+STAGE_LATENCY = Histogram(
+    "inference_stage_latency_seconds",
+    "Time spent in each stage of request processing",
+    ["service", "model", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+JOB_QUEUE_DEPTH = Gauge(
+    "layout_job_queue_depth",
+    "Jobs in the /jobs queue by status",
+    ["status"],
+    multiprocess_mode="mostrecent",
+)
+
+JOB_QUEUE_OLDEST = Gauge(
+    "layout_job_queue_oldest_seconds",
+    "Age of the oldest queued job",
+    multiprocess_mode="mostrecent",
+)
+
+JOBS_TOTAL = Counter(
+    "layout_jobs_total",
+    "Jobs submitted through the API (submitted) and finished by workers (succeeded, failed)",
+    ["status"],
+)
+
+JOB_DURATION = Histogram(
+    "layout_job_duration_seconds",
+    "Time a worker spent running one job",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+
+INFLIGHT_REQUESTS = Gauge(
+    "layout_inflight_requests",
+    "HTTP requests being served, probes and metrics scrapes excluded",
+    multiprocess_mode="livesum",
+)
+
+QUEUE_DEPTH = Gauge(
+    "layout_queue_depth",
+    "Requests or jobs waiting in front of inference, by queue",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_UTILIZATION = Gauge(
+    "layout_executor_utilization",
+    "Fraction of inference executor threads busy",
+    multiprocess_mode="liveall",
+)
+
+EVENT_LOOP_LAG = Gauge(
+    "layout_event_loop_lag_seconds",
+    "How late the event loop woke up for a periodic timer",
+    multiprocess_mode="livemax",
+)
+
+BATCH_FILL_RATIO = Gauge(
+    "layout_batch_fill_ratio",
+    "Moving average of batch size / LAYOUT_MAX_BATCH_SIZE",
+    multiprocess_mode="liveall",
+)
+
+QUEUED_WORK_SECONDS = Gauge(
+    "layout_queued_work_seconds",
+    "Estimated seconds until every request waiting for an inference slot has one",
+    multiprocess_mode="livemax",
+)
+
+
+def render_metrics() -> bytes:
+    """Metrics of this process, or of all workers when run by the pre-fork server."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -1,9 +1,12 @@
 """
-Load and manage LayoutPredictor from docling-ibm-models.
+Load and manage LayoutPredictor from docling-ibm-models, and the TFPredictor
+(TableFormer) used by the /document pipeline.
 """
 
+import json
 import logging
 import os
+import threading
 from pathlib import Path
 
 from huggingface_hub import snapshot_download
@@ -11,6 +14,9 @@ from huggingface_hub import snapshot_download
 logger = logging.getLogger(__name__)
 
 _predictor = None
+_lock = threading.Lock()
+_table_predictor = None
+_table_lock = threading.Lock()
 
 
 def _resolve_layout_artifact_path() -> str:
@@ -27,34 +33,183 @@ def _resolve_layout_artifact_path() -> str:
     return snapshot_download(repo_id=hf_repo)
 
 
+def _quantize() -> str | None:
+    """LAYOUT_QUANTIZE: "int8" for dynamic int8 weights on CPU, empty for fp32."""
+    return os.environ.get("LAYOUT_QUANTIZE", "").strip().lower() or None
+
+
+def _quantize_cache_dir() -> str | None:
+    return os.environ.get("LAYOUT_QUANTIZE_CACHE_DIR", "").strip() or None
+
+
+def _backend() -> str:
+    """LAYOUT_BACKEND: "torch" or "onnxruntime" (the exported ONNX models, CPU only)."""
+    return os.environ.get("LAYOUT_BACKEND", "torch").strip().lower() or "torch"
+
+
+def _backend_options() -> dict:
+    # Executor threads run requests concurrently, spinning ORT threads would
+    # take the cores from each other
+    return {
+        "graph_optimization_level": os.environ.get(
+            "LAYOUT_ONNX_OPTIMIZATION_LEVEL", "all"
+        ),
+        "allow_spinning": False,
+    }
+
+
 def get_predictor():
     """Get or create LayoutPredictor singleton."""
     global _predictor
 
-    if _predictor is None:
-        from docling_ibm_models.layoutmodel.layout_predictor import LayoutPredictor
-
-        device = os.environ.get("LAYOUT_DEVICE", "cpu").lower()
-        num_threads = int(os.environ.get("LAYOUT_NUM_THREADS", "4"))
-        threshold = float(os.environ.get("LAYOUT_THRESHOLD", "0.3"))
-        artifact_path = _resolve_layout_artifact_path()
-
-        logger.info(
-            "Loading LayoutPredictor with device=%s, num_threads=%s, threshold=%s",
-            device,
-            num_threads,
-            threshold,
-        )
-        _predictor = LayoutPredictor(
-            artifact_path=artifact_path,
-            device=device,
-            num_threads=num_threads,
-            base_threshold=threshold,
-        )
-        logger.info("LayoutPredictor loaded: %s", _predictor.info())
+    if _predictor is not None:
+        return _predictor
+
+    # Startup warm-up and early requests may race to load the model
+    with _lock:
+        if _predictor is None:
+            from docling_ibm_models.layoutmodel.layout_predictor import LayoutPredictor
+
+            device = os.environ.get("LAYOUT_DEVICE", "cpu").lower()
+            num_threads = int(os.environ.get("LAYOUT_NUM_THREADS", "4"))
+            threshold = float(os.environ.get("LAYOUT_THRESHOLD", "0.3"))
+            quantize = _quantize()
+            backend = _backend()
+            artifact_path = _resolve_layout_artifact_path()
+
+            logger.info(
+                "Loading LayoutPredictor with device=%s, num_threads=%s, threshold=%s, "
+                "quantize=%s, backend=%s",
+                device,
+                num_threads,
+                threshold,
+                quantize,
+                backend,
+            )
+            _predictor = LayoutPredictor(
+                artifact_path=artifact_path,
+                device=device,
+                num_threads=num_threads,
+                base_threshold=threshold,
+                quantize=quantize,
+                quantize_cache_dir=_quantize_cache_dir(),
+                backend=backend,
+                onnx_file=os.environ.get("LAYOUT_ONNX_FILE", "").strip() or None,
+                backend_options=_backend_options() if backend != "torch" else None,
+            )
+            logger.info("LayoutPredictor loaded: %s", _predictor.info())
 
     return _predictor
 
 
-def is_ready() -> bool:
+def _resolve_table_weights_dir() -> str:
+    weights_dir = os.environ.get("LAYOUT_TABLE_WEIGHTS_DIR", "").strip()
+    if weights_dir and (Path(weights_dir) / "tm_config.json").exists():
+        logger.info("Using table weights from LAYOUT_TABLE_WEIGHTS_DIR: %s", weights_dir)
+        return weights_dir
+
+    logger.info("Downloading TableFormer weights from HuggingFace")
+    repo_path = snapshot_download(
+        repo_id="ds4sd/docling-models",
+        allow_patterns=["model_artifacts/tableformer/accurate/*"],
+    )
+    return os.path.join(repo_path, "model_artifacts", "tableformer", "accurate")
+
+
+def get_table_predictor():
+    """
+    Get or create the TFPredictor singleton used by /document.
+    Loaded on first use unless LAYOUT_TABLE_PRELOAD is set, so layout-only
+    deployments do not pay for it.
+    """
+    global _table_predictor
+
+    if _table_predictor is not None:
+        return _table_predictor
+
+    with _table_lock:
+        if _table_predictor is None:
+            from docling_ibm_models.tableformer.data_management.tf_predictor import TFPredictor
+
+            weights_dir = _resolve_table_weights_dir()
+            with open(Path(weights_dir) / "tm_config.json") as f:
+                config = json.load(f)
+            config["model"]["save_dir"] = weights_dir
+            device = os.environ.get("LAYOUT_DEVICE", "cpu").lower()
+            num_threads = int(os.environ.get("LAYOUT_NUM_THREADS", "4"))
+            quantize = _quantize()
+            backend = _backend()
+
+            logger.info(
+                "Loading TFPredictor with device=%s, num_threads=%s, weights_dir=%s, "
+                "quantize=%s, backend=%s",
+                device,
+                num_threads,
+                weights_dir,
+                quantize,
+                backend,
+            )
+            _table_predictor = TFPredictor(
+                config,
+                device=device,
+                num_threads=num_threads,
+                quantize=quantize,
+                quantize_cache_dir=_quantize_cache_dir(),
+                backend=backend,
+                backend_options=_backend_options() if backend != "torch" else None,
+            )
+            logger.info("TFPredictor loaded")
+
+    return _table_predictor
+
+
+def table_model_identity() -> str:
+    """Identity of the table model for cache keys, known without loading it."""
+    weights_dir = os.environ.get("LAYOUT_TABLE_WEIGHTS_DIR", "").strip()
+    identity = weights_dir or "ds4sd/docling-models:tableformer/accurate"
+    return f"{identity}|quantize={_quantize()}|backend={_backend()}"
+
+
+def table_preload() -> bool:
+    """Whether the table model is loaded and warmed up at startup."""
+    return os.environ.get("LAYOUT_TABLE_PRELOAD", "0").lower() in {"1", "true", "yes"}
+
+
+def is_loaded() -> bool:
     return _predictor is not None
+
+
+def freeze_weights() -> None:
+    """Mark model weights read-only so forked workers keep sharing their pages."""
+    get_predictor()._model.requires_grad_(False)
+    if _table_predictor is not None:
+        _table_predictor.get_model().requires_grad_(False)
+
+
+def model_name() -> str:
+    """Short model name, used as a metrics label."""
+    return get_predictor().info()["model_name"]
+
+
+def model_backend() -> str:
+    """Backend of the loaded model, or the configured one before it is loaded."""
+    if _predictor is None:
+        return _backend()
+    return _predictor.info()["backend"]
+
+
+def model_identity() -> str:
+    """Identity of the loaded model and its settings, used in result cache keys."""
+    info = get_predictor().info()
+    return (
+        f"{info['safe_tensors_file']}|threshold={info['threshold']}"
+        f"|quantize={info['quantize']}|backend={info['backend']}"
+    )
+
+
+def input_size() -> tuple[int, int] | None:
+    """(width, height) the image processor resizes pages to, if fixed."""
+    size = get_predictor().info()["image_size"]
+    if "width" in size and "height" in size:
+        return size["width"], size["height"]
+    return None
@@ -0,0 +1,279 @@
+"""
+Tenant-aware weighted fair queueing in front of inference.
+
+Every request takes a slot from the scheduler before it decodes or runs
+inference; at most LAYOUT_SCHED_CONCURRENCY slots are held at once. When
+none is free, requests wait in a queue of their own tenant (X-Tenant-ID) and
+slots are handed out in order of virtual finish time (start-time fair
+queueing): a request of cost c from a tenant of weight w is tagged
+max(virtual time, tenant's last tag) + c / w. A tenant sending a bulk upload
+therefore only delays other tenants by its weighted share, instead of by the
+whole upload.
+
+- LAYOUT_TENANT_WEIGHTS: "tenant-a=4,tenant-b=2"; unlisted tenants weigh 1
+- LAYOUT_TENANT_MAX_INFLIGHT: slots one tenant may hold at once (0 = no cap)
+- LAYOUT_TENANT_MAX_QUEUE: requests one tenant may have waiting; beyond that
+  the request is rejected with TenantQueueFullError (HTTP 429)
+- LAYOUT_SCHED_MAX_QUEUE: requests waiting across all tenants; beyond that
+  the request is rejected with QueueFullError (HTTP 503)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from .executor import QueueFullError
+from .metrics import TENANT_QUEUE_DEPTH, TENANT_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "anonymous"
+# Tenants beyond this many get aggregated under one metrics label
+MAX_TENANT_LABELS = 100
+# Weight of the newest sample in the moving average of slot time per unit of cost
+SERVICE_TIME_ALPHA = 0.2
+
+
+class TenantQueueFullError(QueueFullError):
+    """Raised when a tenant already has too many requests waiting."""
+
+    def __init__(self, tenant_id: str, retry_after: int = 1):
+        super().__init__(
+            f"Too many queued requests for tenant {tenant_id!r}, retry later",
+            retry_after=retry_after,
+        )
+        self.tenant_id = tenant_id
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    start: float
+    finish: float
+    cost: float
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _Tenant:
+    weight: float
+    label: str
+    queue: deque[_Waiter] = field(default_factory=deque)
+    inflight: int = 0
+    last_finish: float = 0.0
+
+
+class FairScheduler:
+    """Weighted fair share of a fixed number of inference slots across tenants."""
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        weights: dict[str, float] | None = None,
+        max_inflight_per_tenant: int = 0,
+        max_queue_per_tenant: int = 64,
+        max_queue: int = 256,
+        retry_after: int = 1,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.concurrency = concurrency
+        self.weights = weights or {}
+        self.max_inflight_per_tenant = max_inflight_per_tenant
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._tenants: dict[str, _Tenant] = {}
+        self._labels: set[str] = set()
+        self._running = 0
+        self._queued = 0
+        self._queued_cost = 0.0
+        self._cost_seconds = 0.0
+        self._vtime = 0.0
+
+    @property
+    def running(self) -> int:
+        """Slots currently held."""
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot, across all tenants."""
+        return self._queued
+
+    def backlog_seconds(self) -> float:
+        """
+        Estimated seconds until every waiting request has a slot: queued cost
+        times the average slot time per unit of cost, spread over all slots.
+        """
+        return self._queued_cost * self._cost_seconds / self.concurrency
+
+    def _tenant(self, tenant_id: str) -> _Tenant:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            if tenant_id in self._labels or len(self._labels) < MAX_TENANT_LABELS:
+                self._labels.add(tenant_id)
+                label = tenant_id
+            else:
+                label = "other"
+            weight = max(self.weights.get(tenant_id, 1.0), 1e-6)
+            tenant = self._tenants[tenant_id] = _Tenant(weight=weight, label=label)
+        return tenant
+
+    def _can_run(self, tenant: _Tenant) -> bool:
+        return (
+            self.max_inflight_per_tenant <= 0
+            or tenant.inflight < self.max_inflight_per_tenant
+        )
+
+    def check_admission(self, tenant_id: str) -> None:
+        """Raise if a new request from this tenant would be rejected right now."""
+        tenant_id = tenant_id or DEFAULT_TENANT
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None and len(tenant.queue) >= self.max_queue_per_tenant:
+            raise TenantQueueFullError(tenant_id, self.retry_after)
+        if self._queued >= self.max_queue:
+            raise QueueFullError(retry_after=self.retry_after)
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: str, cost: float = 1.0, bounded: bool = True):
+        """
+        Hold one inference slot for the duration of the block.
+        cost weighs the request against others (e.g. number of pages).
+        Raises TenantQueueFullError / QueueFullError if bounded and the queues are full.
+        """
+        tenant_id = tenant_id or DEFAULT_TENANT
+        await self._acquire(tenant_id, cost, bounded)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(tenant_id)
+            if cost > 0:
+                self._observe_service(time.perf_counter() - started_at, cost)
+
+    def _observe_service(self, seconds: float, cost: float) -> None:
+        per_cost = seconds / cost
+        if self._cost_seconds == 0.0:
+            self._cost_seconds = per_cost
+        else:
+            self._cost_seconds += SERVICE_TIME_ALPHA * (per_cost - self._cost_seconds)
+
+    async def _acquire(self, tenant_id: str, cost: float, bounded: bool) -> None:
+        tenant = self._tenant(tenant_id)
+        start = max(self._vtime, tenant.last_finish)
+        finish = start + cost / tenant.weight
+
+        # Free slots are handed out on every release, so a free slot here means no
+        # waiter is eligible for it and this request can run right away.
+        if self._running < self.concurrency and self._can_run(tenant):
+            tenant.last_finish = finish
+            self._vtime = start
+            self._start(tenant)
+            return
+
+        if bounded:
+            if len(tenant.queue) >= self.max_queue_per_tenant:
+                raise TenantQueueFullError(tenant_id, self.retry_after)
+            if self._queued >= self.max_queue:
+                raise QueueFullError(retry_after=self.retry_after)
+
+        tenant.last_finish = finish
+        waiter = _Waiter(
+            asyncio.get_running_loop().create_future(), start, finish, cost
+        )
+        tenant.queue.append(waiter)
+        self._queued += 1
+        self._queued_cost += cost
+        TENANT_QUEUE_DEPTH.labels(tenant=tenant.label).inc()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just before the caller went away
+                self._release(tenant_id)
+            else:
+                tenant.queue.remove(waiter)
+                self._queued -= 1
+                self._queued_cost -= waiter.cost
+                TENANT_QUEUE_DEPTH.labels(tenant=tenant.label).dec()
+                self._forget_if_idle(tenant_id)
+            raise
+
+    def _start(self, tenant: _Tenant) -> None:
+        self._running += 1
+        tenant.inflight += 1
+
+    def _release(self, tenant_id: str) -> None:
+        tenant = self._tenants[tenant_id]
+        self._running -= 1
+        tenant.inflight -= 1
+        self._dispatch()
+        self._forget_if_idle(tenant_id)
+
+    def _forget_if_idle(self, tenant_id: str) -> None:
+        tenant = self._tenants.get(tenant_id)
+        # Idle tenants restart from the current virtual time, so state stays
+        # bounded by the number of active tenants.
+        if tenant is not None and tenant.inflight == 0 and not tenant.queue:
+            del self._tenants[tenant_id]
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the waiting requests with the smallest finish tags."""
+        while self._running < self.concurrency:
+            best = None
+            for tenant in self._tenants.values():
+                if tenant.queue and self._can_run(tenant):
+                    if best is None or tenant.queue[0].finish < best.queue[0].finish:
+                        best = tenant
+            if best is None:
+                return
+
+            waiter = best.queue.popleft()
+            self._queued -= 1
+            self._queued_cost -= waiter.cost
+            TENANT_QUEUE_DEPTH.labels(tenant=best.label).dec()
+            TENANT_QUEUE_WAIT.labels(tenant=best.label).observe(
+                time.perf_counter() - waiter.enqueued_at
+            )
+            self._vtime = max(self._vtime, waiter.start)
+            self._start(best)
+            waiter.future.set_result(None)
+
+
+def _parse_weights(spec: str) -> dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        if "=" in item:
+            tenant_id, weight = item.split("=", 1)
+            weights[tenant_id.strip()] = float(weight)
+    return weights
+
+
+def create_scheduler() -> FairScheduler:
+    """Create a FairScheduler configured from the environment."""
+    concurrency = int(os.environ.get("LAYOUT_SCHED_CONCURRENCY", "16"))
+    weights = _parse_weights(os.environ.get("LAYOUT_TENANT_WEIGHTS", ""))
+    max_inflight = int(os.environ.get("LAYOUT_TENANT_MAX_INFLIGHT", "0"))
+    max_queue_per_tenant = int(os.environ.get("LAYOUT_TENANT_MAX_QUEUE", "64"))
+    max_queue = int(os.environ.get("LAYOUT_SCHED_MAX_QUEUE", "256"))
+    logger.info(
+        "Layout tenant scheduler with concurrency=%s, weights=%s, max_inflight=%s, "
+        "max_queue_per_tenant=%s, max_queue=%s",
+        concurrency,
+        weights,
+        max_inflight,
+        max_queue_per_tenant,
+        max_queue,
+    )
+    return FairScheduler(
+        concurrency=concurrency,
+        weights=weights,
+        max_inflight_per_tenant=max_inflight,
+        max_queue_per_tenant=max_queue_per_tenant,
+        max_queue=max_queue,
+    )
@@ -32,3 +32,76 @@ class PredictResponse(BaseModel):
     )
     latency_ms: float = Field(..., description="Inference latency in milliseconds")
     boxes: list[Box] = Field(default_factory=list, description="Detected layout regions")
+
+
+class PageResult(PredictResponse):
+    """Layout prediction for one page of a multi-page request."""
+
+    page_index: int = Field(..., ge=0, description="Zero-based index of the page in the request")
+
+
+class CellBbox(BaseModel):
+    """Bounding box (l, t, r, b) of a table cell."""
+
+    l: float
+    t: float
+    r: float
+    b: float
+
+
+class TableCell(BaseModel):
+    """Single table cell from TFPredictor."""
+
+    bbox: CellBbox
+    start_row_offset_idx: int
+    end_row_offset_idx: int
+    start_col_offset_idx: int
+    end_col_offset_idx: int
+    row_span: int
+    col_span: int
+    column_header: bool = False
+    row_header: bool = False
+    row_section: bool = False
+
+
+class DocumentTable(BaseModel):
+    """Structure of one table detected on the page."""
+
+    table_index: int = Field(..., ge=0, description="Index of the table on the page")
+    box_index: int = Field(..., ge=0, description="Index of the Table region in boxes")
+    num_rows: int
+    num_cols: int
+    cells: list[TableCell] = Field(default_factory=list)
+
+
+class DocumentResponse(PredictResponse):
+    """Response for POST /document: layout regions plus the structure of every table."""
+
+    tables: list[DocumentTable] = Field(
+        default_factory=list, description="One entry per Table region, empty if none"
+    )
+
+
+class BatchPredictResponse(BaseModel):
+    """Response for POST /predict_batch."""
+
+    request_id: str = Field(..., description="Unique request identifier")
+    latency_ms: float = Field(..., description="Total inference latency in milliseconds")
+    num_pages: int = Field(..., ge=0, description="Number of pages in the request")
+    pages: list[PageResult] = Field(default_factory=list, description="One result per page, in input order")
+
+
+class JobResponse(BaseModel):
+    """Response for POST /jobs and GET /jobs/{job_id}."""
+
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    num_pages: int = Field(..., ge=0, description="Number of pages in the job")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    started_at: float | None = Field(default=None, description="Start of the last attempt")
+    finished_at: float | None = Field(default=None, description="Completion time")
+    attempts: int = Field(default=0, description="Number of times a worker picked up the job")
+    error: str | None = Field(default=None, description="Error message of a failed job")
+    result: BatchPredictResponse | None = Field(
+        default=None, description="Result of a succeeded job"
+    )
@@ -0,0 +1,75 @@
+"""
+Per-request stage timing.
+
+Each request records how long it spent in every stage (upload, cache,
+queue, decode, preprocess, forward, postprocess, serialize). The durations
+are observed in the inference_stage_latency_seconds{service,model,stage}
+histogram and returned to the client as a Server-Timing header, so a slow
+request can be diagnosed from the client side.
+"""
+
+import time
+from contextlib import contextmanager
+
+from .metrics import STAGE_LATENCY
+
+SERVICE = "layout"
+
+
+class ArrivalTimeMiddleware:
+    """Record when a request arrived, before its body is received and parsed."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+
+class StageTimer:
+    """Accumulates the seconds spent in each stage of one request."""
+
+    def __init__(self, started_at: float | None = None):
+        self.stages: dict[str, float] = {}
+        self._started_at = time.perf_counter() if started_at is None else started_at
+
+    @classmethod
+    def for_request(cls, request) -> "StageTimer":
+        """Timer starting at request arrival; receiving the body counts as upload."""
+        received_at = getattr(request.state, "received_at", None)
+        timer = cls(received_at)
+        if received_at is not None:
+            timer.add("upload", time.perf_counter() - received_at)
+        return timer
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def merge(self, timings: dict[str, float]) -> None:
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def observe(self, model: str) -> None:
+        for stage, seconds in self.stages.items():
+            STAGE_LATENCY.labels(service=SERVICE, model=model, stage=stage).observe(
+                seconds
+            )
+
+    def header(self) -> str:
+        """Server-Timing value, e.g. "decode;dur=3.12, forward;dur=85.40, total;dur=95.02"."""
+        total_ms = (time.perf_counter() - self._started_at) * 1000
+        entries = [
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items()
+        ]
+        entries.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(entries)
@@ -0,0 +1,368 @@
+"""
+KServe V2 / Open Inference Protocol for the layout service.
+
+Implements the REST protocol (server and model metadata, health, infer) with
+the binary tensor data extension: the request body is a JSON header of
+Inference-Header-Content-Length bytes followed by the raw data of every input
+that declares parameters.binary_data_size, in input order. Outputs requested
+with parameters.binary_data (or binary_data_output on the request) are
+returned the same way. Batched uint8 pages thus reach the model without
+multipart framing, base64 or JSON number lists; binary inputs are wrapped
+with np.frombuffer, not copied.
+
+Model tensors:
+- inputs: image UINT8 [N,H,W,C] (or [H,W,C]; parameters.channel_order RGB|BGR),
+  or encoded_image BYTES [N] (PNG/JPEG/WebP files)
+- outputs: num_boxes INT32 [N], boxes FP32 [M,4] (x1,y1,x2,y2 in page
+  coordinates), scores FP32 [M], labels BYTES [M]; the boxes of page i are the
+  num_boxes[i] rows after those of the pages before it
+
+- LAYOUT_V2_MODEL_NAME: model name in the /v2/models/{name} routes
+- LAYOUT_V2_MAX_BODY_MB: request body size limit
+"""
+
+import math
+import os
+import struct
+
+import numpy as np
+from fastapi import HTTPException, Request
+
+from .encoding import dumps, loads
+
+MODEL_NAME = os.environ.get("LAYOUT_V2_MODEL_NAME", "layout")
+MAX_BODY_BYTES = int(os.environ.get("LAYOUT_V2_MAX_BODY_MB", "256")) * 1024 * 1024
+
+HEADER_LENGTH = "Inference-Header-Content-Length"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+EXTENSIONS = ["binary_tensor_data"]
+
+# Binary tensor data is little-endian, row-major
+_DTYPES = {
+    "BOOL": np.dtype(np.bool_),
+    "UINT8": np.dtype("<u1"),
+    "UINT16": np.dtype("<u2"),
+    "UINT32": np.dtype("<u4"),
+    "UINT64": np.dtype("<u8"),
+    "INT8": np.dtype("<i1"),
+    "INT16": np.dtype("<i2"),
+    "INT32": np.dtype("<i4"),
+    "INT64": np.dtype("<i8"),
+    "FP16": np.dtype("<f2"),
+    "FP32": np.dtype("<f4"),
+    "FP64": np.dtype("<f8"),
+}
+_BYTES = "BYTES"
+# BYTES elements are each prefixed with their length as a 4-byte little-endian uint
+_BYTES_LENGTH = struct.Struct("<I")
+
+# model_loader backend -> platform name in the model metadata
+_PLATFORMS = {"torch": "pytorch", "onnxruntime": "onnxruntime_onnx"}
+
+MODEL_INPUTS = [
+    {"name": "image", "datatype": "UINT8", "shape": [-1, -1, -1, 3]},
+    {"name": "encoded_image", "datatype": "BYTES", "shape": [-1]},
+]
+MODEL_OUTPUTS = [
+    {"name": "num_boxes", "datatype": "INT32", "shape": [-1]},
+    {"name": "boxes", "datatype": "FP32", "shape": [-1, 4]},
+    {"name": "scores", "datatype": "FP32", "shape": [-1]},
+    {"name": "labels", "datatype": "BYTES", "shape": [-1]},
+]
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=detail)
+
+
+def server_metadata(version: str) -> dict:
+    return {"name": "layout", "version": version, "extensions": EXTENSIONS}
+
+
+def model_metadata(backend: str) -> dict:
+    return {
+        "name": MODEL_NAME,
+        "versions": [],
+        "platform": _PLATFORMS.get(backend, backend),
+        "inputs": MODEL_INPUTS,
+        "outputs": MODEL_OUTPUTS,
+    }
+
+
+def check_model(model_name: str) -> None:
+    if model_name != MODEL_NAME:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_name}")
+
+
+async def read_body(request: Request) -> bytes:
+    """Read the request body, enforcing MAX_BODY_BYTES while it streams in."""
+    max_mb = MAX_BODY_BYTES // (1024 * 1024)
+    content_length = request.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BODY_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"Request too large. Max size: {max_mb}MB"
+        )
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPException(
+                status_code=413, detail=f"Request too large. Max size: {max_mb}MB"
+            )
+        chunks.append(chunk)
+    if size == 0:
+        raise _bad_request("Empty request body")
+    return b"".join(chunks)
+
+
+class InferRequest:
+    """A parsed infer request: decoded input tensors and the request options."""
+
+    def __init__(self, header: dict, inputs: dict[str, np.ndarray]):
+        self.id = header.get("id")
+        self.inputs = inputs
+        self.input_parameters = {
+            tensor["name"]: tensor.get("parameters") or {} for tensor in header["inputs"]
+        }
+        self.outputs = header.get("outputs")
+        self.parameters = header.get("parameters") or {}
+
+
+def _tensor_spec(tensor) -> tuple[str, str, list[int]]:
+    if not isinstance(tensor, dict) or not isinstance(tensor.get("name"), str):
+        raise _bad_request("Every input needs a name")
+    name = tensor["name"]
+    datatype = tensor.get("datatype")
+    if datatype != _BYTES and datatype not in _DTYPES:
+        raise _bad_request(f"Input {name}: unsupported datatype {datatype!r}")
+    shape = tensor.get("shape")
+    if (
+        not isinstance(shape, list)
+        or not all(isinstance(dim, int) and dim >= 0 for dim in shape)
+    ):
+        raise _bad_request(f"Input {name}: shape must be a list of non-negative ints")
+    return name, datatype, shape
+
+
+def _split_bytes_elements(buf: memoryview, name: str) -> list[bytes]:
+    elements = []
+    offset = 0
+    while offset < len(buf):
+        if offset + _BYTES_LENGTH.size > len(buf):
+            raise _bad_request(f"Input {name}: truncated BYTES element length")
+        (length,) = _BYTES_LENGTH.unpack_from(buf, offset)
+        offset += _BYTES_LENGTH.size
+        if offset + length > len(buf):
+            raise _bad_request(f"Input {name}: truncated BYTES element")
+        elements.append(bytes(buf[offset : offset + length]))
+        offset += length
+    return elements
+
+
+def _object_array(elements: list, shape: list[int]) -> np.ndarray:
+    array = np.empty(len(elements), dtype=object)
+    array[:] = elements
+    return array.reshape(shape)
+
+
+def _binary_tensor(
+    buf: memoryview, name: str, datatype: str, shape: list[int]
+) -> np.ndarray:
+    count = math.prod(shape)
+    if datatype == _BYTES:
+        elements = _split_bytes_elements(buf, name)
+        if len(elements) != count:
+            raise _bad_request(
+                f"Input {name}: {len(elements)} BYTES elements, shape {shape} needs {count}"
+            )
+        return _object_array(elements, shape)
+
+    dtype = _DTYPES[datatype]
+    if len(buf) != count * dtype.itemsize:
+        raise _bad_request(
+            f"Input {name}: binary_data_size is {len(buf)}, shape {shape} of {datatype} "
+            f"needs {count * dtype.itemsize}"
+        )
+    return np.frombuffer(buf, dtype=dtype, count=count).reshape(shape)
+
+
+def _json_tensor(data, name: str, datatype: str, shape: list[int]) -> np.ndarray:
+    try:
+        if datatype == _BYTES:
+            elements = [
+                item.encode() if isinstance(item, str) else item
+                for item in np.asarray(data, dtype=object).ravel()
+            ]
+            if not all(isinstance(item, bytes) for item in elements):
+                raise ValueError("BYTES data must be strings")
+            return _object_array(elements, shape)
+        return np.asarray(data, dtype=_DTYPES[datatype]).reshape(shape)
+    except ValueError as e:
+        raise _bad_request(f"Input {name}: invalid data for shape {shape}: {e}")
+
+
+def header_length(headers) -> int | None:
+    """Length of the JSON header of a binary request, None for plain JSON."""
+    value = headers.get(HEADER_LENGTH)
+    if value is None:
+        return None
+    if not value.strip().isdigit():
+        raise _bad_request(f"Invalid {HEADER_LENGTH}: {value!r}")
+    return int(value)
+
+
+def parse_infer_request(body: bytes, json_length: int | None) -> InferRequest:
+    """
+    Decode an infer request. json_length is the Inference-Header-Content-Length
+    (None if the whole body is JSON); binary inputs are views into body.
+    """
+    if json_length is None:
+        json_length = len(body)
+    if json_length > len(body):
+        raise _bad_request(f"{HEADER_LENGTH} is larger than the request body")
+
+    view = memoryview(body)
+    try:
+        header = loads(view[:json_length])
+    except ValueError as e:
+        raise _bad_request(f"Invalid request JSON: {e}")
+    if not isinstance(header, dict) or not isinstance(header.get("inputs"), list):
+        raise _bad_request("Request must have an inputs list")
+
+    binary = view[json_length:]
+    offset = 0
+    inputs = {}
+    for tensor in header["inputs"]:
+        name, datatype, shape = _tensor_spec(tensor)
+        parameters = tensor.get("parameters") or {}
+        size = parameters.get("binary_data_size")
+        if size is not None:
+            if not isinstance(size, int) or size < 0 or offset + size > len(binary):
+                raise _bad_request(f"Input {name}: binary_data_size exceeds the body")
+            inputs[name] = _binary_tensor(
+                binary[offset : offset + size], name, datatype, shape
+            )
+            offset += size
+        elif "data" in tensor:
+            inputs[name] = _json_tensor(tensor["data"], name, datatype, shape)
+        else:
+            raise _bad_request(f"Input {name} has neither data nor binary_data_size")
+    if offset != len(binary):
+        raise _bad_request(
+            f"{len(binary) - offset} bytes of binary data not claimed by any input"
+        )
+    return InferRequest(header, inputs)
+
+
+def _output_tensor(name: str, datatype: str, array: np.ndarray, binary: bool):
+    """(tensor JSON, binary data or None)."""
+    tensor = {"name": name, "datatype": datatype, "shape": list(array.shape)}
+    flat = array.ravel()
+    if datatype == _BYTES:
+        elements = [item.encode() if isinstance(item, str) else item for item in flat]
+        if not binary:
+            tensor["data"] = [element.decode() for element in elements]
+            return tensor, None
+        data = b"".join(_BYTES_LENGTH.pack(len(e)) + e for e in elements)
+    else:
+        if not binary:
+            tensor["data"] = flat.tolist()
+            return tensor, None
+        data = np.ascontiguousarray(flat, dtype=_DTYPES[datatype]).tobytes()
+    tensor["parameters"] = {"binary_data_size": len(data)}
+    return tensor, data
+
+
+def encode_infer_response(
+    request: InferRequest,
+    response_id: str,
+    outputs: dict[str, tuple[str, np.ndarray]],
+) -> tuple[bytes, int | None]:
+    """
+    Serialize the requested outputs (all of them if the request names none).
+    Returns the body and the length of its JSON header, None if there is no
+    binary data.
+    """
+    binary_default = bool(request.parameters.get("binary_data_output", False))
+    if request.outputs is None:
+        selected = [(name, binary_default) for name in outputs]
+    else:
+        selected = []
+        for requested in request.outputs:
+            name = requested.get("name") if isinstance(requested, dict) else None
+            if name not in outputs:
+                raise _bad_request(f"Unknown output: {name}")
+            parameters = requested.get("parameters") or {}
+            selected.append((name, bool(parameters.get("binary_data", binary_default))))
+
+    tensors = []
+    binary_data = []
+    for name, binary in selected:
+        datatype, array = outputs[name]
+        tensor, data = _output_tensor(name, datatype, array, binary)
+        tensors.append(tensor)
+        if data is not None:
+            binary_data.append(data)
+
+    header = dumps({"model_name": MODEL_NAME, "id": response_id, "outputs": tensors})
+    if not binary_data:
+        return header, None
+    return header + b"".join(binary_data), len(header)
+
+
+def page_pixels(request: InferRequest) -> np.ndarray | None:
+    """The image input as an NxHxWxC uint8 array, if given."""
+    image = request.inputs.get("image")
+    if image is None:
+        return None
+    if image.dtype != np.uint8:
+        raise _bad_request("Input image must be UINT8")
+    if image.ndim == 3:
+        image = image[np.newaxis]
+    if image.ndim != 4 or image.shape[3] not in (1, 3, 4) or 0 in image.shape:
+        raise _bad_request(
+            f"Input image must be [N,H,W,C] with C in (1, 3, 4), got {list(image.shape)}"
+        )
+    return image
+
+
+def pixel_channel_order(request: InferRequest) -> str:
+    """Channel order of the image input: RGB (default) or BGR."""
+    order = str(request.input_parameters["image"].get("channel_order", "RGB")).upper()
+    if order not in ("RGB", "BGR"):
+        raise _bad_request("Input image: channel_order must be RGB or BGR")
+    return order
+
+
+def encoded_pages(request: InferRequest) -> list[bytes] | None:
+    """The encoded_image input as a list of encoded files, if given."""
+    encoded = request.inputs.get("encoded_image")
+    if encoded is None:
+        return None
+    if encoded.dtype != object:
+        raise _bad_request("Input encoded_image must be BYTES")
+    pages = list(encoded.ravel())
+    if not pages or not all(pages):
+        raise _bad_request("Input encoded_image must hold at least one non-empty file")
+    return pages
+
+
+def pages_to_outputs(pages: list[dict]) -> dict[str, tuple[str, np.ndarray]]:
+    """Output tensors for page results shaped like schemas.PredictResponse."""
+    boxes = [box for page in pages for box in page["boxes"]]
+    return {
+        "num_boxes": (
+            "INT32",
+            np.array([len(page["boxes"]) for page in pages], dtype=np.int32),
+        ),
+        "boxes": (
+            "FP32",
+            np.array(
+                [[box["x1"], box["y1"], box["x2"], box["y2"]] for box in boxes],
+                dtype=np.float32,
+            ).reshape(-1, 4),
+        ),
+        "scores": ("FP32", np.array([box["conf"] for box in boxes], dtype=np.float32)),
+        "labels": ("BYTES", _object_array([box["text"] for box in boxes], [len(boxes)])),
+    }
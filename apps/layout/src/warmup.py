@@ -0,0 +1,115 @@
+"""
+Eager model load and warm-up for the layout service.
+
+The model is loaded in the background when the service starts, then run on
+synthetic pages so weight loading, oneDNN primitive creation and allocator
+growth happen before the pod takes traffic. /readyz only passes once this has
+finished; /livez fails if it raised.
+
+- LAYOUT_WARMUP_SHAPES: comma-separated WxH page sizes (empty = no warm-up)
+- LAYOUT_WARMUP_BATCH_SIZES: comma-separated predict_batch sizes to run per shape
+- LAYOUT_TABLE_PRELOAD: also load the /document table model and run it on one
+  synthetic table
+"""
+
+import logging
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from .document import TABLE_LABEL, predict_tables
+from .executor import InferenceExecutor
+from .metrics import STARTUP_SECONDS
+from .model_loader import get_predictor, get_table_predictor, table_preload
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sizes(spec: str) -> list[tuple[int, int]]:
+    """Parse "1275x1650,1654x2339" into [(1275, 1650), (1654, 2339)]."""
+    sizes = []
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        width, height = item.split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def synthetic_page(width: int, height: int) -> Image.Image:
+    """White page with dark bars in a two-column text layout."""
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    margin = max(1, width // 12)
+    column_width = (width - 3 * margin) // 2
+    line_height = max(2, height // 80)
+    for column in range(2):
+        x0 = margin + column * (column_width + margin)
+        for y in range(margin, height - margin, 2 * line_height):
+            page[y : y + line_height, x0 : x0 + column_width] = 40
+    return Image.fromarray(page)
+
+
+def warm_up(shapes: list[tuple[int, int]], batch_sizes: list[int]) -> None:
+    """Run predict_batch on synthetic pages of every shape and batch size."""
+    predictor = get_predictor()
+    for width, height in shapes:
+        page = synthetic_page(width, height)
+        for batch_size in batch_sizes:
+            t0 = time.perf_counter()
+            predictor.predict_batch([page] * batch_size)
+            logger.info(
+                "Warm-up page=%dx%d batch_size=%d latency_ms=%.2f",
+                width,
+                height,
+                batch_size,
+                (time.perf_counter() - t0) * 1000,
+            )
+
+
+def warm_up_tables() -> None:
+    """Run the table model on one table region of a synthetic page."""
+    page = synthetic_page(1275, 1650)
+    layout_result = {
+        "boxes": [
+            {"x1": 100, "y1": 200, "x2": 1100, "y2": 600, "text": TABLE_LABEL, "conf": 1.0}
+        ]
+    }
+    t0 = time.perf_counter()
+    predict_tables(page, layout_result)
+    logger.info("Warm-up tables=1 latency_ms=%.2f", (time.perf_counter() - t0) * 1000)
+
+
+async def load_and_warm_up(executor: InferenceExecutor) -> None:
+    """Load the model and run warm-up inferences on the executor."""
+    try:
+        shapes = parse_sizes(os.environ.get("LAYOUT_WARMUP_SHAPES", "1275x1650"))
+        batch_sizes = [
+            int(size)
+            for size in os.environ.get("LAYOUT_WARMUP_BATCH_SIZES", "1,8").split(",")
+            if size.strip()
+        ]
+
+        t0 = time.perf_counter()
+        await executor.run(get_predictor, bounded=False)
+        STARTUP_SECONDS.labels(phase="load").set(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await executor.run(warm_up, shapes, batch_sizes, bounded=False)
+        STARTUP_SECONDS.labels(phase="warmup").set(time.perf_counter() - t0)
+        logger.info("Layout model warm (shapes=%s, batch_sizes=%s)", shapes, batch_sizes)
+
+        if table_preload():
+            t0 = time.perf_counter()
+            await executor.run(get_table_predictor, bounded=False)
+            STARTUP_SECONDS.labels(phase="table_load").set(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await executor.run(warm_up_tables, bounded=False)
+            STARTUP_SECONDS.labels(phase="table_warmup").set(time.perf_counter() - t0)
+            logger.info("Table model warm")
+    except Exception:
+        logger.exception("Layout model startup failed")
+        raise
@@ -0,0 +1,160 @@
+"""
+Job worker for the layout service.
+
+Pulls jobs submitted through POST /jobs from the job queue, runs layout
+prediction on their pages and stores the result for GET /jobs/{id}. Runs as
+its own process (or pod) next to the API and scales on
+layout_job_queue_depth{status="queued"}; its own metrics are served on
+LAYOUT_WORKER_METRICS_PORT.
+
+- LAYOUT_WORKER_POLL_SECONDS: sleep between polls of an empty queue
+- LAYOUT_JOB_RETENTION_SECONDS: finished jobs (and their results) are deleted
+  after this long
+
+Run: python -m src.worker
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from prometheus_client import start_http_server
+
+from .encoding import dumps
+from .ingest import decode_image
+from .inference import plan_chunks, predict_pages
+from .jobs import Job, JobQueue, create_job_queue, observe_queue
+from .metrics import JOB_DURATION, JOBS_TOTAL
+from .model_loader import get_predictor, input_size
+from .warmup import parse_sizes, warm_up
+
+logger = logging.getLogger("layout.worker")
+
+BATCH_MEMORY_BYTES = int(os.environ.get("LAYOUT_BATCH_MEMORY_MB", "1024")) * 1024 * 1024
+PAGE_OVERHEAD_BYTES = int(os.environ.get("LAYOUT_PAGE_MEMORY_MB", "64")) * 1024 * 1024
+JPEG_DRAFT = os.environ.get("LAYOUT_JPEG_DRAFT", "1").lower() in {"1", "true", "yes"}
+
+
+def run_job(job: Job, contents: list[bytes]) -> bytes:
+    """Run layout prediction over the pages of a job; returns the serialized result."""
+    draft_size = input_size() if JPEG_DRAFT else None
+    images = [decode_image(content, draft_size) for content in contents]
+    del contents
+
+    pages = []
+    inference_ms = 0.0
+    chunks = plan_chunks(
+        [image.size for image in images], BATCH_MEMORY_BYTES, PAGE_OVERHEAD_BYTES
+    )
+    for chunk in chunks:
+        chunk_pages = predict_pages(images[chunk.start : chunk.stop], job.id, chunk.start)
+        inference_ms += chunk_pages[0]["latency_ms"]
+        pages.extend(chunk_pages)
+
+    return dumps(
+        {
+            "request_id": job.id,
+            "latency_ms": round(inference_ms, 2),
+            "num_pages": len(pages),
+            "pages": pages,
+        }
+    )
+
+
+class _LeaseKeeper:
+    """Renews the lease of the running job until stopped."""
+
+    def __init__(self, job_queue: JobQueue, job_id: str, worker_id: str, interval: float):
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(job_queue, job_id, worker_id, interval),
+            name="layout-lease",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self, job_queue, job_id, worker_id, interval) -> None:
+        while not self._stopped.wait(interval):
+            if not job_queue.renew(job_id, worker_id):
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def main() -> None:
+    poll_seconds = float(os.environ.get("LAYOUT_WORKER_POLL_SECONDS", "0.5"))
+    retention_seconds = float(os.environ.get("LAYOUT_JOB_RETENTION_SECONDS", "86400"))
+    metrics_port = int(os.environ.get("LAYOUT_WORKER_METRICS_PORT", "9100"))
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    job_queue = create_job_queue()
+    start_http_server(metrics_port)
+
+    get_predictor()
+    warm_up(parse_sizes(os.environ.get("LAYOUT_WARMUP_SHAPES", "1275x1650")), [1])
+    logger.info("Layout worker %s ready, polling for jobs", worker_id)
+
+    stopping = threading.Event()
+
+    def _stop(signum, _frame):
+        # The running job is finished first; only polling stops
+        logger.info("Layout worker %s stopping on signal %d", worker_id, signum)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    last_purge = 0.0
+    while not stopping.is_set():
+        if time.monotonic() - last_purge > 600:
+            purged = job_queue.purge(retention_seconds)
+            if purged:
+                logger.info("Purged %d finished jobs", purged)
+            last_purge = time.monotonic()
+
+        observe_queue(job_queue)
+        job = job_queue.claim(worker_id)
+        if job is None:
+            stopping.wait(poll_seconds)
+            continue
+
+        t0 = time.perf_counter()
+        lease = _LeaseKeeper(job_queue, job.id, worker_id, job_queue.lease_seconds / 3)
+        try:
+            result = run_job(job, job_queue.inputs(job.id))
+            job_queue.complete(job.id, worker_id, result)
+            status = "succeeded"
+        except Exception as e:
+            logger.exception("job_id=%s failed", job.id)
+            job_queue.fail(job.id, worker_id, str(e))
+            status = "failed"
+        finally:
+            lease.stop()
+
+        latency_sec = time.perf_counter() - t0
+        JOBS_TOTAL.labels(status=status).inc()
+        JOB_DURATION.observe(latency_sec)
+        logger.info(
+            "job_id=%s tenant_id=%s status=%s attempt=%d pages=%d latency_ms=%.2f",
+            job.id,
+            job.tenant_id,
+            status,
+            job.attempts,
+            job.num_inputs,
+            latency_sec * 1000,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='{"time":"%(asctime)s","name":"%(name)s","level":"%(levelname)s","message":"%(message)s"}',
+    )
+    main()
@@ -0,0 +1,40 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.deadline import HEADER, DeadlineMiddleware, request_timeout
+
+
+def _headers(timeout: str) -> list[tuple[bytes, bytes]]:
+    return [(HEADER.encode(), timeout.encode())]
+
+
+def test_request_timeout():
+    assert request_timeout([], 120.0) == 120.0
+    assert request_timeout(_headers("5"), 120.0) == 5.0
+    # A client can not extend the server default
+    assert request_timeout(_headers("500"), 120.0) == 120.0
+    assert request_timeout(_headers("abc"), 120.0) == 120.0
+    assert request_timeout([], 0.0) is None
+    assert request_timeout(_headers("500"), 0.0) == 500.0
+
+
+def test_path_timeouts():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, path_timeouts={"/slow": 0.0, "/fast": 0.05})
+
+    async def handler(request: Request):
+        await asyncio.sleep(0.2)
+        return {"deadline": request.state.deadline}
+
+    app.post("/slow")(handler)
+    app.post("/fast")(handler)
+
+    with TestClient(app) as client:
+        response = client.post("/slow")
+        assert response.status_code == 200
+        assert response.json() == {"deadline": None}
+
+        assert client.post("/fast").status_code == 504
+        assert client.post("/slow", headers={HEADER: "0.05"}).status_code == 504
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from src.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, SQLiteJobQueue
+
+LEASE_SECONDS = 0.05
+
+
+@pytest.fixture
+def queue(tmp_path) -> SQLiteJobQueue:
+    return SQLiteJobQueue(str(tmp_path), lease_seconds=LEASE_SECONDS, max_attempts=2)
+
+
+def _expire_lease():
+    time.sleep(LEASE_SECONDS * 2)
+
+
+def test_submit_claim_complete(queue):
+    job = queue.submit([b"page-1", b"page-2"], {"threshold": 0.3}, tenant_id="t1")
+    assert queue.get(job.id).status == QUEUED
+    assert queue.inputs(job.id) == [b"page-1", b"page-2"]
+
+    claimed = queue.claim("worker-a")
+    assert claimed.id == job.id
+    assert claimed.status == RUNNING
+    assert claimed.attempts == 1
+    assert queue.claim("worker-b") is None
+
+    queue.complete(job.id, "worker-a", b'{"pages": []}')
+    assert queue.get(job.id).status == SUCCEEDED
+    assert queue.result(job.id) == b'{"pages": []}'
+
+
+def test_claim_after_lease_expiry(queue):
+    job = queue.submit([b"page"], {})
+    queue.claim("worker-a")
+    assert queue.claim("worker-b") is None
+
+    _expire_lease()
+    claimed = queue.claim("worker-b")
+    assert claimed.id == job.id
+    assert claimed.attempts == 2
+    assert queue.renew(job.id, "worker-b")
+
+
+def test_fail_after_max_attempts(queue):
+    job = queue.submit([b"page"], {})
+    for worker_id in ("worker-a", "worker-b"):
+        assert queue.claim(worker_id).id == job.id
+        _expire_lease()
+
+    assert queue.claim("worker-c") is None
+    failed = queue.get(job.id)
+    assert failed.status == FAILED
+    assert failed.error == "Worker lost while running the job"
+
+
+def test_lost_lease(queue):
+    job = queue.submit([b"page"], {})
+    queue.claim("worker-a")
+    assert queue.renew(job.id, "worker-a")
+
+    _expire_lease()
+    queue.claim("worker-b")
+    assert not queue.renew(job.id, "worker-a")
+
+    # The result of the worker that lost the job does not finish it
+    queue.fail(job.id, "worker-a", "late failure")
+    assert queue.get(job.id).status == RUNNING
+    assert queue.renew(job.id, "worker-b")
+
+    queue.complete(job.id, "worker-b", b"{}")
+    assert queue.get(job.id).status == SUCCEEDED
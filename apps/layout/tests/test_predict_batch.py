@@ -0,0 +1,20 @@
+import io
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.main import app
+
+
+def test_rejects_pixel_uploads():
+    buffer = io.BytesIO()
+    np.save(buffer, np.zeros((4, 4, 3), dtype=np.uint8))
+    # No lifespan: the request must be rejected before it needs the model
+    client = TestClient(app)
+    app.state.executor = None
+    response = client.post(
+        "/predict_batch",
+        files=[("files", ("page.npy", buffer.getvalue(), "application/x-npy"))],
+    )
+    assert response.status_code == 400
+    assert "raw pixels" in response.json()["detail"]
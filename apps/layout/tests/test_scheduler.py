@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from src.executor import QueueFullError
+from src.scheduler import FairScheduler, TenantQueueFullError
+
+
+async def _hold(scheduler: FairScheduler, tenant_id: str, order: list, release):
+    async with scheduler.slot(tenant_id):
+        order.append(tenant_id)
+        await release.wait()
+
+
+def test_late_tenant_is_not_stuck_behind_backlog():
+    async def run():
+        scheduler = FairScheduler(concurrency=1)
+        order: list[str] = []
+        release = asyncio.Event()
+        release.set()
+        async with scheduler.slot("bulk"):
+            tasks = [
+                asyncio.create_task(_hold(scheduler, "bulk", order, release))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0)
+            tasks.append(
+                asyncio.create_task(_hold(scheduler, "interactive", order, release))
+            )
+            await asyncio.sleep(0)
+            assert scheduler.running == 1
+            assert scheduler.queued == 4
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "bulk", "bulk", "bulk"]
+
+
+def test_weights():
+    async def run():
+        scheduler = FairScheduler(concurrency=1, weights={"heavy": 4})
+        order: list[str] = []
+        release = asyncio.Event()
+        release.set()
+        async with scheduler.slot("blocker"):
+            tasks = [
+                asyncio.create_task(_hold(scheduler, tenant_id, order, release))
+                for tenant_id in ["heavy"] * 3 + ["light"] * 3
+            ]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(run())
+    # At weight 4 the three heavy requests are tagged before the first light one
+    assert order[:4] == ["heavy", "heavy", "heavy", "light"]
+
+
+def test_queue_limits():
+    async def run():
+        scheduler = FairScheduler(concurrency=1, max_queue_per_tenant=1, max_queue=2)
+        order: list[str] = []
+        release = asyncio.Event()
+        async with scheduler.slot("a"):
+            waiting = [
+                asyncio.create_task(_hold(scheduler, tenant_id, order, release))
+                for tenant_id in ("a", "b")
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(TenantQueueFullError):
+                async with scheduler.slot("a"):
+                    pass
+            with pytest.raises(QueueFullError) as exc_info:
+                scheduler.check_admission("c")
+            assert not isinstance(exc_info.value, TenantQueueFullError)
+        release.set()
+        await asyncio.gather(*waiting)
+        assert scheduler.running == 0
+        assert scheduler.queued == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = FairScheduler(concurrency=1)
+        async with scheduler.slot("a"):
+            waiter = asyncio.create_task(_hold(scheduler, "b", [], asyncio.Event()))
+            await asyncio.sleep(0)
+            assert scheduler.queued == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert scheduler.queued == 0
+        assert scheduler.running == 0
+
+    asyncio.run(run())
@@ -0,0 +1,120 @@
+"""
+Content-addressed result cache for table structure predictions.
+
+Results are keyed by a SHA-256 over the image bytes, the table bboxes, the
+optional IOCR JSON and the identity of the model that produced them, and
+stored as serialized JSON. Two tiers:
+- memory: LRU bounded by TABLE_CACHE_MAX_MB
+- disk (optional): one file per entry under TABLE_CACHE_DIR, shared by
+  workers and surviving restarts; promoted to memory on hit
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .metrics import CACHE_BYTES, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+BYPASS_HEADER = "X-Cache-Bypass"
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of serialized results."""
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None):
+        self.max_bytes = max(0, max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.disk_dir is not None
+
+    @staticmethod
+    def make_key(content: bytes, *parts: str) -> str:
+        """Hash the payload together with everything that affects the result."""
+        h = hashlib.sha256(content)
+        for part in parts:
+            h.update(b"\0")
+            h.update(part.encode())
+        return h.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is not None:
+            CACHE_LOOKUPS.labels(result="hit", tier="memory").inc()
+            return value
+
+        if self.disk_dir is not None:
+            try:
+                value = self._disk_path(key).read_bytes()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Cache disk read failed for %s: %s", key, e)
+            if value is not None:
+                CACHE_LOOKUPS.labels(result="hit", tier="disk").inc()
+                self._put_memory(key, value)
+                return value
+
+        CACHE_LOOKUPS.labels(result="miss", tier="all").inc()
+        return None
+
+    def _put_memory(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+            CACHE_BYTES.set(self._size)
+
+    def put(self, key: str, value: bytes) -> None:
+        self._put_memory(key, value)
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                path.parent.mkdir(exist_ok=True)
+                tmp_path.write_bytes(value)
+                # Atomic rename: concurrent readers never see a partial entry
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("Cache disk write failed for %s: %s", key, e)
+                tmp_path.unlink(missing_ok=True)
+
+
+def is_bypassed(headers) -> bool:
+    """Per-request opt-out: X-Cache-Bypass: 1 or Cache-Control: no-cache/no-store."""
+    if headers.get(BYPASS_HEADER, "").lower() in {"1", "true", "yes"}:
+        return True
+    cache_control = headers.get("Cache-Control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+def create_cache() -> ResultCache:
+    """Create a ResultCache configured from the environment."""
+    max_mb = float(os.environ.get("TABLE_CACHE_MAX_MB", "256"))
+    disk_dir = os.environ.get("TABLE_CACHE_DIR", "").strip() or None
+    logger.info("Table result cache with max_mb=%s, disk_dir=%s", max_mb, disk_dir)
+    return ResultCache(max_bytes=int(max_mb * 1024 * 1024), disk_dir=disk_dir)
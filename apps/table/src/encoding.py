@@ -0,0 +1,85 @@
+"""
+Fast JSON serialization and negotiated response compression.
+
+Responses are built as plain dicts shaped like the models in schemas.py and
+serialized with orjson; building and serializing pydantic TableCell models
+field by field costs more CPU than the rest of the response path for tables
+with hundreds of cells. The schemas are still used to document the API.
+
+Bodies are compressed with zstd or gzip when the client's Accept-Encoding
+allows it (zstd preferred on equal q-values).
+
+- TABLE_COMPRESS_MIN_BYTES: smaller bodies are sent uncompressed
+- TABLE_GZIP_LEVEL / TABLE_ZSTD_LEVEL: compression levels
+"""
+
+import os
+import zlib
+
+import orjson
+import zstandard
+
+COMPRESS_MIN_BYTES = int(os.environ.get("TABLE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("TABLE_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.environ.get("TABLE_ZSTD_LEVEL", "3"))
+
+# In order of preference when the client accepts several with the same q-value
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+# zlib wbits selecting the gzip container
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def dumps(obj) -> bytes:
+    """Serialize a response dict to JSON bytes."""
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def loads(data: bytes):
+    return orjson.loads(data)
+
+
+def negotiate(accept_encoding: str, size: int | None = None) -> str | None:
+    """
+    Pick the content encoding for a response from the Accept-Encoding header.
+    Returns None (identity) if the client accepts none of SUPPORTED_ENCODINGS,
+    or if size is given and smaller than COMPRESS_MIN_BYTES.
+    """
+    if size is not None and size < COMPRESS_MIN_BYTES:
+        return None
+
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        accepted[coding.strip()] = q
+
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str | None) -> bytes:
+    """Compress a whole response body; identity if encoding is None."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, _GZIP_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    return body
+
+
+def encoding_headers(encoding: str | None) -> dict[str, str]:
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return headers
+
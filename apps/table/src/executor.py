@@ -0,0 +1,101 @@
+"""
+Bounded executor for blocking decode and inference work.
+
+PIL decoding and torch inference are CPU-bound and must not run on the
+asyncio event loop, otherwise a single slow page stalls /healthz and /metrics.
+Work is handed to a dedicated thread pool with a fixed number of workers and
+a bounded number of queued jobs; once the queue is full new work is rejected
+immediately with QueueFullError instead of piling up.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when no more work can be queued."""
+
+    def __init__(self, message: str = "Server busy, retry later", retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Thread pool with a cap on running + queued jobs."""
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, name: str = "table"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.max_workers = max_workers
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-infer"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs currently running or queued."""
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        """Number of jobs currently running on a worker thread."""
+        return min(self._pending, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker thread."""
+        return max(0, self._pending - self.max_workers)
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of worker threads busy."""
+        return self.running / self.max_workers
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(
+        self, fn: Callable[..., Any], *args: Any, bounded: bool = True, **kwargs: Any
+    ) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool and await its result.
+        Raises QueueFullError if bounded and max_workers + max_queue jobs are pending.
+        """
+        with self._lock:
+            if bounded and self._pending >= self.max_workers + self.max_queue:
+                raise QueueFullError()
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # Slot is released when the job finishes (or is cancelled while still
+        # queued), not when the awaiting request goes away.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_executor() -> InferenceExecutor:
+    """Create an InferenceExecutor configured from the environment."""
+    max_workers = int(os.environ.get("TABLE_EXECUTOR_WORKERS", "2"))
+    max_queue = int(os.environ.get("TABLE_EXECUTOR_QUEUE", "32"))
+    logger.info(
+        "Table executor with max_workers=%s, max_queue=%s", max_workers, max_queue
+    )
+    return InferenceExecutor(max_workers=max_workers, max_queue=max_queue, name="table")
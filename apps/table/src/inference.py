@@ -5,12 +5,9 @@ Inference logic for table structure prediction.
 import copy
 import time
 
-import cv2
 import numpy as np
-from PIL import Image
 
 from .metrics import INFERENCE_LATENCY, TABLES_PER_REQUEST
-from .schemas import Bbox, PredictResponse, TableCell, TableResult
 
 
 def _build_iocr_page(
@@ -54,11 +51,8 @@ def _build_iocr_page(
             "lang": ["en"],
         }
 
-    # TFPredictor expects BGR (cv2 format)
-    if len(image.shape) == 3 and image.shape[2] == 3:
-        page["image"] = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-    else:
-        page["image"] = image
+    # TFPredictor expects BGR (cv2 format); the ingest layer already decodes to BGR
+    page["image"] = image
     page["table_bboxes"] = copy.deepcopy(table_bboxes)
     return page
 
@@ -73,19 +67,29 @@ def _extract_text_from_cell(cell: dict) -> str:
 
 
 def predict(
-    image: Image.Image,
+    image: np.ndarray,
     table_bboxes: list[list[int]],
     request_id: str,
     iocr_json: dict | None = None,
-) -> PredictResponse:
-    """Run table structure prediction on image with given table regions."""
+    timings: dict[str, float] | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Run table structure prediction on a BGR image with given table regions.
+    Returns the response as a plain dict shaped like schemas.PredictResponse.
+    If timings is given, seconds per stage are added to it.
+    deadline is an absolute time.monotonic() value; past it DeadlineExceeded is
+    raised between tables or decode steps.
+    """
     from .model_loader import get_predictor
 
     predictor = get_predictor()
 
-    img_np = np.array(image.convert("RGB"))
-    h, w = img_np.shape[:2]
-    iocr_page = _build_iocr_page(img_np, w, h, table_bboxes, iocr_json)
+    t0 = time.perf_counter()
+    h, w = image.shape[:2]
+    iocr_page = _build_iocr_page(image, w, h, table_bboxes, iocr_json)
+    if timings is not None:
+        timings["preprocess"] = timings.get("preprocess", 0.0) + time.perf_counter() - t0
 
     t0 = time.perf_counter()
     # Pass copy - TFPredictor mutates table_bboxes in place
@@ -95,6 +99,8 @@ def predict(
         do_matching=True,
         correct_overlapping_cells=False,
         sort_row_col_indexes=True,
+        timings=timings,
+        deadline=deadline,
     )
     latency_sec = time.perf_counter() - t0
     latency_ms = latency_sec * 1000
@@ -102,7 +108,10 @@ def predict(
     INFERENCE_LATENCY.observe(latency_sec)
     TABLES_PER_REQUEST.observe(len(multi_tf_output))
 
-    tables: list[TableResult] = []
+    # Plain dicts instead of TableCell models: a table can have hundreds of
+    # cells and the TFPredictor output needs no validation, only the casts
+    # pydantic used to apply (TFPredictor returns numpy scalars in places).
+    tables = []
     for t, tf_output in enumerate(multi_tf_output):
         tf_responses = tf_output["tf_responses"]
         predict_details = tf_output["predict_details"]
@@ -110,35 +119,45 @@ def predict(
         for r in tf_responses:
             bbox = r.get("bbox", {})
             if isinstance(bbox, dict):
-                b = Bbox(l=bbox["l"], t=bbox["t"], r=bbox["r"], b=bbox["b"])
+                b = {
+                    "l": float(bbox["l"]),
+                    "t": float(bbox["t"]),
+                    "r": float(bbox["r"]),
+                    "b": float(bbox["b"]),
+                }
             else:
-                b = Bbox(l=0, t=0, r=0, b=0)
+                b = {"l": 0.0, "t": 0.0, "r": 0.0, "b": 0.0}
             cells.append(
-                TableCell(
-                    bbox=b,
-                    start_row_offset_idx=r.get("start_row_offset_idx", 0),
-                    end_row_offset_idx=r.get("end_row_offset_idx", 0),
-                    start_col_offset_idx=r.get("start_col_offset_idx", 0),
-                    end_col_offset_idx=r.get("end_col_offset_idx", 0),
-                    row_span=r.get("row_span", 1),
-                    col_span=r.get("col_span", 1),
-                    column_header=r.get("column_header", False),
-                    row_header=r.get("row_header", False),
-                    row_section=r.get("row_section", False),
-                    text=_extract_text_from_cell(r),
-                )
+                {
+                    "bbox": b,
+                    "start_row_offset_idx": int(r.get("start_row_offset_idx", 0)),
+                    "end_row_offset_idx": int(r.get("end_row_offset_idx", 0)),
+                    "start_col_offset_idx": int(r.get("start_col_offset_idx", 0)),
+                    "end_col_offset_idx": int(r.get("end_col_offset_idx", 0)),
+                    "row_span": int(r.get("row_span", 1)),
+                    "col_span": int(r.get("col_span", 1)),
+                    "column_header": bool(r.get("column_header", False)),
+                    "row_header": bool(r.get("row_header", False)),
+                    "row_section": bool(r.get("row_section", False)),
+                    "text": _extract_text_from_cell(r),
+                }
             )
         tables.append(
-            TableResult(
-                table_index=t,
-                num_rows=predict_details.get("num_rows", 0),
-                num_cols=predict_details.get("num_cols", 0),
-                cells=cells,
-            )
+            {
+                "table_index": t,
+                "num_rows": int(predict_details.get("num_rows", 0)),
+                "num_cols": int(predict_details.get("num_cols", 0)),
+                "cells": cells,
+            }
         )
 
-    return PredictResponse(
-        request_id=request_id,
-        latency_ms=round(latency_ms, 2),
-        tables=tables,
-    )
+    result = {
+        "request_id": request_id,
+        "latency_ms": round(latency_ms, 2),
+        "tables": tables,
+    }
+    if timings is not None:
+        timings["postprocess"] = (
+            timings.get("postprocess", 0.0) + time.perf_counter() - t0 - latency_sec
+        )
+    return result
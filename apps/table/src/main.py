@@ -2,30 +2,59 @@
 FastAPI Table inference service.
 
 Endpoints:
-- GET  /healthz  - Health check
-- POST /predict  - Table structure prediction (image + table_bboxes)
+- GET  /healthz  - Health check (never loads the model)
+- GET  /livez    - Liveness probe
+- GET  /readyz   - Readiness probe: passes once the model is loaded and warmed up
+- POST /predict  - Table structure prediction (image or raw uint8 pixels + table_bboxes)
+- POST /jobs     - Queue a table structure job (same form as /predict), returns a job id
+- GET  /jobs/{job_id} - Job status, and the result once it succeeded
 - GET  /metrics  - Prometheus metrics
+- GET  /saturation - Saturation signals of this worker for autoscaling (JSON)
+- KServe V2 / Open Inference Protocol, with the binary tensor data extension (see v2.py):
+  GET /v2, /v2/health/live, /v2/health/ready, /v2/models/{name}, /v2/models/{name}/ready
+  POST /v2/models/{name}/infer
 """
 
-import io
+import asyncio
 import json
 import logging
+import os
 import time
 import uuid
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import Response
-from PIL import Image
-from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.exception_handlers import http_exception_handler
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from . import v2
+from .cache import ResultCache, create_cache, is_bypassed
+from .deadline import DeadlineMiddleware
+from .encoding import compress, dumps, encoding_headers, loads, negotiate
+from .errors import request_errors
+from .executor import QueueFullError, create_executor
 from .inference import predict
-from .metrics import REQUESTS_TOTAL
-from .model_loader import get_predictor, is_ready
-from .schemas import PredictResponse
+from .ingest import (
+    channel_order,
+    decode_image_bgr,
+    is_pixel_upload,
+    pixels_to_bgr,
+    read_upload,
+    wrap_pixels,
+)
+from .jobs import QUEUED, SUCCEEDED, Job, JobQueue, create_job_queue, observe_queue
+from .metrics import JOBS_TOTAL, REQUESTS_TOTAL, render_metrics
+from .model_loader import model_backend, model_identity, model_name
+from .scheduler import create_scheduler
+from .schemas import JobResponse, PredictResponse
+from .saturation import InflightMiddleware, SaturationMonitor
+from .timing import ArrivalTimeMiddleware, StageTimer
+from .warmup import load_and_warm_up
 
 MAX_IMAGE_SIZE_MB = 50
 MAX_IMAGE_SIZE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024
+MAX_QUEUED_JOBS = int(os.environ.get("TABLE_JOB_MAX_QUEUED", "10000"))
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,11 +63,86 @@ logging.basicConfig(
 logger = logging.getLogger("table")
 
 
+def _cache_key(
+    content: bytes, bboxes: list[list[int]], iocr_json: str | None, *parts: str
+) -> str:
+    return ResultCache.make_key(
+        content, model_identity(), json.dumps(bboxes), iocr_json or "", *parts
+    )
+
+
+def _parse_table_bboxes(table_bboxes: str) -> list[list[int]]:
+    """Validate the table_bboxes form field; raises HTTP 400."""
+    try:
+        bboxes = json.loads(table_bboxes)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid table_bboxes JSON: {e}")
+
+    if not isinstance(bboxes, list) or len(bboxes) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="table_bboxes must be a non-empty array of [x1,y1,x2,y2]",
+        )
+
+    for i, bbox in enumerate(bboxes):
+        if not isinstance(bbox, list) or len(bbox) != 4:
+            raise HTTPException(
+                status_code=400,
+                detail=f"table_bboxes[{i}] must be [x1,y1,x2,y2]",
+            )
+        # Ensure integers
+        bboxes[i] = [int(x) for x in bbox]
+    return bboxes
+
+
+def _parse_iocr_json(iocr_json: str | None) -> dict | None:
+    """Parse the optional iocr_json form field; raises HTTP 400."""
+    if not iocr_json:
+        return None
+    try:
+        return json.loads(iocr_json)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid iocr_json: {e}")
+
+
+def _submit_job(
+    job_queue: JobQueue, content: bytes, params: dict, tenant_id: str
+) -> Job:
+    if job_queue.stats().counts[QUEUED] >= MAX_QUEUED_JOBS:
+        raise QueueFullError("Job queue is full, retry later", retry_after=30)
+    return job_queue.submit([content], params, tenant_id)
+
+
+def _job_response(job: Job, result: bytes | None = None) -> dict:
+    """Shaped like schemas.JobResponse."""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "attempts": job.attempts,
+        "error": job.error,
+        "result": loads(result) if result is not None else None,
+    }
+
+
 @asynccontextmanager
 async def lifespan(app):
     logger.info("Starting Table service")
+    app.state.executor = create_executor()
+    app.state.cache = create_cache()
+    app.state.scheduler = create_scheduler()
+    app.state.job_queue = create_job_queue()
+    # Load and warm up in the background so /livez answers while this runs
+    app.state.startup = asyncio.create_task(load_and_warm_up(app.state.executor))
+    app.state.saturation = SaturationMonitor(app.state)
+    app.state.saturation.start()
     yield
     logger.info("Shutting down Table service")
+    app.state.startup.cancel()
+    await app.state.saturation.stop()
+    app.state.executor.shutdown()
 
 
 app = FastAPI(
@@ -47,16 +151,57 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan,
 )
+app.add_middleware(ArrivalTimeMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(InflightMiddleware)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def v2_error_handler(request: Request, exc: StarletteHTTPException):
+    """Errors on the V2 protocol routes have an error field instead of detail."""
+    if not request.url.path.startswith("/v2"):
+        return await http_exception_handler(request, exc)
+    return Response(
+        content=dumps({"error": str(exc.detail)}),
+        status_code=exc.status_code,
+        media_type="application/json",
+        headers=getattr(exc, "headers", None),
+    )
+
+
+def _startup_state(app: FastAPI) -> str:
+    """loading, ready or failed."""
+    startup = app.state.startup
+    if not startup.done():
+        return "loading"
+    if startup.cancelled() or startup.exception() is not None:
+        return "failed"
+    return "ready"
 
 
 @app.get("/healthz")
-async def healthz():
-    try:
-        get_predictor()
-        return {"status": "ok", "ready": is_ready()}
-    except Exception as e:
-        logger.exception("Health check failed: %s", e)
-        raise HTTPException(status_code=503, detail=str(e))
+async def healthz(request: Request):
+    state = _startup_state(request.app)
+    if state == "failed":
+        raise HTTPException(status_code=503, detail="Model startup failed")
+    return {"status": "ok", "ready": state == "ready"}
+
+
+@app.get("/livez")
+async def livez(request: Request):
+    """The process is serving and model startup has not failed."""
+    if _startup_state(request.app) == "failed":
+        raise HTTPException(status_code=503, detail="Model startup failed")
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    """The model is loaded and warmed up, so requests will not pay for it."""
+    state = _startup_state(request.app)
+    if state != "ready":
+        raise HTTPException(status_code=503, detail=f"Model {state}")
+    return {"status": "ready"}
 
 
 @app.post("/predict", response_model=PredictResponse)
@@ -75,96 +220,317 @@ async def predict_endpoint(
     """
     Run table structure prediction.
 
-    - file: Image containing table(s)
+    - file: Image containing table(s). Raw uint8 pixels skip image decoding:
+      send a .npy file, or an application/octet-stream file with
+      X-Image-Shape: H,W,C (and optionally X-Image-Dtype: uint8,
+      X-Image-Channel-Order: RGB|BGR; BGR is passed to TFPredictor as-is)
     - table_bboxes: JSON array of [x1,y1,x2,y2] per table (from layout API)
     - iocr_json: Optional IOCR JSON for text matching (from docling pipeline)
+
+    Results are cached by image content, bboxes and iocr_json; send
+    X-Cache-Bypass: 1 to skip the cache. The time spent in each stage is
+    returned in the Server-Timing header. The body is compressed with zstd or
+    gzip if Accept-Encoding allows it.
     """
     request_id = str(uuid.uuid4())
     tenant_id = request.headers.get("X-Tenant-ID", "")
     start_time = time.perf_counter()
+    executor = request.app.state.executor
+    cache = request.app.state.cache
+    timer = StageTimer.for_request(request)
 
-    try:
-        # Parse table_bboxes
-        try:
-            bboxes = json.loads(table_bboxes)
-        except json.JSONDecodeError as e:
-            raise HTTPException(status_code=400, detail=f"Invalid table_bboxes JSON: {e}")
-
-        if not isinstance(bboxes, list) or len(bboxes) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="table_bboxes must be a non-empty array of [x1,y1,x2,y2]",
-            )
+    with request_errors(tenant_id, request_id, start_time):
+        bboxes = _parse_table_bboxes(table_bboxes)
+        iocr = _parse_iocr_json(iocr_json)
 
-        for i, bbox in enumerate(bboxes):
-            if not isinstance(bbox, list) or len(bbox) != 4:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"table_bboxes[{i}] must be [x1,y1,x2,y2]",
-                )
-            # Ensure integers
-            bboxes[i] = [int(x) for x in bbox]
+        # Read image
+        with timer.stage("upload"):
+            content = await read_upload(file, MAX_IMAGE_SIZE_BYTES)
 
-        # Parse optional iocr_json
-        iocr = None
-        if iocr_json:
-            try:
-                iocr = json.loads(iocr_json)
-            except json.JSONDecodeError as e:
-                raise HTTPException(status_code=400, detail=f"Invalid iocr_json: {e}")
+        pixels = None
+        key_parts = ()
+        if is_pixel_upload(file):
+            # Wraps the upload bytes in place; shape and order are part of the cache key
+            pixels = wrap_pixels(content, request.headers)
+            order = channel_order(request.headers)
+            key_parts = (f"pixels={pixels.shape}|{order}",)
 
-        # Read image
-        content = b""
-        while chunk := await file.read(8192):
-            content += chunk
-            if len(content) > MAX_IMAGE_SIZE_BYTES:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"Image too large. Max size: {MAX_IMAGE_SIZE_MB}MB",
+        cache_key = None
+        result = None
+        cache_status = "bypass" if is_bypassed(request.headers) else "miss"
+        if cache.enabled and cache_status == "miss":
+            with timer.stage("cache"):
+                cache_key = await executor.run(
+                    _cache_key, content, bboxes, iocr_json, *key_parts
                 )
+                cached = await executor.run(cache.get, cache_key, bounded=False)
+            if cached is not None:
+                # A hit skips decode and inference entirely
+                result = loads(cached)
+                result["request_id"] = request_id
+                result["latency_ms"] = 0.0
+                cache_status = "hit"
 
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
+        if result is None:
+            # Each table is one encoder/decoder run, so it is the unit of cost
+            wait_start = time.perf_counter()
+            async with request.app.state.scheduler.slot(tenant_id, cost=len(bboxes)):
+                timer.add("queue", time.perf_counter() - wait_start)
+                with timer.stage("decode"):
+                    if pixels is not None:
+                        image = await executor.run(pixels_to_bgr, pixels, order)
+                    else:
+                        image = await executor.run(decode_image_bgr, content)
+                result = await executor.run(
+                    predict,
+                    image,
+                    bboxes,
+                    request_id,
+                    iocr,
+                    timer.stages,
+                    deadline=request.state.deadline,
+                )
 
-        image = Image.open(io.BytesIO(content)).convert("RGB")
-        result = predict(image, bboxes, request_id, iocr)
+        with timer.stage("serialize"):
+            body = dumps(result)
+        if cache_key is not None and cache_status == "miss":
+            await executor.run(cache.put, cache_key, body, bounded=False)
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
 
         latency_ms = (time.perf_counter() - start_time) * 1000
         logger.info(
-            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d tables=%d",
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d tables=%d cache=%s",
             request_id,
             tenant_id,
             latency_ms,
             len(content),
-            len(result.tables),
+            len(result["tables"]),
+            cache_status,
         )
+        timer.observe(model_name())
         REQUESTS_TOTAL.labels(status="success").inc()
-        return result
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={
+                "X-Cache": cache_status,
+                "Server-Timing": timer.header(),
+                **encoding_headers(encoding),
+            },
+        )
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    table_bboxes: str = Form(
+        ...,
+        description='JSON array of table bboxes, e.g. [[178,748,1061,976],[177,1163,1062,1329]]',
+    ),
+    iocr_json: str | None = Form(
+        default=None,
+        description="Optional: IOCR JSON from docling (pages[0] structure) for text matching",
+    ),
+):
+    """
+    Queue a table structure prediction and return at once.
+
+    Takes the same form as /predict (encoded images only). Poll
+    GET /jobs/{job_id} (also sent as the Location header) for the status;
+    once succeeded, its result has the same shape as the /predict response.
+    Jobs are run by separate worker processes (python -m src.worker).
+    """
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    executor = request.app.state.executor
+
+    with request_errors(tenant_id):
+        bboxes = _parse_table_bboxes(table_bboxes)
+        iocr = _parse_iocr_json(iocr_json)
+        if is_pixel_upload(file):
+            raise HTTPException(
+                status_code=400, detail="Jobs accept encoded images only, not raw pixels"
+            )
+
+        content = await read_upload(file, MAX_IMAGE_SIZE_BYTES)
+        job = await executor.run(
+            _submit_job,
+            request.app.state.job_queue,
+            content,
+            {"table_bboxes": bboxes, "iocr_json": iocr},
+            tenant_id,
+            bounded=False,
+        )
+
+        logger.info(
+            "job_id=%s tenant_id=%s status_code=202 payload_size=%d tables=%d",
+            job.id,
+            tenant_id,
+            len(content),
+            len(bboxes),
+        )
+        JOBS_TOTAL.labels(status="submitted").inc()
+        return Response(
+            content=dumps(_job_response(job)),
+            status_code=202,
+            media_type="application/json",
+            headers={"Location": f"/jobs/{job.id}"},
+        )
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_endpoint(request: Request, job_id: str):
+    """Status of a job, with its result once it succeeded."""
+    executor = request.app.state.executor
+    job_queue = request.app.state.job_queue
+
+    job = await executor.run(job_queue.get, job_id, bounded=False)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    result = None
+    if job.status == SUCCEEDED:
+        result = await executor.run(job_queue.result, job_id, bounded=False)
+
+    body = dumps(_job_response(job, result))
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+    return Response(
+        content=compress(body, encoding),
+        media_type="application/json",
+        headers=encoding_headers(encoding),
+    )
+
+
+@app.get("/v2")
+async def v2_server_metadata():
+    return v2.server_metadata(app.version)
+
+
+@app.get("/v2/health/live")
+async def v2_live(request: Request):
+    return await livez(request)
+
+
+@app.get("/v2/health/ready")
+async def v2_ready(request: Request):
+    return await readyz(request)
+
+
+@app.get("/v2/models/{name}")
+async def v2_model_metadata(name: str):
+    v2.check_model(name)
+    return v2.model_metadata(model_backend())
+
+
+@app.get("/v2/models/{name}/ready")
+async def v2_model_ready(request: Request, name: str):
+    v2.check_model(name)
+    await readyz(request)
+    return {"name": name, "ready": True}
+
+
+@app.post("/v2/models/{name}/infer")
+async def v2_infer_endpoint(request: Request, name: str):
+    """
+    Run table structure prediction on a V2 infer request (see v2.py for the
+    tensors).
+
+    Send the page as an image UINT8 [H,W,C] tensor or an encoded_image BYTES
+    [1] tensor, and the table regions as table_bboxes [T,4], preferably as
+    binary data (Inference-Header-Content-Length). Results are not cached.
+    """
+    request_id = str(uuid.uuid4())
+    tenant_id = request.headers.get("X-Tenant-ID", "")
+    start_time = time.perf_counter()
+    executor = request.app.state.executor
+    timer = StageTimer.for_request(request)
+
+    with request_errors(tenant_id, request_id, start_time):
+        v2.check_model(name)
+        with timer.stage("upload"):
+            body = await v2.read_body(request)
+        payload_size = len(body)
+        infer = v2.parse_infer_request(body, v2.header_length(request.headers))
+        bboxes = v2.table_bboxes(infer)
+        pixels = v2.page_pixels(infer)
+        content = v2.encoded_page(infer)
+        if (pixels is None) == (content is None):
+            raise HTTPException(
+                status_code=400, detail="Send exactly one of image or encoded_image"
+            )
+
+        # Each table is one encoder/decoder run, so it is the unit of cost
+        wait_start = time.perf_counter()
+        async with request.app.state.scheduler.slot(tenant_id, cost=len(bboxes)):
+            timer.add("queue", time.perf_counter() - wait_start)
+            with timer.stage("decode"):
+                if pixels is not None:
+                    order = v2.pixel_channel_order(infer)
+                    image = await executor.run(pixels_to_bgr, pixels, order)
+                else:
+                    image = await executor.run(decode_image_bgr, content)
+            result = await executor.run(
+                predict,
+                image,
+                bboxes,
+                request_id,
+                None,
+                timer.stages,
+                deadline=request.state.deadline,
+            )
+
+        with timer.stage("serialize"):
+            body, json_length = v2.encode_infer_response(
+                infer, infer.id or request_id, v2.tables_to_outputs(result["tables"])
+            )
+        encoding = negotiate(request.headers.get("Accept-Encoding", ""), len(body))
+        if encoding is not None:
+            with timer.stage("compress"):
+                body = compress(body, encoding)
+
+        headers = {"Server-Timing": timer.header(), **encoding_headers(encoding)}
+        media_type = "application/json"
+        if json_length is not None:
+            headers[v2.HEADER_LENGTH] = str(json_length)
+            media_type = v2.BINARY_CONTENT_TYPE
 
-    except HTTPException:
-        REQUESTS_TOTAL.labels(status="error").inc()
-        raise
-    except Exception as e:
         latency_ms = (time.perf_counter() - start_time) * 1000
-        logger.exception(
-            "request_id=%s tenant_id=%s status_code=500 latency_ms=%.2f error=%s",
+        logger.info(
+            "request_id=%s tenant_id=%s status_code=200 latency_ms=%.2f payload_size=%d tables=%d protocol=v2",
             request_id,
             tenant_id,
             latency_ms,
-            str(e),
+            payload_size,
+            len(result["tables"]),
         )
-        REQUESTS_TOTAL.labels(status="error").inc()
-        raise HTTPException(status_code=500, detail=str(e))
+        timer.observe(model_name())
+        REQUESTS_TOTAL.labels(status="success").inc()
+        return Response(content=body, media_type=media_type, headers=headers)
 
 
 @app.get("/metrics")
-async def metrics():
+async def metrics(request: Request):
+    # Queue depth lives in the job queue, shared by all API and worker processes
+    await request.app.state.executor.run(
+        observe_queue, request.app.state.job_queue, bounded=False
+    )
     return Response(
-        content=generate_latest(),
+        content=render_metrics(),
         media_type=CONTENT_TYPE_LATEST,
     )
 
 
+@app.get("/saturation")
+async def saturation(request: Request):
+    """Saturation signals of the worker that answers (for KEDA metrics-api)."""
+    return Response(
+        content=dumps(request.app.state.saturation.observe()),
+        media_type="application/json",
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -2,7 +2,17 @@
 Prometheus metrics for Table inference service.
 """
 
-from prometheus_client import Counter, Histogram
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
 
 REQUESTS_TOTAL = Counter(
     "table_requests_total",
@@ -21,3 +31,108 @@ TABLES_PER_REQUEST = Histogram(
     "Number of tables processed per request",
     buckets=(1, 2, 5, 10, 20),
 )
+
+CACHE_LOOKUPS = Counter(
+    "table_cache_lookups_total",
+    "Result cache lookups by outcome and tier",
+    ["result", "tier"],
+)
+
+CACHE_BYTES = Gauge(
+    "table_cache_memory_bytes",
+    "Bytes held by the in-memory result cache",
+)
+
+STARTUP_SECONDS = Gauge(
+    "table_startup_seconds",
+    "Time spent loading and warming up the model at startup",
+    ["phase"],
+)
+
+
+TENANT_QUEUE_DEPTH = Gauge(
+    "table_tenant_queue_depth",
+    "Requests waiting for an inference slot, per tenant",
+    ["tenant"],
+    multiprocess_mode="livesum",
+)
+
+TENANT_QUEUE_WAIT = Histogram(
+    "table_tenant_queue_wait_seconds",
+    "Time a request waits for an inference slot, per tenant",
+    ["tenant"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+STAGE_LATENCY = Histogram(
+    "inference_stage_latency_seconds",
+    "Time spent in each stage of request processing",
+    ["service", "model", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+JOB_QUEUE_DEPTH = Gauge(
+    "table_job_queue_depth",
+    "Jobs in the /jobs queue by status",
+    ["status"],
+    multiprocess_mode="mostrecent",
+)
+
+JOB_QUEUE_OLDEST = Gauge(
+    "table_job_queue_oldest_seconds",
+    "Age of the oldest queued job",
+    multiprocess_mode="mostrecent",
+)
+
+JOBS_TOTAL = Counter(
+    "table_jobs_total",
+    "Jobs submitted through the API (submitted) and finished by workers (succeeded, failed)",
+    ["status"],
+)
+
+JOB_DURATION = Histogram(
+    "table_job_duration_seconds",
+    "Time a worker spent running one job",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+
+INFLIGHT_REQUESTS = Gauge(
+    "table_inflight_requests",
+    "HTTP requests being served, probes and metrics scrapes excluded",
+    multiprocess_mode="livesum",
+)
+
+QUEUE_DEPTH = Gauge(
+    "table_queue_depth",
+    "Requests or jobs waiting in front of inference, by queue",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_UTILIZATION = Gauge(
+    "table_executor_utilization",
+    "Fraction of inference executor threads busy",
+    multiprocess_mode="liveall",
+)
+
+EVENT_LOOP_LAG = Gauge(
+    "table_event_loop_lag_seconds",
+    "How late the event loop woke up for a periodic timer",
+    multiprocess_mode="livemax",
+)
+
+QUEUED_WORK_SECONDS = Gauge(
+    "table_queued_work_seconds",
+    "Estimated seconds until every request waiting for an inference slot has one",
+    multiprocess_mode="livemax",
+)
+
+
+def render_metrics() -> bytes:
+    """Metrics of this process, or of all workers when run by the pre-fork server."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -5,11 +5,14 @@ Load and manage TFPredictor (TableFormer) from docling-ibm-models.
 import json
 import logging
 import os
+import threading
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 _predictor = None
+_lock = threading.Lock()
+_weights_dir = None
 
 
 def _resolve_weights_dir() -> str:
@@ -48,33 +51,94 @@ def _load_config(weights_dir: str) -> dict:
     return config
 
 
+def _backend() -> str:
+    """TABLE_BACKEND: "torch" or "onnxruntime" (image encoder on ONNX Runtime)."""
+    return os.environ.get("TABLE_BACKEND", "torch").strip().lower() or "torch"
+
+
 def get_predictor():
     """Get or create TFPredictor singleton."""
-    global _predictor
-
-    if _predictor is None:
-        from docling_ibm_models.tableformer.data_management.tf_predictor import TFPredictor
-
-        weights_dir = _resolve_weights_dir()
-        config = _load_config(weights_dir)
-        device = os.environ.get("TABLE_DEVICE", "cpu").lower()
-        num_threads = int(os.environ.get("TABLE_NUM_THREADS", "4"))
-
-        logger.info(
-            "Loading TFPredictor with device=%s, num_threads=%s, weights_dir=%s",
-            device,
-            num_threads,
-            weights_dir,
-        )
-        _predictor = TFPredictor(
-            config,
-            device=device,
-            num_threads=num_threads,
-        )
-        logger.info("TFPredictor loaded")
+    global _predictor, _weights_dir
+
+    if _predictor is not None:
+        return _predictor
+
+    # Startup warm-up and early requests may race to load the model
+    with _lock:
+        if _predictor is None:
+            from docling_ibm_models.tableformer.data_management.tf_predictor import TFPredictor
+
+            weights_dir = _resolve_weights_dir()
+            config = _load_config(weights_dir)
+            device = os.environ.get("TABLE_DEVICE", "cpu").lower()
+            num_threads = int(os.environ.get("TABLE_NUM_THREADS", "4"))
+            # "int8": dynamic int8 Linear weights, CPU only; empty for fp32
+            quantize = os.environ.get("TABLE_QUANTIZE", "").strip().lower() or None
+            cache_dir = os.environ.get("TABLE_QUANTIZE_CACHE_DIR", "").strip() or None
+            backend = _backend()
+            backend_options = None
+            if backend == "onnxruntime":
+                # Executor threads run requests concurrently, spinning ORT threads
+                # would take the cores from each other
+                backend_options = {
+                    "graph_optimization_level": os.environ.get(
+                        "TABLE_ONNX_OPTIMIZATION_LEVEL", "all"
+                    ),
+                    "allow_spinning": False,
+                }
+
+            logger.info(
+                "Loading TFPredictor with device=%s, num_threads=%s, weights_dir=%s, "
+                "quantize=%s, backend=%s",
+                device,
+                num_threads,
+                weights_dir,
+                quantize,
+                backend,
+            )
+            _predictor = TFPredictor(
+                config,
+                device=device,
+                num_threads=num_threads,
+                quantize=quantize,
+                quantize_cache_dir=cache_dir,
+                backend=backend,
+                onnx_file=os.environ.get("TABLE_ONNX_FILE", "").strip() or None,
+                backend_options=backend_options,
+            )
+            _weights_dir = weights_dir
+            logger.info("TFPredictor loaded")
 
     return _predictor
 
 
-def is_ready() -> bool:
+def is_loaded() -> bool:
     return _predictor is not None
+
+
+def freeze_weights() -> None:
+    """Mark model weights read-only so forked workers keep sharing their pages."""
+    get_predictor().get_model().requires_grad_(False)
+
+
+def model_name() -> str:
+    """Short model name, used as a metrics label."""
+    return get_predictor().get_model_type()
+
+
+def model_backend() -> str:
+    """Backend of the loaded model, or the configured one before it is loaded."""
+    if _predictor is None:
+        return _backend()
+    return _predictor.get_backend()
+
+
+def model_identity() -> str:
+    """Identity of the loaded model and its settings, used in result cache keys."""
+    predictor = get_predictor()
+    quantize = predictor.get_quantize()
+    backend = predictor.get_backend()
+    return (
+        f"{_weights_dir}|{predictor.get_model_type()}"
+        f"|quantize={quantize}|backend={backend}"
+    )
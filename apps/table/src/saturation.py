@@ -0,0 +1,120 @@
+"""
+Saturation signals for autoscaling.
+
+CPU utilization is a poor scaling signal for inference: it sits at 100% as soon
+as one request is running, so it cannot tell a busy pod from a drowning one.
+These gauges say how much work is waiting instead, and can be fed to an HPA
+through prometheus-adapter or to KEDA:
+
+- table_inflight_requests: HTTP requests being served (probes and /metrics excluded)
+- table_queue_depth{queue}: requests waiting in the tenant scheduler, jobs
+  waiting for an executor thread
+- table_executor_utilization: fraction of executor threads busy
+- table_event_loop_lag_seconds: how late the event loop woke up for a timer;
+  anything above a few ms means blocking work on the loop
+- table_queued_work_seconds: estimated seconds to drain the scheduler queue,
+  from the queued number of tables and the average time per table
+
+SaturationMonitor samples them every TABLE_SATURATION_INTERVAL_SECONDS, so
+every pre-fork worker keeps its series current between scrapes. GET /saturation
+returns the same values of the worker that answers, as JSON (KEDA metrics-api).
+"""
+
+import asyncio
+import os
+
+from .metrics import (
+    EVENT_LOOP_LAG,
+    EXECUTOR_UTILIZATION,
+    INFLIGHT_REQUESTS,
+    QUEUE_DEPTH,
+    QUEUED_WORK_SECONDS,
+)
+
+INTERVAL_SECONDS = float(os.environ.get("TABLE_SATURATION_INTERVAL_SECONDS", "0.5"))
+# Probes and scrapes are not load
+UNTRACKED_PATHS = (
+    "/healthz",
+    "/livez",
+    "/readyz",
+    "/metrics",
+    "/saturation",
+    "/v2/health",
+)
+
+_inflight = 0
+
+
+class InflightMiddleware:
+    """Count the HTTP requests being served."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _inflight
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACKED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        _inflight += 1
+        INFLIGHT_REQUESTS.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _inflight -= 1
+            INFLIGHT_REQUESTS.dec()
+
+
+class SaturationMonitor:
+    """Measures event-loop lag and keeps the saturation gauges current."""
+
+    def __init__(self, state, interval: float = INTERVAL_SECONDS):
+        # app.state: scheduler and executor are read on every sample
+        self._state = state
+        self.interval = interval
+        self.loop_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="table-saturation")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.loop_lag = max(0.0, loop.time() - due)
+            self.observe()
+
+    def snapshot(self) -> dict:
+        state = self._state
+        return {
+            "inflight_requests": _inflight,
+            "queue_depth": {
+                "scheduler": state.scheduler.queued,
+                "executor": state.executor.queued,
+            },
+            "executor_utilization": state.executor.utilization,
+            "event_loop_lag_seconds": self.loop_lag,
+            "queued_work_seconds": state.scheduler.backlog_seconds(),
+        }
+
+    def observe(self) -> dict:
+        """Update the gauges from a fresh snapshot and return it."""
+        snapshot = self.snapshot()
+        for queue, depth in snapshot["queue_depth"].items():
+            QUEUE_DEPTH.labels(queue=queue).set(depth)
+        EXECUTOR_UTILIZATION.set(snapshot["executor_utilization"])
+        EVENT_LOOP_LAG.set(snapshot["event_loop_lag_seconds"])
+        QUEUED_WORK_SECONDS.set(snapshot["queued_work_seconds"])
+        return snapshot
@@ -45,3 +45,18 @@ class PredictResponse(BaseModel):
     request_id: str
     latency_ms: float
     tables: list[TableResult] = Field(default_factory=list)
+
+
+class JobResponse(BaseModel):
+    """Response for POST /jobs and GET /jobs/{job_id}."""
+
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    started_at: float | None = Field(default=None, description="Start of the last attempt")
+    finished_at: float | None = Field(default=None, description="Completion time")
+    attempts: int = Field(default=0, description="Number of times a worker picked up the job")
+    error: str | None = Field(default=None, description="Error message of a failed job")
+    result: PredictResponse | None = Field(
+        default=None, description="Result of a succeeded job"
+    )
@@ -0,0 +1,144 @@
+"""
+Pre-fork server for the table service.
+
+`uvicorn --workers N` starts N fresh interpreters, each loading its own copy
+of the model. Here the parent process loads TFPredictor once and forks
+TABLE_WORKERS workers that share the weight pages copy-on-write:
+
+- weights are marked requires_grad=False and never written after load
+- gc.freeze() moves everything allocated so far out of the collector's reach,
+  so garbage collection in the workers does not write to (and copy) those pages
+- the parent runs no inference, so no OpenMP thread pool exists at fork time
+- each worker runs torch with (available cores // TABLE_WORKERS) threads
+
+The parent only supervises: it restarts workers that die and forwards
+SIGTERM/SIGINT on shutdown. Metrics are aggregated across workers through
+prometheus_client multiprocess mode.
+
+Run: python -m src.serve
+"""
+
+import gc
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger("table.serve")
+
+
+def available_cores() -> int:
+    """CPU cores this process may use, honouring cgroup CPU limits."""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+def _run_worker(config, sock, num_threads: int) -> None:
+    import torch
+    import uvicorn
+
+    # Uvicorn installs its own handlers for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    torch.set_num_threads(num_threads)
+    logger.info("Worker pid=%d started with num_threads=%d", os.getpid(), num_threads)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(config, sock, num_threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(config, sock, num_threads)
+        except BaseException:
+            logger.exception("Worker pid=%d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main() -> None:
+    workers = int(os.environ.get("TABLE_WORKERS", "1"))
+    host = os.environ.get("TABLE_HOST", "0.0.0.0")
+    port = int(os.environ.get("TABLE_PORT", "8001"))
+    num_threads = max(1, available_cores() // workers)
+
+    # Must be set before prometheus_client is imported anywhere
+    os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="table-metrics-")
+    )
+
+    import uvicorn
+    from prometheus_client import multiprocess
+
+    from .model_loader import freeze_weights, get_predictor
+
+    config = uvicorn.Config("src.main:app", host=host, port=port)
+    sock = config.bind_socket()
+
+    # A single thread in the parent keeps OpenMP from starting a thread pool
+    # that the forked workers would inherit in a broken state.
+    os.environ["TABLE_NUM_THREADS"] = "1"
+    get_predictor()
+    freeze_weights()
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        "Table model loaded in parent, forking workers=%d num_threads=%d",
+        workers,
+        num_threads,
+    )
+
+    children = {_spawn(config, sock, num_threads) for _ in range(workers)}
+    stopping = False
+
+    def _stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        multiprocess.mark_process_dead(pid)
+        if not stopping:
+            logger.warning(
+                "Worker pid=%d exited with status=%d, restarting", pid, status
+            )
+            time.sleep(1)
+            children.add(_spawn(config, sock, num_threads))
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='{"time":"%(asctime)s","name":"%(name)s","level":"%(levelname)s","message":"%(message)s"}',
+    )
+    main()
@@ -0,0 +1,109 @@
+"""
+Eager model load and warm-up for the table service.
+
+The model is loaded in the background when the service starts, then run on a
+synthetic page holding one gridded table per configured crop size, so weight
+loading, oneDNN primitive creation and allocator growth happen before the pod
+takes traffic. /readyz only passes once this has finished; /livez fails if it
+raised. The encoders run once per page on the batch of its tables, so the page
+is also run with its first table alone to warm up the batch of 1.
+
+- TABLE_WARMUP_SHAPES: comma-separated WxH table crop sizes (empty = no warm-up)
+"""
+
+import logging
+import os
+import time
+
+import numpy as np
+
+from .executor import InferenceExecutor
+from .inference import _build_iocr_page
+from .metrics import STARTUP_SECONDS
+from .model_loader import get_predictor
+
+logger = logging.getLogger(__name__)
+
+_PAGE_WIDTH = 1275
+_PAGE_HEIGHT = 1650
+_MARGIN = 50
+
+
+def parse_sizes(spec: str) -> list[tuple[int, int]]:
+    """Parse "800x300,1000x600" into [(800, 300), (1000, 600)]."""
+    sizes = []
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        width, height = item.split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def synthetic_page(
+    table_sizes: list[tuple[int, int]],
+) -> tuple[np.ndarray, list[list[int]]]:
+    """
+    White BGR page with the tables stacked vertically, each drawn as a grid.
+    Returns the page and the table bboxes [x1, y1, x2, y2].
+    """
+    width = max([_PAGE_WIDTH] + [w + 2 * _MARGIN for w, _ in table_sizes])
+    height = max(_PAGE_HEIGHT, sum(h + _MARGIN for _, h in table_sizes) + _MARGIN)
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    bboxes = []
+    y = _MARGIN
+    for w, h in table_sizes:
+        x = _MARGIN
+        row_height = max(2, h // 8)
+        col_width = max(2, w // 5)
+        page[y : y + h : row_height, x : x + w] = 0
+        page[y : y + h, x : x + w : col_width] = 0
+        page[y + h - 1, x : x + w] = 0
+        page[y : y + h, x + w - 1] = 0
+        bboxes.append([x, y, x + w, y + h])
+        y += h + _MARGIN
+    return page, bboxes
+
+
+def warm_up(table_sizes: list[tuple[int, int]]) -> None:
+    """Run multi_table_predict on a synthetic page covering all table sizes."""
+    if not table_sizes:
+        return
+    predictor = get_predictor()
+    page, bboxes = synthetic_page(table_sizes)
+    h, w = page.shape[:2]
+    iocr_page = _build_iocr_page(page, w, h, bboxes)
+
+    batches = [bboxes]
+    if len(bboxes) > 1:
+        batches.append(bboxes[:1])
+    for batch in batches:
+        t0 = time.perf_counter()
+        predictor.multi_table_predict(iocr_page, batch, do_matching=True)
+        logger.info(
+            "Warm-up tables=%s latency_ms=%.2f",
+            table_sizes[: len(batch)],
+            (time.perf_counter() - t0) * 1000,
+        )
+
+
+async def load_and_warm_up(executor: InferenceExecutor) -> None:
+    """Load the model and run warm-up inferences on the executor."""
+    try:
+        table_sizes = parse_sizes(
+            os.environ.get("TABLE_WARMUP_SHAPES", "800x300,1000x600")
+        )
+
+        t0 = time.perf_counter()
+        await executor.run(get_predictor, bounded=False)
+        STARTUP_SECONDS.labels(phase="load").set(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await executor.run(warm_up, table_sizes, bounded=False)
+        STARTUP_SECONDS.labels(phase="warmup").set(time.perf_counter() - t0)
+        logger.info("Table model warm (tables=%s)", table_sizes)
+    except Exception:
+        logger.exception("Table model startup failed")
+        raise
@@ -0,0 +1,139 @@
+"""
+Job worker for the table service.
+
+Pulls jobs submitted through POST /jobs from the job queue, runs TableFormer
+on their table regions and stores the result for GET /jobs/{id}. Runs as its
+own process (or pod) next to the API and scales on
+table_job_queue_depth{status="queued"}; its own metrics are served on
+TABLE_WORKER_METRICS_PORT.
+
+- TABLE_WORKER_POLL_SECONDS: sleep between polls of an empty queue
+- TABLE_JOB_RETENTION_SECONDS: finished jobs (and their results) are deleted
+  after this long
+
+Run: python -m src.worker
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from prometheus_client import start_http_server
+
+from .encoding import dumps
+from .inference import predict
+from .ingest import decode_image_bgr
+from .jobs import Job, JobQueue, create_job_queue, observe_queue
+from .metrics import JOB_DURATION, JOBS_TOTAL
+from .model_loader import get_predictor
+from .warmup import parse_sizes, warm_up
+
+logger = logging.getLogger("table.worker")
+
+
+def run_job(job: Job, contents: list[bytes]) -> bytes:
+    """Run table structure prediction for a job; returns the serialized result."""
+    image = decode_image_bgr(contents[0])
+    result = predict(
+        image, job.params["table_bboxes"], job.id, job.params.get("iocr_json")
+    )
+    return dumps(result)
+
+
+class _LeaseKeeper:
+    """Renews the lease of the running job until stopped."""
+
+    def __init__(self, job_queue: JobQueue, job_id: str, worker_id: str, interval: float):
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(job_queue, job_id, worker_id, interval),
+            name="table-lease",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self, job_queue, job_id, worker_id, interval) -> None:
+        while not self._stopped.wait(interval):
+            if not job_queue.renew(job_id, worker_id):
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def main() -> None:
+    poll_seconds = float(os.environ.get("TABLE_WORKER_POLL_SECONDS", "0.5"))
+    retention_seconds = float(os.environ.get("TABLE_JOB_RETENTION_SECONDS", "86400"))
+    metrics_port = int(os.environ.get("TABLE_WORKER_METRICS_PORT", "9101"))
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    job_queue = create_job_queue()
+    start_http_server(metrics_port)
+
+    get_predictor()
+    warm_up(parse_sizes(os.environ.get("TABLE_WARMUP_SHAPES", "800x300,1000x600")))
+    logger.info("Table worker %s ready, polling for jobs", worker_id)
+
+    stopping = threading.Event()
+
+    def _stop(signum, _frame):
+        # The running job is finished first; only polling stops
+        logger.info("Table worker %s stopping on signal %d", worker_id, signum)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    last_purge = 0.0
+    while not stopping.is_set():
+        if time.monotonic() - last_purge > 600:
+            purged = job_queue.purge(retention_seconds)
+            if purged:
+                logger.info("Purged %d finished jobs", purged)
+            last_purge = time.monotonic()
+
+        observe_queue(job_queue)
+        job = job_queue.claim(worker_id)
+        if job is None:
+            stopping.wait(poll_seconds)
+            continue
+
+        t0 = time.perf_counter()
+        lease = _LeaseKeeper(job_queue, job.id, worker_id, job_queue.lease_seconds / 3)
+        try:
+            result = run_job(job, job_queue.inputs(job.id))
+            job_queue.complete(job.id, worker_id, result)
+            status = "succeeded"
+        except Exception as e:
+            logger.exception("job_id=%s failed", job.id)
+            job_queue.fail(job.id, worker_id, str(e))
+            status = "failed"
+        finally:
+            lease.stop()
+
+        latency_sec = time.perf_counter() - t0
+        JOBS_TOTAL.labels(status=status).inc()
+        JOB_DURATION.observe(latency_sec)
+        logger.info(
+            "job_id=%s tenant_id=%s status=%s attempt=%d tables=%d latency_ms=%.2f",
+            job.id,
+            job.tenant_id,
+            status,
+            job.attempts,
+            len(job.params["table_bboxes"]),
+            latency_sec * 1000,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='{"time":"%(asctime)s","name":"%(name)s","level":"%(levelname)s","message":"%(message)s"}',
+    )
+    main()
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from src import v2
+
+
+def _binary_request(inputs: list[dict], binary: bytes) -> tuple[bytes, int]:
+    header = json.dumps({"inputs": inputs}).encode()
+    return header + binary, len(header)
+
+
+def _image_input(shape: list[int], size: int) -> dict:
+    return {
+        "name": "image",
+        "datatype": "UINT8",
+        "shape": shape,
+        "parameters": {"binary_data_size": size},
+    }
+
+
+def test_binary_image_and_bboxes():
+    pixels = np.arange(3 * 4 * 3, dtype=np.uint8).reshape(3, 4, 3)
+    bboxes = np.array([[0, 0, 4, 3]], dtype=np.int32)
+    body, json_length = _binary_request(
+        [
+            _image_input([3, 4, 3], pixels.nbytes),
+            {
+                "name": "table_bboxes",
+                "datatype": "INT32",
+                "shape": [1, 4],
+                "parameters": {"binary_data_size": bboxes.nbytes},
+            },
+        ],
+        pixels.tobytes() + bboxes.tobytes(),
+    )
+    request = v2.parse_infer_request(body, json_length)
+    np.testing.assert_array_equal(v2.page_pixels(request), pixels)
+    assert v2.table_bboxes(request) == [[0, 0, 4, 3]]
+
+
+def test_binary_bytes():
+    files = [b"\x89PNG-1"]
+    data = b"".join(len(f).to_bytes(4, "little") + f for f in files)
+    body, json_length = _binary_request(
+        [
+            {
+                "name": "encoded_image",
+                "datatype": "BYTES",
+                "shape": [1],
+                "parameters": {"binary_data_size": len(data)},
+            }
+        ],
+        data,
+    )
+    request = v2.parse_infer_request(body, json_length)
+    assert v2.encoded_page(request) == files[0]
+
+
+@pytest.mark.parametrize(
+    "shape, size, binary",
+    [
+        # binary_data_size runs past the end of the body
+        ([2, 2, 3], 12, bytes(6)),
+        # binary_data_size does not match the shape
+        ([2, 2, 3], 6, bytes(6)),
+        # trailing bytes no input claims
+        ([2, 2, 3], 12, bytes(14)),
+    ],
+)
+def test_bad_binary_data(shape, size, binary):
+    body, json_length = _binary_request([_image_input(shape, size)], binary)
+    with pytest.raises(HTTPException) as exc_info:
+        v2.parse_infer_request(body, json_length)
+    assert exc_info.value.status_code == 400
+
+
+def test_truncated_bytes_element():
+    data = (10).to_bytes(4, "little") + b"short"
+    body, json_length = _binary_request(
+        [
+            {
+                "name": "encoded_image",
+                "datatype": "BYTES",
+                "shape": [1],
+                "parameters": {"binary_data_size": len(data)},
+            }
+        ],
+        data,
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        v2.parse_infer_request(body, json_length)
+    assert exc_info.value.status_code == 400
+
+
+def test_header_longer_than_body():
+    with pytest.raises(HTTPException) as exc_info:
+        v2.parse_infer_request(b'{"inputs": []}', 100)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "backend, platform", [("torch", "pytorch"), ("onnxruntime", "onnxruntime_onnx")]
+)
+def test_model_metadata_platform(backend, platform):
+    assert v2.model_metadata(backend)["platform"] == platform
@@ -0,0 +1,229 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import torch
+
+_log = logging.getLogger(__name__)
+
+# "torch": eager PyTorch, threads set with torch.set_num_threads()
+# "onnxruntime": ONNX Runtime CPU session on a graph written by onnx_export
+BACKENDS = ("torch", "onnxruntime")
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def resolve_backend(backend: Optional[str], device) -> str:
+    r"""
+    Validate the inference backend requested for a predictor.
+
+    Parameters
+    ----------
+    backend : str or None
+        One of BACKENDS; None or "" for "torch"
+    device : str or torch.device
+        Device the model runs on; the onnxruntime backend only runs on CPU
+
+    Returns
+    -------
+    The backend name
+
+    Raises
+    ------
+    ValueError
+        For an unknown backend, or onnxruntime on a non-CPU device
+    """
+    backend = (backend or "torch").lower()
+    if backend not in BACKENDS:
+        raise ValueError(
+            "Unknown inference backend: {}. Supported: {}".format(
+                backend, ", ".join(BACKENDS)
+            )
+        )
+    if backend == "onnxruntime" and torch.device(device).type != "cpu":
+        raise ValueError(
+            "The onnxruntime backend only runs on cpu, not {}".format(device)
+        )
+    return backend
+
+
+def default_onnx_file(weights_file: str, suffix: str = "") -> str:
+    r"""
+    Path of the ONNX graph exported from a weights file: next to it, with the
+    same stem plus `suffix` and the .onnx extension
+    """
+    return os.path.splitext(weights_file)[0] + suffix + ".onnx"
+
+
+class OnnxRuntimeModel(torch.nn.Module):
+    r"""
+    Drop-in replacement for the torch module an ONNX graph was exported from.
+
+    Takes and returns torch tensors, so the pre- and post-processing around the
+    model stay the same for both backends. Inputs are matched to the graph inputs
+    by position or by name; keyword arguments the graph does not declare are
+    ignored.
+
+    The session is created on first use in each process: the thread pools of an
+    onnxruntime session do not survive a fork, so a model loaded before forking
+    workers must not share its session with them.
+
+    Threading and graph optimizations are onnxruntime's own:
+    - intra_op_num_threads: threads for one operator, torch.get_num_threads()
+      of the process creating the session if None
+    - inter_op_num_threads: threads running independent operators in parallel
+    - graph_optimization_level: "disable", "basic", "extended" or "all"
+    - allow_spinning: whether idle threads spin waiting for work; spinning lowers
+      latency but burns CPU that concurrent requests could use
+    - optimized_model_file: if given, the optimized graph is saved there
+    """
+
+    def __init__(
+        self,
+        onnx_file: str,
+        output_cls: Optional[Callable] = None,
+        weights_file: Optional[str] = None,
+        intra_op_num_threads: Optional[int] = None,
+        inter_op_num_threads: int = 1,
+        graph_optimization_level: str = "all",
+        allow_spinning: bool = True,
+        optimized_model_file: Optional[str] = None,
+    ):
+        r"""
+        Parameters
+        ----------
+        onnx_file : str
+            The exported ONNX graph
+        output_cls : callable, optional
+            Called with the graph outputs as keyword arguments to build the return
+            value, e.g. the ModelOutput class of the original model. Without it a
+            single output is returned as a tensor and several as a tuple
+        weights_file : str, optional
+            The weights the graph was exported from; a warning is logged when
+            they are newer than the graph
+
+        Raises
+        ------
+        FileNotFoundError
+            When the ONNX file is missing
+        ValueError
+            For an unknown graph optimization level
+        """
+        super().__init__()
+        if not os.path.isfile(onnx_file):
+            raise FileNotFoundError(
+                "Missing ONNX file: {}. Export it with: "
+                "python -m docling_ibm_models.onnx_export".format(onnx_file)
+            )
+        if graph_optimization_level not in _GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(
+                "Unknown graph optimization level: {}. Supported: {}".format(
+                    graph_optimization_level,
+                    ", ".join(_GRAPH_OPTIMIZATION_LEVELS),
+                )
+            )
+        if weights_file is not None and os.path.isfile(weights_file):
+            if os.path.getmtime(weights_file) > os.path.getmtime(onnx_file):
+                _log.warning(
+                    "ONNX file {} is older than the weights {}, export it again".format(
+                        onnx_file, weights_file
+                    )
+                )
+
+        self._onnx_file = onnx_file
+        self._output_cls = output_cls
+        self._intra_op_num_threads = intra_op_num_threads
+        self._inter_op_num_threads = inter_op_num_threads
+        self._graph_optimization_level = graph_optimization_level
+        self._allow_spinning = allow_spinning
+        self._optimized_model_file = optimized_model_file
+
+        self._session = None
+        self._session_pid: Optional[int] = None
+        self._session_lock = threading.Lock()
+
+    def info(self) -> dict:
+        return {
+            "onnx_file": self._onnx_file,
+            "intra_op_num_threads": self._intra_op_num_threads,
+            "inter_op_num_threads": self._inter_op_num_threads,
+            "graph_optimization_level": self._graph_optimization_level,
+            "allow_spinning": self._allow_spinning,
+        }
+
+    def _get_session(self):
+        pid = os.getpid()
+        if self._session is not None and self._session_pid == pid:
+            return self._session
+        with self._session_lock:
+            if self._session is None or self._session_pid != pid:
+                self._session = self._create_session()
+                self._session_pid = pid
+        return self._session
+
+    def _create_session(self):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "The onnxruntime backend needs onnxruntime: "
+                "pip install 'docling-ibm-models[onnxruntime]'"
+            ) from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel,
+            _GRAPH_OPTIMIZATION_LEVELS[self._graph_optimization_level],
+        )
+        options.intra_op_num_threads = (
+            self._intra_op_num_threads or torch.get_num_threads()
+        )
+        options.inter_op_num_threads = self._inter_op_num_threads
+        if self._inter_op_num_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        else:
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.add_session_config_entry(
+            "session.intra_op.allow_spinning", "1" if self._allow_spinning else "0"
+        )
+        if self._optimized_model_file:
+            options.optimized_model_filepath = self._optimized_model_file
+
+        session = ort.InferenceSession(
+            self._onnx_file, options, providers=["CPUExecutionProvider"]
+        )
+        _log.debug(
+            "Created onnxruntime session for {} with intra_op_num_threads={}".format(
+                self._onnx_file, options.intra_op_num_threads
+            )
+        )
+        return session
+
+    def forward(self, *args, **kwargs):
+        session = self._get_session()
+        input_names = [i.name for i in session.get_inputs()]
+        feeds: Dict[str, np.ndarray] = {}
+        for name, value in zip(input_names, args):
+            feeds[name] = value.detach().cpu().numpy()
+        for name in input_names[len(args) :]:
+            if name in kwargs:
+                feeds[name] = kwargs[name].detach().cpu().numpy()
+
+        output_names = [o.name for o in session.get_outputs()]
+        outputs = [torch.from_numpy(o) for o in session.run(output_names, feeds)]
+        if self._output_cls is not None:
+            return self._output_cls(**dict(zip(output_names, outputs)))
+        if len(outputs) == 1:
+            return outputs[0]
+        return tuple(outputs)
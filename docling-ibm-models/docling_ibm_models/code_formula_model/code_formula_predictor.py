@@ -3,18 +3,25 @@
 # SPDX-License-Identifier: MIT
 #
 import logging
+import os
 import threading
 from typing import List, Optional, Union
 
 import numpy as np
 import torch
 from PIL import Image
-from transformers import AutoTokenizer, StoppingCriteria, StoppingCriteriaList
+from transformers import (
+    AutoConfig,
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
 
 from docling_ibm_models.code_formula_model.models.sam_opt import SamOPTForCausalLM
 from docling_ibm_models.code_formula_model.models.sam_opt_image_processor import (
     SamOptImageProcessor,
 )
+from docling_ibm_models.quantization import load_quantized_model, resolve_quantize
 
 _log = logging.getLogger(__name__)
 
@@ -59,6 +66,8 @@ class CodeFormulaPredictor:
         Processor for normalizing and preparing input images.
     _temperature : float
         Sampling temperature for generation; controls randomness in predictions.
+    _quantize : str or None
+        Quantization mode of the model ("int8"), None for fp32.
     """
 
     def __init__(
@@ -66,6 +75,8 @@ class CodeFormulaPredictor:
         artifacts_path: str,
         device: str = "cpu",
         num_threads: int = 4,
+        quantize: Optional[str] = None,
+        quantize_cache_dir: Optional[str] = None,
     ):
         """
         Initializes the CodeFormulaPredictor with the specified model artifacts.
@@ -78,9 +89,21 @@ class CodeFormulaPredictor:
             Device to run the inference on ('cpu' or 'cuda'), by default "cpu".
         num_threads : int, optional
             Number of threads for CPU inference, by default 4.
+        quantize : str, optional
+            "int8" to run the Linear layers of the vision encoder and the language
+            model with dynamic int8 quantization (CPU only), by default None.
+        quantize_cache_dir : str, optional
+            Directory where the quantized model is cached, by default
+            ~/.cache/docling_ibm_models/quantized.
+
+        Raises
+        ------
+        ValueError
+            If quantize is unknown or requested on a non-CPU device.
         """
         self._device = device
         self._num_threads = num_threads
+        self._quantize = resolve_quantize(quantize, device)
         if device == "cpu":
             torch.set_num_threads(self._num_threads)
 
@@ -89,9 +112,26 @@ class CodeFormulaPredictor:
             self._tokenizer = AutoTokenizer.from_pretrained(
                 artifacts_path, use_fast=True, padding_side="left"
             )
-            self._model = SamOPTForCausalLM.from_pretrained(
-                artifacts_path, device_map=self._device
-            )
+            if self._quantize is None:
+                self._model = SamOPTForCausalLM.from_pretrained(
+                    artifacts_path, device_map=self._device
+                )
+            else:
+                weights_fn = os.path.join(artifacts_path, "model.safetensors")
+                if not os.path.isfile(weights_fn):
+                    # Sharded checkpoints are keyed on their index file
+                    weights_fn = os.path.join(
+                        artifacts_path, "model.safetensors.index.json"
+                    )
+                self._model = load_quantized_model(
+                    lambda: SamOPTForCausalLM.from_pretrained(artifacts_path),
+                    lambda: SamOPTForCausalLM(
+                        AutoConfig.from_pretrained(artifacts_path)
+                    ),
+                    weights_fn,
+                    self._quantize,
+                    quantize_cache_dir,
+                )
             self._model.eval()
 
             self._image_processor = SamOptImageProcessor.from_pretrained(artifacts_path)
@@ -105,12 +145,13 @@ class CodeFormulaPredictor:
         Returns
         -------
         dict
-            A dictionary containing configuration details such as the device and
-            the number of threads used.
+            A dictionary containing configuration details such as the device, the
+            number of threads used and the quantization mode.
         """
         info = {
             "device": self._device,
             "num_threads": self._num_threads,
+            "quantize": self._quantize,
         }
         return info
 
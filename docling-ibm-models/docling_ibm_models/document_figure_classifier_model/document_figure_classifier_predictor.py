@@ -3,14 +3,22 @@
 # SPDX-License-Identifier: MIT
 #
 import logging
+import os
 import threading
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torchvision.transforms as transforms
 from PIL import Image
 from transformers import AutoConfig, AutoModelForImageClassification
+from transformers.modeling_outputs import ImageClassifierOutputWithNoAttention
+
+from docling_ibm_models.backends import (
+    OnnxRuntimeModel,
+    default_onnx_file,
+    resolve_backend,
+)
 
 _log = logging.getLogger(__name__)
 
@@ -48,6 +56,8 @@ class DocumentFigureClassifierPredictor:
         The device on which the model is loaded (e.g., 'cpu' or 'cuda').
     _num_threads : int
         Number of threads used for inference when running on CPU.
+    _backend : str
+        The inference backend, "torch" or "onnxruntime".
     _model : EfficientNetForImageClassification
         Pretrained EfficientNetb0 model.
     _image_processor : EfficientNetImageProcessor
@@ -57,7 +67,7 @@ class DocumentFigureClassifierPredictor:
 
     Methods
     -------
-    __init__(artifacts_path, device, num_threads)
+    __init__(artifacts_path, device, num_threads, backend, onnx_file, backend_options)
         Initializes the DocumentFigureClassifierPredictor with the specified parameters.
     info() -> dict:
         Retrieves configuration details of the DocumentFigureClassifierPredictor instance.
@@ -70,6 +80,9 @@ class DocumentFigureClassifierPredictor:
         artifacts_path: str,
         device: str = "cpu",
         num_threads: int = 4,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+        backend_options: Optional[dict] = None,
     ):
         r"""
         Initializes the DocumentFigureClassifierPredictor.
@@ -82,17 +95,43 @@ class DocumentFigureClassifierPredictor:
             Device to run the inference on ('cpu' or 'cuda'), by default "cpu".
         num_threads : int, optional
             Number of threads for CPU inference, by default 4.
+        backend : str, optional
+            "torch", or "onnxruntime" to run the model with ONNX Runtime on CPU,
+            by default "torch".
+        onnx_file : str, optional
+            The exported model, see onnx_export. By default model.onnx in the
+            artifacts path.
+        backend_options : dict, optional
+            Threading and graph optimization options of the onnxruntime backend,
+            see OnnxRuntimeModel.
+
+        Raises
+        ------
+        ValueError
+            When the backend is not supported.
+        FileNotFoundError
+            When the onnxruntime backend is selected and the ONNX file is missing.
         """
         self._device = device
         self._num_threads = num_threads
+        self._backend = resolve_backend(backend, device)
 
         if device == "cpu":
             torch.set_num_threads(self._num_threads)
 
         with _model_init_lock:
-            self._model = AutoModelForImageClassification.from_pretrained(
-                artifacts_path, device_map=device
-            )
+            if self._backend == "onnxruntime":
+                weights_fn = os.path.join(artifacts_path, "model.safetensors")
+                self._model = OnnxRuntimeModel(
+                    onnx_file or default_onnx_file(weights_fn),
+                    output_cls=ImageClassifierOutputWithNoAttention,
+                    weights_file=weights_fn,
+                    **(backend_options or {}),
+                )
+            else:
+                self._model = AutoModelForImageClassification.from_pretrained(
+                    artifacts_path, device_map=device
+                )
             self._model.eval()
 
             self._image_processor = transforms.Compose(
@@ -126,6 +165,7 @@ class DocumentFigureClassifierPredictor:
         info = {
             "device": self._device,
             "num_threads": self._num_threads,
+            "backend": self._backend,
             "classes": self._classes,
         }
         return info
@@ -5,16 +5,25 @@
 import logging
 import os
 import threading
+import time
 from collections.abc import Iterable
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Optional, Set, Union
 
 import numpy as np
 import torch
 from PIL import Image
 from torch import Tensor
-from transformers import AutoModelForObjectDetection, RTDetrImageProcessor
-
+from transformers import AutoConfig, AutoModelForObjectDetection, RTDetrImageProcessor
+from transformers.models.rt_detr.modeling_rt_detr import RTDetrObjectDetectionOutput
+
+from docling_ibm_models.backends import (
+    OnnxRuntimeModel,
+    default_onnx_file,
+    resolve_backend,
+)
 from docling_ibm_models.layoutmodel.labels import LayoutLabels
+from docling_ibm_models.quantization import load_quantized_model, resolve_quantize
+from docling_ibm_models.timing import add_timing
 
 _log = logging.getLogger(__name__)
 
@@ -34,6 +43,11 @@ class LayoutPredictor:
         num_threads: int = 4,
         base_threshold: float = 0.3,
         blacklist_classes: Set[str] = set(),
+        quantize: Optional[str] = None,
+        quantize_cache_dir: Optional[str] = None,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+        backend_options: Optional[dict] = None,
     ):
         """
         Provide the artifact path that contains the LayoutModel file
@@ -43,10 +57,20 @@ class LayoutPredictor:
         artifact_path: Path for the model torch file.
         device: (Optional) device to run the inference.
         num_threads: (Optional) Number of threads to run the inference if device = 'cpu'
+        quantize: (Optional) "int8" to run the Linear layers (including the attention
+                  projections) with dynamic int8 quantization. Only on cpu.
+        quantize_cache_dir: (Optional) Where the quantized model is cached on disk
+        backend: (Optional) "torch", or "onnxruntime" to run the model with ONNX
+                 Runtime on cpu. Pre- and post-processing are the same.
+        onnx_file: (Optional) The exported model, see onnx_export. Default:
+                   model.onnx in the artifact path
+        backend_options: (Optional) dict with the threading and graph optimization
+                         options of the onnxruntime backend, see OnnxRuntimeModel
 
         Raises
         ------
-        FileNotFoundError when the model's torch file is missing
+        FileNotFoundError when the model's torch file or ONNX file is missing
+        ValueError when quantize or backend is not supported
         """
         # Blacklisted classes
         self._black_classes = blacklist_classes  # set(["Form", "Key-Value Region"])
@@ -60,6 +84,14 @@ class LayoutPredictor:
         # Set number of threads for CPU
         self._device = torch.device(device)
         self._num_threads = num_threads
+        self._quantize = resolve_quantize(quantize, device)
+        self._backend = resolve_backend(backend, device)
+        if self._quantize is not None and self._backend != "torch":
+            raise ValueError(
+                "quantize is only supported by the torch backend, not {}".format(
+                    self._backend
+                )
+            )
         if device == "cpu":
             torch.set_num_threads(self._num_threads)
 
@@ -83,13 +115,39 @@ class LayoutPredictor:
 
         # Use lock to prevent threading issues during model initialization
         with _model_init_lock:
-            self._model = AutoModelForObjectDetection.from_pretrained(
-                artifact_path, config=self._model_config, device_map=self._device
-            )
+            self._model: torch.nn.Module
+            if self._backend == "onnxruntime":
+                self._model = OnnxRuntimeModel(
+                    onnx_file or default_onnx_file(self._st_fn),
+                    output_cls=RTDetrObjectDetectionOutput,
+                    weights_file=self._st_fn,
+                    **(backend_options or {}),
+                )
+            elif self._quantize is None:
+                self._model = AutoModelForObjectDetection.from_pretrained(
+                    artifact_path, config=self._model_config, device_map=self._device
+                )
+            else:
+                self._model = load_quantized_model(
+                    lambda: AutoModelForObjectDetection.from_pretrained(
+                        artifact_path, config=self._model_config
+                    ),
+                    lambda: AutoModelForObjectDetection.from_config(
+                        AutoConfig.from_pretrained(artifact_path)
+                    ),
+                    self._st_fn,
+                    self._quantize,
+                    quantize_cache_dir,
+                )
             self._model.eval()
 
         # Set classes map
-        self._model_name = type(self._model).__name__
+        if self._backend == "onnxruntime":
+            # No torch module to take the name from
+            model_config = AutoConfig.from_pretrained(artifact_path)
+            self._model_name = model_config.architectures[0]
+        else:
+            self._model_name = type(self._model).__name__
         if self._model_name == "RTDetrForObjectDetection":
             self._classes_map = self._labels.shifted_canonical_categories()
             self._label_offset = 1
@@ -110,9 +168,25 @@ class LayoutPredictor:
             "num_threads": self._num_threads,
             "image_size": self._image_processor.size,
             "threshold": self._threshold,
+            "quantize": self._quantize,
+            "backend": self._backend,
         }
         return info
 
+    @staticmethod
+    def _to_rgb(img: Union[Image.Image, np.ndarray]) -> Image.Image:
+        r"""
+        Return the image as an RGB PIL image.
+        Images that are already RGB are returned as-is instead of being copied.
+        """
+        if isinstance(img, np.ndarray):
+            img = Image.fromarray(img)
+        elif not isinstance(img, Image.Image):
+            raise TypeError("Not supported input image format")
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return img
+
     @torch.inference_mode()
     def predict(self, orig_img: Union[Image.Image, np.ndarray]) -> Iterable[dict]:
         """
@@ -133,12 +207,7 @@ class LayoutPredictor:
         TypeError when the input image is not supported
         """
         # Convert image format
-        if isinstance(orig_img, Image.Image):
-            page_img = orig_img.convert("RGB")
-        elif isinstance(orig_img, np.ndarray):
-            page_img = Image.fromarray(orig_img).convert("RGB")
-        else:
-            raise TypeError("Not supported input image format")
+        page_img = self._to_rgb(orig_img)
 
         target_sizes = torch.tensor([page_img.size[::-1]])
         inputs = self._image_processor(images=[page_img], return_tensors="pt").to(
@@ -183,7 +252,9 @@ class LayoutPredictor:
 
     @torch.inference_mode()
     def predict_batch(
-        self, images: List[Union[Image.Image, np.ndarray]]
+        self,
+        images: List[Union[Image.Image, np.ndarray]],
+        timings: Optional[Dict[str, float]] = None,
     ) -> List[List[dict]]:
         """
         Batch prediction for multiple images - more efficient than calling predict() multiple times.
@@ -192,6 +263,9 @@ class LayoutPredictor:
         ----------
         images : List[Union[Image.Image, np.ndarray]]
             List of images to process in a single batch
+        timings : Optional[Dict[str, float]]
+            If given, the seconds spent in the "preprocess", "forward" and
+            "postprocess" stages are added to it
 
         Returns
         -------
@@ -202,15 +276,9 @@ class LayoutPredictor:
         if not images:
             return []
 
+        t0 = time.perf_counter()
         # Convert all images to RGB PIL format
-        pil_images = []
-        for img in images:
-            if isinstance(img, Image.Image):
-                pil_images.append(img.convert("RGB"))
-            elif isinstance(img, np.ndarray):
-                pil_images.append(Image.fromarray(img).convert("RGB"))
-            else:
-                raise TypeError("Not supported input image format")
+        pil_images = [self._to_rgb(img) for img in images]
 
         # Get target sizes for all images
         target_sizes = torch.tensor([img.size[::-1] for img in pil_images])
@@ -219,7 +287,9 @@ class LayoutPredictor:
         inputs = self._image_processor(images=pil_images, return_tensors="pt").to(
             self._device
         )
+        t0 = add_timing(timings, "preprocess", t0)
         outputs = self._model(**inputs)
+        t0 = add_timing(timings, "forward", t0)
 
         # Post-process all results at once
         results_list: List[Dict[str, Tensor]] = (
@@ -267,4 +337,5 @@ class LayoutPredictor:
 
             all_predictions.append(predictions)
 
+        add_timing(timings, "postprocess", t0)
         return all_predictions
@@ -0,0 +1,215 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+r"""
+One-time export of the model forward passes to ONNX, for the onnxruntime backend.
+
+The graphs are written next to the weights, where the predictors look for them
+by default:
+
+    python -m docling_ibm_models.onnx_export layout <artifact_path>
+    python -m docling_ibm_models.onnx_export figure <artifacts_path>
+    python -m docling_ibm_models.onnx_export tableformer <save_dir>
+
+Only the networks are exported; pre- and post-processing stay in Python and are
+shared by both backends. The batch dimension is dynamic, the image size is the
+fixed size the pre-processing resizes to.
+"""
+
+import argparse
+import inspect
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from docling_ibm_models.backends import default_onnx_file
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_OPSET = 17
+
+
+class _OutputsAsTuple(torch.nn.Module):
+    r"""
+    Return the named fields of a ModelOutput as a tuple, the form ONNX export
+    takes
+    """
+
+    def __init__(self, model: torch.nn.Module, output_names: List[str]):
+        super().__init__()
+        self._model = model
+        self._output_names = output_names
+
+    def forward(self, pixel_values):
+        outputs = self._model(pixel_values=pixel_values)
+        return tuple(getattr(outputs, name) for name in self._output_names)
+
+
+def export_onnx(
+    model: torch.nn.Module,
+    example_inputs: Tuple[torch.Tensor, ...],
+    onnx_file: str,
+    input_names: List[str],
+    output_names: List[str],
+    opset: int = DEFAULT_OPSET,
+) -> str:
+    r"""
+    Export a model to ONNX with a dynamic batch dimension.
+
+    The graph is written to a temporary file first and moved in place, so a
+    predictor never loads a partial export.
+
+    Returns
+    -------
+    The path of the ONNX file
+    """
+    kwargs: Dict[str, Any] = {}
+    # Newer torch versions default to the dynamo exporter, which needs onnxscript
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+
+    dynamic_axes = {name: {0: "batch"} for name in input_names + output_names}
+    tmp_fn = "{}.{}.tmp".format(onnx_file, os.getpid())
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example_inputs,
+            tmp_fn,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **kwargs,
+        )
+    os.replace(tmp_fn, onnx_file)
+    _log.info("Exported ONNX graph: {}".format(onnx_file))
+    return onnx_file
+
+
+def export_layout_model(
+    artifact_path: str, onnx_file: Optional[str] = None, opset: int = DEFAULT_OPSET
+) -> str:
+    r"""
+    Export the object detection network of LayoutPredictor.
+    Input "pixel_values", outputs "logits" and "pred_boxes".
+    """
+    from transformers import AutoModelForObjectDetection, RTDetrImageProcessor
+
+    processor = RTDetrImageProcessor.from_json_file(
+        os.path.join(artifact_path, "preprocessor_config.json")
+    )
+    model = AutoModelForObjectDetection.from_pretrained(artifact_path)
+    size = processor.size
+    pixel_values = torch.rand(1, 3, size["height"], size["width"])
+    onnx_file = onnx_file or default_onnx_file(
+        os.path.join(artifact_path, "model.safetensors")
+    )
+    output_names = ["logits", "pred_boxes"]
+    return export_onnx(
+        _OutputsAsTuple(model, output_names),
+        (pixel_values,),
+        onnx_file,
+        ["pixel_values"],
+        output_names,
+        opset,
+    )
+
+
+def export_figure_classifier(
+    artifacts_path: str, onnx_file: Optional[str] = None, opset: int = DEFAULT_OPSET
+) -> str:
+    r"""
+    Export the image classification network of DocumentFigureClassifierPredictor.
+    Input "pixel_values", output "logits".
+    """
+    from transformers import AutoModelForImageClassification
+
+    model = AutoModelForImageClassification.from_pretrained(artifacts_path)
+    onnx_file = onnx_file or default_onnx_file(
+        os.path.join(artifacts_path, "model.safetensors")
+    )
+    output_names = ["logits"]
+    return export_onnx(
+        _OutputsAsTuple(model, output_names),
+        (torch.rand(1, 3, 224, 224),),
+        onnx_file,
+        ["pixel_values"],
+        output_names,
+        opset,
+    )
+
+
+def export_tableformer_encoder(
+    config: dict, onnx_file: Optional[str] = None, opset: int = DEFAULT_OPSET
+) -> str:
+    r"""
+    Export the image encoder of TableFormer, the model in
+    config["model"]["save_dir"]. Input "images", output "enc_out".
+    """
+    from docling_ibm_models.tableformer.data_management.tf_predictor import TFPredictor
+
+    predictor = TFPredictor(config)
+    encoder = predictor.get_model()._encoder
+    image_size = config["dataset"]["resized_image"]
+    onnx_file = onnx_file or default_onnx_file(
+        predictor.get_model_file(), TFPredictor.ENCODER_ONNX_SUFFIX
+    )
+    return export_onnx(
+        encoder,
+        (torch.rand(1, 3, image_size, image_size),),
+        onnx_file,
+        ["images"],
+        ["enc_out"],
+        opset,
+    )
+
+
+def _load_tableformer_config(save_dir: str) -> dict:
+    config_fn = os.path.join(save_dir, "tm_config.json")
+    if not os.path.isfile(config_fn):
+        raise FileNotFoundError("Missing TableFormer config: {}".format(config_fn))
+    with open(config_fn, "r") as fp:
+        config = json.load(fp)
+    config["model"]["save_dir"] = save_dir
+    return config
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Export a model to ONNX for the onnxruntime backend"
+    )
+    parser.add_argument(
+        "model",
+        choices=["layout", "figure", "tableformer"],
+        help="layout: LayoutPredictor, figure: DocumentFigureClassifierPredictor, "
+        "tableformer: the image encoder of TFPredictor",
+    )
+    parser.add_argument(
+        "path",
+        help="The model artifacts directory (tableformer: the save_dir with the "
+        "safetensors file and tm_config.json)",
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="ONNX file, next to the weights if unset"
+    )
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET, help="ONNX opset")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.model == "layout":
+        onnx_file = export_layout_model(args.path, args.output, args.opset)
+    elif args.model == "figure":
+        onnx_file = export_figure_classifier(args.path, args.output, args.opset)
+    else:
+        config = _load_tableformer_config(args.path)
+        onnx_file = export_tableformer_encoder(config, args.output, args.opset)
+    print(onnx_file)
+
+
+if __name__ == "__main__":
+    main()
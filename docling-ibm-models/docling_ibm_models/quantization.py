@@ -0,0 +1,158 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+import hashlib
+import logging
+import os
+from typing import Callable, Optional
+
+import torch
+
+_log = logging.getLogger(__name__)
+
+QUANTIZE_MODES = ("int8",)
+
+# Layers replaced by their dynamically quantized version. Matched by exact type:
+# the out_proj of nn.MultiheadAttention (NonDynamicallyQuantizableLinear) stays fp32
+_DYNAMIC_QUANTIZED_TYPES = {torch.nn.Linear}
+
+
+def resolve_quantize(quantize: Optional[str], device) -> Optional[str]:
+    r"""
+    Validate the quantization mode requested for a predictor.
+
+    Parameters
+    ----------
+    quantize : str or None
+        "int8" for dynamic int8 quantization; None, "" or "none" for fp32
+    device : str or torch.device
+        Device the model runs on; quantized kernels only exist for CPU
+
+    Returns
+    -------
+    The quantization mode, or None for fp32
+
+    Raises
+    ------
+    ValueError
+        For an unknown mode, or a quantization mode on a non-CPU device
+    """
+    if quantize is None or quantize.lower() in ("", "none"):
+        return None
+    quantize = quantize.lower()
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(
+            "Unknown quantization mode: {}. Supported: {}".format(
+                quantize, ", ".join(QUANTIZE_MODES)
+            )
+        )
+    if torch.device(device).type != "cpu":
+        raise ValueError(
+            "Quantization mode {} is only supported on cpu, not {}".format(
+                quantize, device
+            )
+        )
+    return quantize
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    r"""
+    Return the model with every Linear layer replaced by a dynamic int8 Linear:
+    weights are stored as int8, activations are quantized on the fly per batch.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        model, _DYNAMIC_QUANTIZED_TYPES, dtype=torch.qint8
+    )
+
+
+def quantized_cache_file(weights_file: str, cache_dir: str, quantize: str) -> str:
+    r"""
+    Path of the cached quantized state dict for a weights file.
+    The name changes with the weights file (path, size, mtime), the torch version
+    and the quantized engine, so a stale cache is never loaded.
+    """
+    stat = os.stat(weights_file)
+    key = "|".join(
+        [
+            os.path.abspath(weights_file),
+            str(stat.st_size),
+            str(stat.st_mtime_ns),
+            torch.__version__,
+            torch.backends.quantized.engine,
+        ]
+    )
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(weights_file))[0]
+    return os.path.join(cache_dir, "{}-{}-{}.pt".format(stem, quantize, digest))
+
+
+def default_cache_dir() -> str:
+    r"""
+    Directory for quantized models: $DOCLING_IBM_MODELS_CACHE or
+    ~/.cache/docling_ibm_models, in the quantized/ subdirectory
+    """
+    base = os.environ.get("DOCLING_IBM_MODELS_CACHE") or os.path.join(
+        os.path.expanduser("~"), ".cache", "docling_ibm_models"
+    )
+    return os.path.join(base, "quantized")
+
+
+def load_quantized_model(
+    load_fp32: Callable[[], torch.nn.Module],
+    build_skeleton: Callable[[], torch.nn.Module],
+    weights_file: str,
+    quantize: str,
+    cache_dir: Optional[str] = None,
+) -> torch.nn.Module:
+    r"""
+    Load a quantized model, from the disk cache if possible.
+
+    On a cache hit the fp32 weights are not read at all: the skeleton is
+    quantized and the cached int8 state dict is loaded into it. On a miss the
+    fp32 model is loaded, quantized and its state dict is written to the cache.
+    Cache read or write errors only cost the cache, never the model.
+
+    Parameters
+    ----------
+    load_fp32 : callable
+        Returns the model with its fp32 weights loaded
+    build_skeleton : callable
+        Returns the same model architecture without loading weights
+    weights_file : str
+        The fp32 weights file, used for the cache key
+    quantize : str
+        Quantization mode, see resolve_quantize()
+    cache_dir : str, optional
+        Where quantized models are cached, default_cache_dir() if None
+
+    Returns
+    -------
+    The quantized model in eval mode
+    """
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError("Unknown quantization mode: {}".format(quantize))
+    cache_dir = cache_dir or default_cache_dir()
+    cache_fn = quantized_cache_file(weights_file, cache_dir, quantize)
+
+    if os.path.isfile(cache_fn):
+        try:
+            model = quantize_dynamic_int8(build_skeleton().eval())
+            model.load_state_dict(torch.load(cache_fn, weights_only=True))
+            _log.debug("Loaded quantized model from: {}".format(cache_fn))
+            return model.eval()
+        except Exception as e:
+            _log.warning("Ignoring quantized model cache {}: {}".format(cache_fn, e))
+
+    model = quantize_dynamic_int8(load_fp32().eval())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so concurrent loaders never read a
+        # partial file
+        tmp_fn = "{}.{}.tmp".format(cache_fn, os.getpid())
+        torch.save(model.state_dict(), tmp_fn)
+        os.replace(tmp_fn, cache_fn)
+        _log.debug("Saved quantized model to: {}".format(cache_fn))
+    except OSError as e:
+        _log.warning("Cannot cache quantized model in {}: {}".format(cache_dir, e))
+    return model.eval()
@@ -6,6 +6,7 @@ import argparse
 import json
 import logging
 import os
+import time
 
 import torch
 
@@ -16,6 +17,32 @@ LOG_LEVEL = logging.DEBUG
 logger = s.get_custom_logger("common", LOG_LEVEL)
 
 
+class DeadlineExceeded(TimeoutError):
+    r"""
+    Raised when a prediction is still running at its deadline.
+    The work done so far is discarded.
+    """
+
+
+def check_deadline(deadline, stage):
+    r"""
+    Raise DeadlineExceeded if the deadline has passed.
+
+    Parameters
+    ----------
+    deadline : float or None
+        Absolute time.monotonic() value; None means no deadline
+    stage : string
+        What was about to run, used in the error message
+    """
+    if deadline is not None:
+        overrun = time.monotonic() - deadline
+        if overrun > 0:
+            raise DeadlineExceeded(
+                "Deadline exceeded by {:.3f}s before {}".format(overrun, stage)
+            )
+
+
 def validate_config(config):
     r"""
     Validate the provided configuration file.
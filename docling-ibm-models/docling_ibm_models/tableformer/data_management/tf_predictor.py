@@ -7,6 +7,7 @@ import json
 import logging
 import os
 import threading
+import time
 from itertools import groupby
 from pathlib import Path
 
@@ -19,6 +20,12 @@ import docling_ibm_models.tableformer.common as c
 import docling_ibm_models.tableformer.data_management.transforms as T
 import docling_ibm_models.tableformer.settings as s
 import docling_ibm_models.tableformer.utils.utils as u
+from docling_ibm_models.backends import (
+    OnnxRuntimeModel,
+    default_onnx_file,
+    resolve_backend,
+)
+from docling_ibm_models.quantization import load_quantized_model, resolve_quantize
 from docling_ibm_models.tableformer.data_management.matching_post_processor import (
     MatchingPostProcessor,
 )
@@ -29,6 +36,7 @@ from docling_ibm_models.tableformer.models.table04_rs.tablemodel04_rs import (
 )
 from docling_ibm_models.tableformer.otsl import otsl_to_html
 from docling_ibm_models.tableformer.utils.app_profiler import AggProfiler
+from docling_ibm_models.timing import add_timing
 
 # LOG_LEVEL = logging.INFO
 # LOG_LEVEL = logging.DEBUG
@@ -94,21 +102,51 @@ class TFPredictor:
     Table predictions for the in-memory Docling API
     """
 
-    def __init__(self, config, device: str = "cpu", num_threads: int = 4):
+    # The exported image encoder is <model file stem>_encoder.onnx
+    ENCODER_ONNX_SUFFIX = "_encoder"
+
+    def __init__(
+        self,
+        config,
+        device: str = "cpu",
+        num_threads: int = 4,
+        quantize=None,
+        quantize_cache_dir=None,
+        backend="torch",
+        onnx_file=None,
+        backend_options=None,
+    ):
         r"""
         Parameters
         ----------
         config : dict Parameters configuration
         device: (Optional) torch device to run the inference.
         num_threads: (Optional) Number of threads to run the inference if device = 'cpu'
+        quantize: (Optional) "int8" to run the Linear layers of the tag transformer
+                  and the bbox decoder with dynamic int8 quantization (cpu only)
+        quantize_cache_dir: (Optional) Where the quantized model is cached on disk
+        backend: (Optional) "torch", or "onnxruntime" to run the image encoder with
+                 ONNX Runtime on cpu. The tag transformer and the bbox decoder
+                 always run on torch
+        onnx_file: (Optional) The exported image encoder, see onnx_export. Default:
+                   <model file stem>_encoder.onnx next to the model file
+        backend_options: (Optional) dict with the threading and graph optimization
+                         options of the onnxruntime backend, see OnnxRuntimeModel
 
         Raises
         ------
         ValueError
-        When the model cannot be found
+        When the model cannot be found, or quantize or backend is not supported
+        FileNotFoundError
+        When the onnxruntime backend is selected and the ONNX file is missing
         """
         # self._device = torch.device(device)
         self._device = device
+        self._quantize = resolve_quantize(quantize, device)
+        self._quantize_cache_dir = quantize_cache_dir
+        self._backend = resolve_backend(backend, device)
+        self._onnx_file = onnx_file
+        self._backend_options = backend_options or {}
         self._log().info("Running on device: {}".format(device))
 
         self._config = config
@@ -116,6 +154,8 @@ class TFPredictor:
 
         self._padding = config["predict"].get("padding", False)
         self._padding_size = config["predict"].get("padding_size", 10)
+        # Decode the tables of a page in lockstep in multi_table_predict
+        self._batch_decode = config["predict"].get("batch_decode", True)
 
         self._cell_matcher = CellMatcher(config)
         self._post_processor = MatchingPostProcessor(config)
@@ -182,13 +222,6 @@ class TFPredictor:
 
         # Use lock to prevent threading issues during model initialization
         with _model_init_lock:
-            model = TableModel04_rs(self._config, self._init_data, self._device)
-
-            if model is None:
-                err_msg = "Not able to initiate a model for {}".format(self._model_type)
-                self._log().error(err_msg)
-                raise ValueError(err_msg)
-
             self._remove_padding = False
             if self._model_type == "TableModel02":
                 self._remove_padding = True
@@ -205,14 +238,52 @@ class TFPredictor:
             model_fn = models_fn[
                 0
             ]  # Take the first tableformer safetensors file inside the save_dir
-            missing, unexpected = load_model(model, model_fn, device=self._device)
-            if missing or unexpected:
-                err_msg = "Not able to load the model weights for {}".format(
-                    self._model_type
+            self._model_fn = model_fn
+
+            if self._quantize is None:
+                model = self._load_fp32_model(model_fn)
+            else:
+                model = load_quantized_model(
+                    lambda: self._load_fp32_model(model_fn),
+                    self._init_model,
+                    model_fn,
+                    self._quantize,
+                    self._quantize_cache_dir,
                 )
-                self._log().error(err_msg)
-                raise ValueError(err_msg)
 
+            if self._backend == "onnxruntime":
+                # Same input and output as Encoder04, the rest of the model is unchanged
+                model._encoder = OnnxRuntimeModel(
+                    self._onnx_file
+                    or default_onnx_file(model_fn, self.ENCODER_ONNX_SUFFIX),
+                    weights_file=model_fn,
+                    **self._backend_options,
+                )
+            return model
+
+    def _init_model(self):
+        r"""
+        Instantiate the model without loading its weights
+        """
+        model = TableModel04_rs(self._config, self._init_data, self._device)
+        if model is None:
+            err_msg = "Not able to initiate a model for {}".format(self._model_type)
+            self._log().error(err_msg)
+            raise ValueError(err_msg)
+        return model
+
+    def _load_fp32_model(self, model_fn):
+        r"""
+        Instantiate the model and load its weights from the safetensors file
+        """
+        model = self._init_model()
+        missing, unexpected = load_model(model, model_fn, device=self._device)
+        if missing or unexpected:
+            err_msg = "Not able to load the model weights for {}".format(
+                self._model_type
+            )
+            self._log().error(err_msg)
+            raise ValueError(err_msg)
         return model
 
     def get_device(self):
@@ -221,6 +292,15 @@ class TFPredictor:
     def get_model_type(self):
         return self._model_type
 
+    def get_quantize(self):
+        return self._quantize
+
+    def get_backend(self):
+        return self._backend
+
+    def get_model_file(self):
+        return self._model_fn
+
     def _log(self):
         # Setup a custom logger
         return s.get_custom_logger(self.__class__.__name__, LOG_LEVEL)
@@ -437,7 +517,7 @@ class TFPredictor:
         # initialize the dimensions of the image to be resized and
         # grab the image size
         dim = None
-        (h, w) = image.shape[:2]
+        h, w = image.shape[:2]
         sf = 1.0
         # if both the width and height are None, then return the
         # original image
@@ -470,14 +550,59 @@ class TFPredictor:
         do_matching=True,
         correct_overlapping_cells=False,
         sort_row_col_indexes=True,
+        timings=None,
+        deadline=None,
     ):
+        r"""
+        Predict the structure of every table of a page
+
+        Parameters
+        ----------
+        iocr_page : dict
+            Docling provided page data, with the page image under "image"
+        table_bboxes : list
+            [x1, y1, x2, y2] of every table; scaled in place
+        timings : dict
+            If given, the seconds spent in the "preprocess", "forward" and
+            "postprocess" stages are added to it
+        deadline : float
+            Optional absolute time.monotonic() value. It is checked before
+            every table and every decode step, and c.DeadlineExceeded is raised
+            once it has passed, so abandoned requests stop using the CPU
+
+        The image and tag transformer encoders run once on the batch of all the
+        tables of the page. With predict.batch_decode (the default) the tag
+        sequences of all the tables are then decoded in lockstep too, see
+        TableModel04_rs.predict_batch(); otherwise every table is decoded on its
+        own from its slice of the encoder outputs.
+
+        Returns
+        -------
+        list of dict with the "tf_responses" and "predict_details" of every table
+        """
         multi_tf_output = []
         page_image = iocr_page["image"]
 
+        t0 = time.perf_counter()
         # Prevent large image submission, by resizing input
         page_image_resized, scale_factor = self.resize_img(page_image, height=1024)
+        add_timing(timings, "preprocess", t0)
+
+        encoded = [None] * len(table_bboxes)
+        model_outputs = [None] * len(table_bboxes)
+        if table_bboxes:
+            # Nothing is computed yet: stopping here is stopping before table 0
+            c.check_deadline(deadline, "table 0")
+            batch = self._encode_tables(
+                page_image_resized, table_bboxes, scale_factor, timings
+            )
+            if self._batch_decode:
+                model_outputs = self._decode_tables(batch, timings, deadline)
+            else:
+                encoded = self._split_encoded(batch)
 
-        for table_bbox in table_bboxes:
+        for table_index, table_bbox in enumerate(table_bboxes):
+            c.check_deadline(deadline, "table {}".format(table_index))
             # Downscale table bounding box to the size of new image
             table_bbox[0] = table_bbox[0] * scale_factor
             table_bbox[1] = table_bbox[1] * scale_factor
@@ -498,11 +623,24 @@ class TFPredictor:
                     scale_factor,
                     None,
                     correct_overlapping_cells,
+                    timings=timings,
+                    deadline=deadline,
+                    encoded=encoded[table_index],
+                    model_outputs=model_outputs[table_index],
                 )
             else:
                 tf_responses, predict_details = self.predict_dummy(
-                    iocr_page, table_bbox, table_image, scale_factor, None
+                    iocr_page,
+                    table_bbox,
+                    table_image,
+                    scale_factor,
+                    None,
+                    timings=timings,
+                    deadline=deadline,
+                    encoded=encoded[table_index],
+                    model_outputs=model_outputs[table_index],
                 )
+            t0 = time.perf_counter()
 
             # ======================================================================================
             # PROCESS PREDICTED RESULTS, TO TURN PREDICTED COL/ROW IDs into Indexes
@@ -579,11 +717,93 @@ class TFPredictor:
             table_bbox[1] = table_bbox[1] / scale_factor
             table_bbox[2] = table_bbox[2] / scale_factor
             table_bbox[3] = table_bbox[3] / scale_factor
+            add_timing(timings, "postprocess", t0)
         # Return grouped results of predictions
         return multi_tf_output
 
+    def _encode_tables(self, page_image, table_bboxes, scale_factor, timings=None):
+        r"""
+        Run the encoders of the model once on the batch of all the tables of a page
+
+        Parameters
+        ----------
+        page_image : numpy array
+            The resized page image
+        table_bboxes : list
+            [x1, y1, x2, y2] of every table in the original page coordinates,
+            not modified
+        scale_factor : float
+            Scale of the resized page image
+
+        Returns
+        -------
+        (enc_out, encoder_out) of the batch, as TableModel04_rs.encode() returns them
+        """
+        t0 = time.perf_counter()
+        image_batch = []
+        for table_bbox in table_bboxes:
+            scaled_bbox = [v * scale_factor for v in table_bbox]
+            table_image = page_image[
+                round(scaled_bbox[1]) : round(scaled_bbox[3]),
+                round(scaled_bbox[0]) : round(scaled_bbox[2]),
+            ]
+            image_batch.append(self._prepare_image(table_image))
+        image_batch = torch.cat(image_batch, dim=0)
+        t0 = add_timing(timings, "preprocess", t0)
+
+        with torch.no_grad():
+            encoded = self._model.encode(image_batch)
+        add_timing(timings, "forward", t0)
+        return encoded
+
+    @staticmethod
+    def _split_encoded(encoded):
+        r"""
+        Split the encoder outputs of a batch of tables into the (enc_out, encoder_out)
+        of every table, as TableModel04_rs.encode() returns them for a batch of 1
+        """
+        enc_out, encoder_out = encoded
+        # Contiguous copies, so decoding a table does not depend on the batch
+        return [
+            (
+                enc_out[i : i + 1].contiguous(),
+                encoder_out[:, i : i + 1].contiguous(),
+            )
+            for i in range(enc_out.size(0))
+        ]
+
+    def _decode_tables(self, encoded, timings=None, deadline=None):
+        r"""
+        Decode the tag sequences and bboxes of a batch of encoded tables in lockstep
+
+        Returns
+        -------
+        list with the (tag_seq, outputs_class, outputs_coord) of every table, as
+        TableModel04_rs.predict() returns them
+        """
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            model_outputs = self._model.predict_batch(
+                None,
+                self._config["predict"]["max_steps"],
+                self._config["predict"]["beam_size"],
+                deadline=deadline,
+                encoded=encoded,
+            )
+        add_timing(timings, "forward", t0)
+        return model_outputs
+
     def predict_dummy(
-        self, iocr_page, table_bbox, table_image, scale_factor, eval_res_preds=None
+        self,
+        iocr_page,
+        table_bbox,
+        table_image,
+        scale_factor,
+        eval_res_preds=None,
+        timings=None,
+        deadline=None,
+        encoded=None,
+        model_outputs=None,
     ):
         r"""
         Predict the table out of an image in memory
@@ -594,6 +814,18 @@ class TFPredictor:
             Docling provided table data
         eval_res_preds : dict
             Ready predictions provided by the evaluation results
+        timings : dict
+            If given, the seconds spent in the "preprocess", "forward" and
+            "postprocess" stages are added to it
+        deadline : float
+            Optional absolute time.monotonic() value, checked before every
+            decode step (see multi_table_predict)
+        encoded : tuple
+            Optional encoder outputs of the table image, see _split_encoded();
+            table_image is then not preprocessed again
+        model_outputs : tuple
+            Optional (tag_seq, outputs_class, outputs_coord) already decoded for
+            the table, see _decode_tables(); the model is then not run at all
 
         Returns
         -------
@@ -605,9 +837,13 @@ class TFPredictor:
         """
         AggProfiler().start_agg(self._prof)
 
+        t0 = time.perf_counter()
         max_steps = self._config["predict"]["max_steps"]
         beam_size = self._config["predict"]["beam_size"]
-        image_batch = self._prepare_image(table_image)
+        image_batch = None
+        if encoded is None and model_outputs is None:
+            image_batch = self._prepare_image(table_image)
+        t0 = add_timing(timings, "preprocess", t0)
         # Make predictions
         prediction = {}
 
@@ -619,9 +855,15 @@ class TFPredictor:
                 prediction["bboxes"] = eval_res_preds["bboxes"]
                 pred_tag_seq = eval_res_preds["tag_seq"]
             elif self._config["predict"]["bbox"]:
-                pred_tag_seq, outputs_class, outputs_coord = self._model.predict(
-                    image_batch, max_steps, beam_size
-                )
+                if model_outputs is None:
+                    model_outputs = self._model.predict(
+                        image_batch,
+                        max_steps,
+                        beam_size,
+                        deadline=deadline,
+                        encoded=encoded,
+                    )
+                pred_tag_seq, outputs_class, outputs_coord = model_outputs
 
                 if outputs_coord is not None:
                     if len(outputs_coord) == 0:
@@ -643,9 +885,15 @@ class TFPredictor:
                 if self._remove_padding:
                     pred_tag_seq, _ = u.remove_padding(pred_tag_seq)
             else:
-                pred_tag_seq, _, _ = self._model.predict(
-                    image_batch, max_steps, beam_size
-                )
+                if model_outputs is None:
+                    model_outputs = self._model.predict(
+                        image_batch,
+                        max_steps,
+                        beam_size,
+                        deadline=deadline,
+                        encoded=encoded,
+                    )
+                pred_tag_seq, _, _ = model_outputs
                 # Check if padding should be removed
                 if self._remove_padding:
                     pred_tag_seq, _ = u.remove_padding(pred_tag_seq)
@@ -653,6 +901,7 @@ class TFPredictor:
             prediction["tag_seq"] = pred_tag_seq
             prediction["rs_seq"] = self._get_html_tags(pred_tag_seq)
             prediction["html_seq"] = otsl_to_html(prediction["rs_seq"], False)
+        t0 = add_timing(timings, "forward", t0)
         # Remove implied padding from bbox predictions,
         # that we added on image pre-processing stage
         self._log().debug("----- rs_seq -----")
@@ -700,6 +949,7 @@ class TFPredictor:
             # tf_output = self._merge_tf_output_dummy(docling_output)
             tf_output = docling_output
 
+        add_timing(timings, "postprocess", t0)
         return tf_output, matching_details
 
     def predict(
@@ -710,6 +960,10 @@ class TFPredictor:
         scale_factor,
         eval_res_preds=None,
         correct_overlapping_cells=False,
+        timings=None,
+        deadline=None,
+        encoded=None,
+        model_outputs=None,
     ):
         r"""
         Predict the table out of an image in memory
@@ -722,6 +976,18 @@ class TFPredictor:
             Ready predictions provided by the evaluation results
         correct_overlapping_cells : boolean
             Enables or disables last post-processing step, that fixes cell bboxes to remove overlap
+        timings : dict
+            If given, the seconds spent in the "preprocess", "forward" and
+            "postprocess" stages are added to it
+        deadline : float
+            Optional absolute time.monotonic() value, checked before every
+            decode step (see multi_table_predict)
+        encoded : tuple
+            Optional encoder outputs of the table image, see _split_encoded();
+            table_image is then not preprocessed again
+        model_outputs : tuple
+            Optional (tag_seq, outputs_class, outputs_coord) already decoded for
+            the table, see _decode_tables(); the model is then not run at all
 
         Returns
         -------
@@ -733,9 +999,13 @@ class TFPredictor:
         """
         AggProfiler().start_agg(self._prof)
 
+        t0 = time.perf_counter()
         max_steps = self._config["predict"]["max_steps"]
         beam_size = self._config["predict"]["beam_size"]
-        image_batch = self._prepare_image(table_image)
+        image_batch = None
+        if encoded is None and model_outputs is None:
+            image_batch = self._prepare_image(table_image)
+        t0 = add_timing(timings, "preprocess", t0)
         # Make predictions
         prediction = {}
 
@@ -747,9 +1017,15 @@ class TFPredictor:
                 prediction["bboxes"] = eval_res_preds["bboxes"]
                 pred_tag_seq = eval_res_preds["tag_seq"]
             elif self._config["predict"]["bbox"]:
-                pred_tag_seq, outputs_class, outputs_coord = self._model.predict(
-                    image_batch, max_steps, beam_size
-                )
+                if model_outputs is None:
+                    model_outputs = self._model.predict(
+                        image_batch,
+                        max_steps,
+                        beam_size,
+                        deadline=deadline,
+                        encoded=encoded,
+                    )
+                pred_tag_seq, outputs_class, outputs_coord = model_outputs
 
                 if outputs_coord is not None:
                     if len(outputs_coord) == 0:
@@ -771,9 +1047,15 @@ class TFPredictor:
                 if self._remove_padding:
                     pred_tag_seq, _ = u.remove_padding(pred_tag_seq)
             else:
-                pred_tag_seq, _, _ = self._model.predict(
-                    image_batch, max_steps, beam_size
-                )
+                if model_outputs is None:
+                    model_outputs = self._model.predict(
+                        image_batch,
+                        max_steps,
+                        beam_size,
+                        deadline=deadline,
+                        encoded=encoded,
+                    )
+                pred_tag_seq, _, _ = model_outputs
                 # Check if padding should be removed
                 if self._remove_padding:
                     pred_tag_seq, _ = u.remove_padding(pred_tag_seq)
@@ -781,6 +1063,7 @@ class TFPredictor:
             prediction["tag_seq"] = pred_tag_seq
             prediction["rs_seq"] = self._get_html_tags(pred_tag_seq)
             prediction["html_seq"] = otsl_to_html(prediction["rs_seq"], False)
+        t0 = add_timing(timings, "forward", t0)
         # Remove implied padding from bbox predictions,
         # that we added on image pre-processing stage
         self._log().debug("----- rs_seq -----")
@@ -840,6 +1123,7 @@ class TFPredictor:
         # with deduplicated table cells
         tf_output = self._merge_tf_output(docling_output, matching_details["pdf_cells"])
 
+        add_timing(timings, "postprocess", t0)
         return tf_output, matching_details
 
     def _generate_tf_response_dummy(self, table_cells):
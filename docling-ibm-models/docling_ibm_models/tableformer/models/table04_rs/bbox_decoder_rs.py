@@ -43,7 +43,7 @@ class CellAttention(nn.Module):
         # Setup a custom logger
         return s.get_custom_logger(self.__class__.__name__, LOG_LEVEL)
 
-    def forward(self, encoder_out, decoder_hidden, language_out):
+    def forward(self, encoder_out, decoder_hidden, language_out, encoder_att=None):
         """
         Forward propagation.
         :param encoder_out: encoded images, a tensor of dimension (1, num_pixels, encoder_dim)
@@ -51,17 +51,23 @@ class CellAttention(nn.Module):
                                tag_decoder_dim)]
         :param language_out: language model output, a tensor of dimension (num_cells,
                                language_dim)
+        :param encoder_att: (optional) self._encoder_att(encoder_out), when it is
+                            computed once for several calls
         :return: attention weighted encoding, weights
         """
-        att1 = self._encoder_att(encoder_out)  # (1, num_pixels, attention_dim)
+        if encoder_att is None:
+            encoder_att = self._encoder_att(encoder_out)
+        att1 = encoder_att  # (1, num_pixels, attention_dim)
         att2 = self._tag_decoder_att(decoder_hidden)  # (num_cells, tag_decoder_dim)
         att3 = self._language_att(language_out)  # (num_cells, attention_dim)
         att = self._full_att(
             self._relu(att1 + att2.unsqueeze(1) + att3.unsqueeze(1))
         ).squeeze(2)
         alpha = self._softmax(att)  # (num_cells, num_pixels)
-        # (num_cells, encoder_dim)
-        attention_weighted_encoding = (encoder_out * alpha.unsqueeze(2)).sum(dim=1)
+        # (num_cells, encoder_dim), without a (num_cells, num_pixels, encoder_dim) product
+        attention_weighted_encoding = torch.matmul(
+            alpha.unsqueeze(1), encoder_out
+        ).squeeze(1)
         return attention_weighted_encoding, alpha
 
 
@@ -81,6 +87,7 @@ class BBoxDecoder(nn.Module):
         encoder_dim=512,
         dropout=0.5,
         cnn_layer_stride=1,
+        mini_batch_size=32,
     ):
         """
         :param attention_dim: size of attention network
@@ -90,7 +97,8 @@ class BBoxDecoder(nn.Module):
         :param vocab_size: size of vocabulary
         :param encoder_dim: feature size of encoded images
         :param dropout: dropout
-        :param mini_batch_size: batch size of cells to reduce GPU memory usage
+        :param mini_batch_size: number of cells decoded at once in inference, to bound
+                                the memory of the attention over all the pixels
         """
         super(BBoxDecoder, self).__init__()
         self._device = device
@@ -100,6 +108,7 @@ class BBoxDecoder(nn.Module):
         self._decoder_dim = decoder_dim
         self._dropout = dropout
         self._num_classes = num_classes
+        self._mini_batch_size = mini_batch_size
 
         if cnn_layer_stride is not None:
             self._input_filter = u.resnet_block(stride=cnn_layer_stride)
@@ -141,28 +150,30 @@ class BBoxDecoder(nn.Module):
         encoder_out = encoder_out.view(1, -1, encoder_dim)
 
         num_cells = len(tag_H)
+        if num_cells == 0:
+            return torch.empty(0), torch.empty(0)
+
+        # The initial hidden state, its gate and the attention over the pixels do
+        # not depend on the cell: compute them once for all the cells
+        h = self._init_hidden_state(encoder_out, 1)  # (1, decoder_dim)
+        gate = self._sigmoid(self._f_beta(h))  # (1, encoder_dim)
+        encoder_att = self._attention._encoder_att(encoder_out)
+        # (num_cells, tag_decoder_dim)
+        tag_H = torch.cat([cell_tag_H.view(1, -1) for cell_tag_H in tag_H])
+
         predictions_bboxes = []
         predictions_classes = []
+        # Cells in mini batches: the attention is (cells, num_pixels, attention_dim)
+        for start in range(0, num_cells, self._mini_batch_size):
+            cells_tag_H = tag_H[start : start + self._mini_batch_size]
+            awe, _ = self._attention(
+                encoder_out, cells_tag_H, h, encoder_att=encoder_att
+            )
+            cells_h = gate * awe * h
 
-        for c_id in range(num_cells):
-            # Start decoding
-            h = self._init_hidden_state(encoder_out, 1)
-            cell_tag_H = tag_H[c_id]
-            awe, _ = self._attention(encoder_out, cell_tag_H, h)
-            gate = self._sigmoid(self._f_beta(h))
-            awe = gate * awe
-            h = awe * h
-
-            predictions_bboxes.append(self._bbox_embed(h).sigmoid())
-            predictions_classes.append(self._class_embed(h))
-        if len(predictions_bboxes) > 0:
-            predictions_bboxes = torch.stack([x[0] for x in predictions_bboxes])
-        else:
-            predictions_bboxes = torch.empty(0)
-
-        if len(predictions_classes) > 0:
-            predictions_classes = torch.stack([x[0] for x in predictions_classes])
-        else:
-            predictions_classes = torch.empty(0)
+            predictions_bboxes.append(self._bbox_embed(cells_h).sigmoid())
+            predictions_classes.append(self._class_embed(cells_h))
+        predictions_bboxes = torch.cat(predictions_bboxes)
+        predictions_classes = torch.cat(predictions_classes)
 
         return predictions_classes, predictions_bboxes
@@ -8,11 +8,13 @@ import torch
 import torch.nn as nn
 
 import docling_ibm_models.tableformer.settings as s
+from docling_ibm_models.tableformer.common import check_deadline
 from docling_ibm_models.tableformer.models.common.base_model import BaseModel
 from docling_ibm_models.tableformer.models.table04_rs.bbox_decoder_rs import BBoxDecoder
 from docling_ibm_models.tableformer.models.table04_rs.encoder04_rs import Encoder04
 from docling_ibm_models.tableformer.models.table04_rs.transformer_rs import (
     Tag_Transformer,
+    TMDecoderCache,
 )
 from docling_ibm_models.tableformer.utils.app_profiler import AggProfiler
 
@@ -67,6 +69,8 @@ class TableModel04_rs(BaseModel, nn.Module):
         self._enc_image_size = config["model"]["enc_image_size"]
 
         self._max_pred_len = config["predict"]["max_steps"]
+        # Attention masks of the tag transformer encoder, see _encoder_mask()
+        self._encoder_masks = {}
 
         self._tag_transformer = Tag_Transformer(
             device,
@@ -95,47 +99,62 @@ class TableModel04_rs(BaseModel, nn.Module):
         return s.get_custom_logger(self.__class__.__name__, LOG_LEVEL)
 
     def mergebboxes(self, bbox1, bbox2):
-        new_w = (bbox2[0] + bbox2[2] / 2) - (bbox1[0] - bbox1[2] / 2)
-        new_h = (bbox2[1] + bbox2[3] / 2) - (bbox1[1] - bbox1[3] / 2)
+        r"""
+        Merge the cxcywh bboxes of the first (bbox1) and last (bbox2) cell of
+        horizontal spans. Both are tensors (4) or (num_spans, 4).
+        """
+        cx1, cy1, w1, h1 = bbox1.unbind(-1)
+        cx2, cy2, w2, h2 = bbox2.unbind(-1)
+        new_w = (cx2 + w2 / 2) - (cx1 - w1 / 2)
+        new_h = (cy2 + h2 / 2) - (cy1 - h1 / 2)
 
-        new_left = bbox1[0] - bbox1[2] / 2
-        new_top = min((bbox2[1] - bbox2[3] / 2), (bbox1[1] - bbox1[3] / 2))
+        new_left = cx1 - w1 / 2
+        new_top = torch.minimum((cy2 - h2 / 2), (cy1 - h1 / 2))
 
         new_cx = new_left + new_w / 2
         new_cy = new_top + new_h / 2
 
-        bboxm = torch.tensor([new_cx, new_cy, new_w, new_h])
+        bboxm = torch.stack([new_cx, new_cy, new_w, new_h], dim=-1)
         return bboxm
 
-    def predict(self, imgs, max_steps, k, return_attention=False):
+    def _encoder_mask(self, batch_size, positions):
         r"""
-        Inference.
-        The input image must be preprocessed and transformed.
+        Attention mask of the tag transformer encoder, nothing is masked.
+        The mask is built once per number of positions and expanded to the batch
+        without a copy.
+        """
+        n_heads = self._tag_transformer._n_heads
+        mask = self._encoder_masks.get(positions)
+        if mask is None:
+            mask = torch.zeros(
+                (1, positions, positions), dtype=torch.bool, device=self._device
+            )
+            self._encoder_masks[positions] = mask
+        return mask.expand(batch_size * n_heads, positions, positions)
+
+    def encode(self, imgs):
+        r"""
+        Run the image encoder and the tag transformer encoder on a batch of images.
+        Every image is encoded independently, so a table can be decoded from its
+        slice of a batch.
 
         Parameters
         ----------
-        img : tensor FloatTensor - torch.Size([1, 3, 448, 448])
-            Input image for the inference
+        imgs : tensor FloatTensor - torch.Size([batch_size, 3, 448, 448])
+            Preprocessed images
 
         Returns
         -------
-        seq : list
-            Predictions for the tags as indices over the word_map
-        outputs_class : tensor(x, 3)
-            Classes of predicted bboxes. x is the number of bboxes. There are 3 bbox classes
-
-        outputs_coord : tensor(x, 4)
-            Coords of predicted bboxes. x is the number of bboxes. Each bbox is in [cxcywh] format
+        enc_out : tensor (batch_size, 28, 28, 256)
+            Output of the image encoder, used by the bbox decoder
+        encoder_out : tensor (784, batch_size, 512)
+            Output of the tag transformer encoder, the memory of the tag decoder
         """
-        AggProfiler().begin("predict_total", self._prof)
-
         # Invoke encoder
         self._tag_transformer.eval()
         enc_out = self._encoder(imgs)
         AggProfiler().end("model_encoder", self._prof)
 
-        word_map = self._init_data["word_map"]["word_map_tag"]
-        n_heads = self._tag_transformer._n_heads
         # [1, 28, 28, 512]
         encoder_out = self._tag_transformer._input_filter(
             enc_out.permute(0, 3, 1, 2)
@@ -147,182 +166,293 @@ class TableModel04_rs(BaseModel, nn.Module):
         enc_inputs = enc_inputs.permute(1, 0, 2)
         positions = enc_inputs.shape[0]
 
-        encoder_mask = torch.zeros(
-            (batch_size * n_heads, positions, positions), device=self._device
-        ) == torch.ones(
-            (batch_size * n_heads, positions, positions), device=self._device
-        )
+        encoder_mask = self._encoder_mask(batch_size, positions)
 
         # Invoking tag transformer encoder before the loop to save time
         AggProfiler().begin("model_tag_transformer_encoder", self._prof)
         encoder_out = self._tag_transformer._encoder(enc_inputs, mask=encoder_mask)
         AggProfiler().end("model_tag_transformer_encoder", self._prof)
+        return enc_out, encoder_out
+
+    def predict(
+        self,
+        imgs,
+        max_steps,
+        k,
+        return_attention=False,
+        deadline=None,
+        encoded=None,
+    ):
+        r"""
+        Inference.
+        The input image must be preprocessed and transformed.
 
-        decoded_tags = (
-            torch.LongTensor([word_map["<start>"]]).to(self._device).unsqueeze(1)
-        )
-        output_tags = []
-        cache = None
-        tag_H_buf = []
+        Parameters
+        ----------
+        img : tensor FloatTensor - torch.Size([1, 3, 448, 448])
+            Input image for the inference
+        deadline : float
+            Optional absolute time.monotonic() value, checked before every
+            decode step; DeadlineExceeded is raised once it has passed
+        encoded : tuple
+            Optional (enc_out, encoder_out) of the image as returned by encode()
+            for a batch of 1; the encoders are not run again and img is unused
 
-        skip_next_tag = True
-        prev_tag_ucel = False
-        line_num = 0
+        Returns
+        -------
+        seq : list
+            Predictions for the tags as indices over the word_map
+        outputs_class : tensor(x, 3)
+            Classes of predicted bboxes. x is the number of bboxes. There are 3 bbox classes
 
-        # Populate bboxes_to_merge, indexes of first lcel, and last cell in a span
-        first_lcel = True
-        bboxes_to_merge = {}
-        cur_bbox_ind = -1
-        bbox_ind = 0
-
-        # i = 0
-        while len(output_tags) < self._max_pred_len:
-            decoded_embedding = self._tag_transformer._embedding(decoded_tags)
+        outputs_coord : tensor(x, 4)
+            Coords of predicted bboxes. x is the number of bboxes. Each bbox is in [cxcywh] format
+        """
+        return self.predict_batch(
+            imgs, max_steps, k, deadline=deadline, encoded=encoded
+        )[0]
+
+    def predict_batch(self, imgs, max_steps, k, deadline=None, encoded=None):
+        r"""
+        Batched inference: the tag decoder runs over all the images in lockstep,
+        one decoder call per step for the whole batch. A table leaves the batch
+        once it has predicted <end>, so the decoding takes max(len) steps instead
+        of sum(len). The structure corrections and the bbox bookkeeping are done
+        for every table on its own, as predict() does.
+
+        Parameters
+        ----------
+        imgs : tensor FloatTensor - torch.Size([batch_size, 3, 448, 448])
+            Input images for the inference
+        deadline : float
+            Optional absolute time.monotonic() value, checked before every
+            decode step; DeadlineExceeded is raised once it has passed
+        encoded : tuple
+            Optional (enc_out, encoder_out) of the images as returned by encode();
+            the encoders are not run again and imgs is unused
+
+        Returns
+        -------
+        list with the (seq, outputs_class, outputs_coord) of every image, see
+        predict()
+        """
+        AggProfiler().begin("predict_total", self._prof)
+
+        if encoded is None:
+            encoded = self.encode(imgs)
+        enc_out, encoder_out = encoded
+
+        word_map = self._init_data["word_map"]["word_map_tag"]
+        batch_size = encoder_out.size(1)
+
+        states = [_TagDecodeState(word_map) for _ in range(batch_size)]
+        # Index in states of every row of the decoder batch
+        active = list(range(batch_size))
+        new_tags = [word_map["<start>"]] * batch_size
+        # Only the new tag goes through the decoder at every step, the previous
+        # tags are attended to through the cached key/value projections
+        cache = TMDecoderCache(
+            self._tag_transformer._decoder, encoder_out, self._max_pred_len
+        )
+
+        while active and cache.length < self._max_pred_len:
+            check_deadline(deadline, "decode step {}".format(cache.length))
+            decoded_embedding = self._tag_transformer._embedding(
+                torch.LongTensor(new_tags).to(self._device).unsqueeze(0)
+            )  # 1, B, embed_dim
             decoded_embedding = self._tag_transformer._positional_encoding(
-                decoded_embedding
+                decoded_embedding, offset=cache.length
             )
             AggProfiler().begin("model_tag_transformer_decoder", self._prof)
-            decoded, cache = self._tag_transformer._decoder(
-                decoded_embedding,
-                encoder_out,
-                cache,
-                memory_key_padding_mask=encoder_mask,
-            )
+            decoded = self._tag_transformer._decoder.step(decoded_embedding, cache)
             AggProfiler().end("model_tag_transformer_decoder", self._prof)
             # Grab last feature to produce token
             AggProfiler().begin("model_tag_transformer_fc", self._prof)
-            logits = self._tag_transformer._fc(decoded[-1, :, :])  # 1, vocab_size
+            logits = self._tag_transformer._fc(decoded[-1, :, :])  # B, vocab_size
             AggProfiler().end("model_tag_transformer_fc", self._prof)
-            new_tag = logits.argmax(1).item()
-
-            # STRUCTURE ERROR CORRECTION
-            # Correction for first line xcel...
-            if line_num == 0:
-                if new_tag == word_map["xcel"]:
-                    new_tag = word_map["lcel"]
-
-            # Correction for ucel, lcel sequence...
-            if prev_tag_ucel:
-                if new_tag == word_map["lcel"]:
-                    new_tag = word_map["fcel"]
-
-            # End of generation
-            if new_tag == word_map["<end>"]:
-                output_tags.append(new_tag)
-                decoded_tags = torch.cat(
-                    [
-                        decoded_tags,
-                        torch.LongTensor([new_tag]).unsqueeze(1).to(self._device),
-                    ],
-                    dim=0,
-                )  # current_output_len, 1
-                break
-            output_tags.append(new_tag)
-
-            # BBOX PREDICTION
-
-            # MAKE SURE TO SYNC NUMBER OF CELLS WITH NUMBER OF BBOXes
-            if not skip_next_tag:
-                if new_tag in [
-                    word_map["fcel"],
-                    word_map["ecel"],
-                    word_map["ched"],
-                    word_map["rhed"],
-                    word_map["srow"],
-                    word_map["nl"],
-                    word_map["ucel"],
-                ]:
-                    # GENERATE BBOX HERE TOO (All other cases)...
-                    tag_H_buf.append(decoded[-1, :, :])
-                    if first_lcel is not True:
-                        # Mark end index for horizontal cell bbox merge
-                        bboxes_to_merge[cur_bbox_ind] = bbox_ind
-                    bbox_ind += 1
-
-            # Treat horisontal span bboxes...
-            if new_tag != word_map["lcel"]:
-                first_lcel = True
-            else:
-                if first_lcel:
-                    # GENERATE BBOX HERE (Beginning of horisontal span)...
-                    tag_H_buf.append(decoded[-1, :, :])
-                    first_lcel = False
-                    # Mark start index for cell bbox merge
-                    cur_bbox_ind = bbox_ind
-                    bboxes_to_merge[cur_bbox_ind] = -1
-                    bbox_ind += 1
-
-            if new_tag in [word_map["nl"], word_map["ucel"], word_map["xcel"]]:
-                skip_next_tag = True
-            else:
-                skip_next_tag = False
-
-            # Register ucel in sequence...
-            if new_tag == word_map["ucel"]:
-                prev_tag_ucel = True
-            else:
-                prev_tag_ucel = False
-
-            decoded_tags = torch.cat(
-                [
-                    decoded_tags,
-                    torch.LongTensor([new_tag]).unsqueeze(1).to(self._device),
-                ],
-                dim=0,
-            )  # current_output_len, 1
-        seq = decoded_tags.squeeze().tolist()
-
-        if self._bbox:
-            AggProfiler().begin("model_bbox_decoder", self._prof)
-            outputs_class, outputs_coord = self._bbox_decoder.inference(
-                enc_out, tag_H_buf
+            new_tags = logits.argmax(1).tolist()
+
+            for row, i in enumerate(active):
+                new_tags[row] = states[i].step(
+                    new_tags[row], decoded[-1, row : row + 1]
+                )
+
+            # Finished tables leave the batch
+            rows = [row for row, i in enumerate(active) if not states[i].finished]
+            if len(rows) < len(active):
+                active = [active[row] for row in rows]
+                new_tags = [new_tags[row] for row in rows]
+                if rows:
+                    cache.select(torch.tensor(rows, device=self._device))
+
+        outputs = []
+        for i, state in enumerate(states):
+            seq = [word_map["<start>"]] + state.output_tags
+            outputs_class, outputs_coord = self._predict_bboxes(
+                enc_out[i : i + 1], state
             )
-            AggProfiler().end("model_bbox_decoder", self._prof)
-        else:
-            outputs_class, outputs_coord = None, None
-
-        outputs_class.to(self._device)
-        outputs_coord.to(self._device)
-
-        ########################################################################################
-        # Merge First and Last predicted BBOX for each span, according to bboxes_to_merge
-        ########################################################################################
-
-        outputs_class1 = []
-        outputs_coord1 = []
-        boxes_to_skip = []
-
-        for box_ind in range(len(outputs_coord)):
-            box1 = outputs_coord[box_ind].to(self._device)
-            cls1 = outputs_class[box_ind].to(self._device)
-            if box_ind in bboxes_to_merge:
-                box2 = outputs_coord[bboxes_to_merge[box_ind]].to(self._device)
-                boxes_to_skip.append(bboxes_to_merge[box_ind])
-                boxm = self.mergebboxes(box1, box2).to(self._device)
-                outputs_coord1.append(boxm)
-                outputs_class1.append(cls1)
-            else:
-                if box_ind not in boxes_to_skip:
-                    outputs_coord1.append(box1)
-                    outputs_class1.append(cls1)
-
-        if len(outputs_coord1) > 0:
-            outputs_coord1 = torch.stack(outputs_coord1)
-        else:
-            outputs_coord1 = torch.empty(0)
-        if len(outputs_class1) > 0:
-            outputs_class1 = torch.stack(outputs_class1)
-        else:
-            outputs_class1 = torch.empty(0)
-
-        outputs_class = outputs_class1
-        outputs_coord = outputs_coord1
+            num_tab_cells = seq.count(4) + seq.count(5)
+            num_rows = seq.count(9)
+            self._log().info(
+                "OTSL predicted table cells#: {}; rows#: {}".format(
+                    num_tab_cells, num_rows
+                )
+            )
+            outputs.append((seq, outputs_class, outputs_coord))
 
-        # Do the rest of the steps...
         AggProfiler().end("predict_total", self._prof)
-        num_tab_cells = seq.count(4) + seq.count(5)
-        num_rows = seq.count(9)
-        self._log().info(
-            "OTSL predicted table cells#: {}; rows#: {}".format(num_tab_cells, num_rows)
+        return outputs
+
+    def _predict_bboxes(self, enc_out, state):
+        r"""
+        Run the bbox decoder for the cells of one table and merge the first and
+        last bbox of every horizontal span
+        """
+        if not self._bbox:
+            return None, None
+
+        AggProfiler().begin("model_bbox_decoder", self._prof)
+        outputs_class, outputs_coord = self._bbox_decoder.inference(
+            enc_out, state.tag_H_buf
+        )
+        AggProfiler().end("model_bbox_decoder", self._prof)
+        return self._merge_span_bboxes(
+            outputs_class, outputs_coord, state.bboxes_to_merge
+        )
+
+    def _merge_span_bboxes(self, outputs_class, outputs_coord, bboxes_to_merge):
+        r"""
+        Merge First and Last predicted BBOX for each span, according to bboxes_to_merge
+
+        Parameters
+        ----------
+        outputs_class : tensor (num_bboxes, num_classes + 1)
+        outputs_coord : tensor (num_bboxes, 4)
+            Predicted bboxes in cxcywh format
+        bboxes_to_merge : dict
+            Index of the first bbox of every horizontal span to the index of its
+            last bbox; -1 if the span is not closed, it is then merged with the
+            last bbox, which is kept too
+
+        Returns
+        -------
+        outputs_class, outputs_coord with the first bbox of every span replaced
+        by the merged bbox, and the last bbox of every span removed
+        """
+        num_bboxes = len(outputs_coord)
+        if num_bboxes == 0:
+            return torch.empty(0), torch.empty(0)
+        if not bboxes_to_merge:
+            return outputs_class, outputs_coord
+
+        device = outputs_coord.device
+        starts = torch.tensor(list(bboxes_to_merge.keys()), device=device)
+        ends = torch.tensor(list(bboxes_to_merge.values()), device=device)
+        closed = ends >= 0
+
+        outputs_coord = outputs_coord.clone()
+        outputs_coord[starts] = self.mergebboxes(
+            outputs_coord[starts], outputs_coord[ends.remainder(num_bboxes)]
         )
-        return seq, outputs_class, outputs_coord
+
+        keep = torch.ones(num_bboxes, dtype=torch.bool, device=device)
+        keep[ends[closed]] = False
+        keep[starts] = True
+        return outputs_class[keep], outputs_coord[keep]
+
+
+class _TagDecodeState:
+    r"""
+    Greedy OTSL decoding state of one table: the structure error corrections and
+    the bookkeeping of which tags get a bbox and which bboxes are merged
+    """
+
+    def __init__(self, word_map):
+        self._word_map = word_map
+        # Tags that get a bbox (unless right after nl, ucel or xcel)
+        self._bbox_tags = {
+            word_map["fcel"],
+            word_map["ecel"],
+            word_map["ched"],
+            word_map["rhed"],
+            word_map["srow"],
+            word_map["nl"],
+            word_map["ucel"],
+        }
+        self._skip_tags = {word_map["nl"], word_map["ucel"], word_map["xcel"]}
+
+        self.output_tags = []
+        self.tag_H_buf = []
+        self.finished = False
+
+        self._skip_next_tag = True
+        self._prev_tag_ucel = False
+        self._line_num = 0
+
+        # Populate bboxes_to_merge, indexes of first lcel, and last cell in a span
+        self._first_lcel = True
+        self.bboxes_to_merge = {}
+        self._cur_bbox_ind = -1
+        self._bbox_ind = 0
+
+    def step(self, new_tag, tag_H):
+        r"""
+        Record the tag predicted at this step and return it corrected
+
+        Parameters
+        ----------
+        new_tag : int
+            The predicted tag
+        tag_H : tensor (1, hidden_dim)
+            Last decoder output, kept for the bbox decoder if the tag gets a bbox
+        """
+        word_map = self._word_map
+
+        # STRUCTURE ERROR CORRECTION
+        # Correction for first line xcel...
+        if self._line_num == 0:
+            if new_tag == word_map["xcel"]:
+                new_tag = word_map["lcel"]
+
+        # Correction for ucel, lcel sequence...
+        if self._prev_tag_ucel:
+            if new_tag == word_map["lcel"]:
+                new_tag = word_map["fcel"]
+
+        # End of generation
+        if new_tag == word_map["<end>"]:
+            self.output_tags.append(new_tag)
+            self.finished = True
+            return new_tag
+        self.output_tags.append(new_tag)
+
+        # BBOX PREDICTION
+
+        # MAKE SURE TO SYNC NUMBER OF CELLS WITH NUMBER OF BBOXes
+        if not self._skip_next_tag:
+            if new_tag in self._bbox_tags:
+                # GENERATE BBOX HERE TOO (All other cases)...
+                self.tag_H_buf.append(tag_H)
+                if self._first_lcel is not True:
+                    # Mark end index for horizontal cell bbox merge
+                    self.bboxes_to_merge[self._cur_bbox_ind] = self._bbox_ind
+                self._bbox_ind += 1
+
+        # Treat horisontal span bboxes...
+        if new_tag != word_map["lcel"]:
+            self._first_lcel = True
+        else:
+            if self._first_lcel:
+                # GENERATE BBOX HERE (Beginning of horisontal span)...
+                self.tag_H_buf.append(tag_H)
+                self._first_lcel = False
+                # Mark start index for cell bbox merge
+                self._cur_bbox_ind = self._bbox_ind
+                self.bboxes_to_merge[self._cur_bbox_ind] = -1
+                self._bbox_ind += 1
+
+        self._skip_next_tag = new_tag in self._skip_tags
+
+        # Register ucel in sequence...
+        self._prev_tag_ucel = new_tag == word_map["ucel"]
+        return new_tag
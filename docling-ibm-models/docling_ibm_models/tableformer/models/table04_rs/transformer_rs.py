@@ -9,6 +9,7 @@ import math
 from typing import Optional
 
 import torch
+import torch.nn.functional as F
 from torch import Tensor, nn
 
 import docling_ibm_models.tableformer.utils.utils as u
@@ -32,11 +33,129 @@ class PositionalEncoding(nn.Module):
         pe = pe.unsqueeze(0).transpose(0, 1)
         self.register_buffer("pe", pe)
 
-    def forward(self, x):
-        x = x + self.pe[: x.size(0), :]
+    def forward(self, x, offset=0):
+        r"""
+        offset: position of the first element of x in the sequence
+        """
+        x = x + self.pe[offset : offset + x.size(0), :]
         return self.dropout(x)
 
 
+def _split_heads(x: Tensor, n_heads: int) -> Tensor:
+    r"""
+    (len, bsz, n_heads * head_dim) -> (bsz, n_heads, len, head_dim)
+    """
+    length, bsz, dim = x.shape
+    return x.view(length, bsz, n_heads, dim // n_heads).permute(1, 2, 0, 3)
+
+
+def _attend(mha: nn.MultiheadAttention, q: Tensor, k: Tensor, v: Tensor) -> Tensor:
+    r"""
+    Attention of the already projected queries (bsz, n_heads, 1, head_dim) over
+    the already projected keys and values (bsz, n_heads, len, head_dim), followed
+    by the output projection of mha. Returns (1, bsz, embed_dim).
+    """
+    out = F.scaled_dot_product_attention(q, k, v)
+    bsz, n_heads, length, head_dim = out.shape
+    out = out.permute(2, 0, 1, 3).reshape(length, bsz, n_heads * head_dim)
+    return mha.out_proj(out)
+
+
+class TMDecoderCache:
+    r"""
+    Key/value cache of the tag decoder for incremental greedy decoding.
+
+    For every layer it holds:
+    - the keys and values of the cross-attention over the encoder memory, which
+      are the same for all the steps and projected once
+    - the keys and values of the self-attention over the tags decoded so far, in
+      buffers the new tag is written into in place. The buffers are
+      preallocated, and their capacity doubles when full up to max_len, so a
+      step attends over the cached projections without copying the prefix.
+    """
+
+    def __init__(self, decoder: "TMTransformerDecoder", memory: Tensor, max_len: int):
+        r"""
+        Parameters
+        ----------
+        decoder : TMTransformerDecoder
+        memory : Tensor (enc_image_size, bsz, hidden_dim)
+            Encoded image
+        max_len : int
+            Maximum number of tags to decode
+        """
+        self.max_len = max_len
+        self.length = 0
+        self.memory_kv = []
+        self.self_kv = []
+        self._capacity = min(max_len, 64)
+        for layer in decoder.layers:
+            mha = layer.multihead_attn
+            dim = mha.embed_dim
+            w = mha.in_proj_weight
+            b = mha.in_proj_bias
+            k = F.linear(memory, w[dim : 2 * dim], b[dim : 2 * dim])
+            v = F.linear(memory, w[2 * dim :], b[2 * dim :])
+            self.memory_kv.append(
+                (_split_heads(k, mha.num_heads), _split_heads(v, mha.num_heads))
+            )
+
+            n_heads = layer.self_attn.num_heads
+            shape = (memory.size(1), n_heads, self._capacity, dim // n_heads)
+            self.self_kv.append(
+                (
+                    memory.new_empty(shape),
+                    memory.new_empty(shape),
+                )
+            )
+
+    def append(self, layer_idx: int, k: Tensor, v: Tensor):
+        r"""
+        Write the self-attention key and value (bsz, n_heads, 1, head_dim) of the
+        new tag at position self.length of a layer
+        """
+        if self.length >= self.max_len:
+            raise IndexError("Tag decoder cache is full: {}".format(self.max_len))
+        if self.length == self._capacity:
+            self._grow()
+        k_buf, v_buf = self.self_kv[layer_idx]
+        k_buf[:, :, self.length : self.length + 1] = k
+        v_buf[:, :, self.length : self.length + 1] = v
+
+    def keys_values(self, layer_idx: int):
+        r"""
+        Self-attention keys and values of a layer up to and including the new tag
+        """
+        k_buf, v_buf = self.self_kv[layer_idx]
+        return k_buf[:, :, : self.length + 1], v_buf[:, :, : self.length + 1]
+
+    def select(self, index: Tensor):
+        r"""
+        Keep only the sequences at index of the batch
+        """
+        self.memory_kv = [
+            (k.index_select(0, index), v.index_select(0, index))
+            for k, v in self.memory_kv
+        ]
+        self.self_kv = [
+            (k.index_select(0, index), v.index_select(0, index))
+            for k, v in self.self_kv
+        ]
+
+    def _grow(self):
+        capacity = min(self.max_len, 2 * self._capacity)
+        grown = []
+        for k_buf, v_buf in self.self_kv:
+            shape = k_buf.shape[:2] + (capacity,) + k_buf.shape[3:]
+            k_new = k_buf.new_empty(shape)
+            v_new = v_buf.new_empty(shape)
+            k_new[:, :, : self._capacity] = k_buf
+            v_new[:, :, : self._capacity] = v_buf
+            grown.append((k_new, v_new))
+        self.self_kv = grown
+        self._capacity = capacity
+
+
 class TMTransformerDecoder(nn.TransformerDecoder):
     def forward(  # type: ignore
         self,
@@ -73,6 +192,24 @@ class TMTransformerDecoder(nn.TransformerDecoder):
 
         return output, out_cache  # type: ignore
 
+    def step(self, tgt: Tensor, cache: TMDecoderCache) -> Tensor:
+        r"""
+        Incremental decoding of one tag, the same as forward() for the last tag
+        but with the cached key/value projections of the previous tags
+
+        Args:
+            tgt (Tensor): encoded new tag (1,bsz,hidden_dim), at position
+                cache.length of the sequence
+            cache (TMDecoderCache): updated in place
+        Returns:
+            output (Tensor): (1,bsz,hidden_dim)
+        """
+        output = tgt
+        for i, mod in enumerate(self.layers):
+            output = mod.step(output, cache, i)
+        cache.length += 1
+        return output
+
 
 class TMTransformerDecoderLayer(nn.TransformerDecoderLayer):
     def forward(  # type: ignore
@@ -125,6 +262,39 @@ class TMTransformerDecoderLayer(nn.TransformerDecoderLayer):
         tgt_last_tok = self.norm3(tgt_last_tok)
         return tgt_last_tok
 
+    def step(self, tgt: Tensor, cache: TMDecoderCache, layer_idx: int) -> Tensor:
+        r"""
+        Args:
+            see TMTransformerDecoder.step(); tgt is the input of this layer for
+            the new tag
+        Returns:
+            Tensor: (1,bsz,hidden_dim)
+        """
+        dim = self.self_attn.embed_dim
+        n_heads = self.self_attn.num_heads
+        q, k, v = F.linear(
+            tgt, self.self_attn.in_proj_weight, self.self_attn.in_proj_bias
+        ).split(dim, dim=-1)
+        cache.append(layer_idx, _split_heads(k, n_heads), _split_heads(v, n_heads))
+        keys, values = cache.keys_values(layer_idx)
+        tmp_tgt = _attend(self.self_attn, _split_heads(q, n_heads), keys, values)
+        tgt_last_tok = tgt + self.dropout1(tmp_tgt)
+        tgt_last_tok = self.norm1(tgt_last_tok)
+
+        mha = self.multihead_attn
+        q = F.linear(tgt_last_tok, mha.in_proj_weight[:dim], mha.in_proj_bias[:dim])
+        keys, values = cache.memory_kv[layer_idx]
+        tmp_tgt = _attend(mha, _split_heads(q, mha.num_heads), keys, values)
+        tgt_last_tok = tgt_last_tok + self.dropout2(tmp_tgt)
+        tgt_last_tok = self.norm2(tgt_last_tok)
+
+        tmp_tgt = self.linear2(
+            self.dropout(self.activation(self.linear1(tgt_last_tok)))
+        )
+        tgt_last_tok = tgt_last_tok + self.dropout3(tmp_tgt)
+        tgt_last_tok = self.norm3(tgt_last_tok)
+        return tgt_last_tok
+
 
 class Tag_Transformer(nn.Module):
     """
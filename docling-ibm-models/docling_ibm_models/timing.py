@@ -0,0 +1,16 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+import time
+from typing import Dict, Optional
+
+
+def add_timing(timings: Optional[Dict[str, float]], stage: str, since: float) -> float:
+    r"""
+    Add the seconds elapsed since `since` to timings[stage] and return the current time
+    """
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - since
+    return now
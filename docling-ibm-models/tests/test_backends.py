@@ -0,0 +1,85 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+import os
+
+import pytest
+import torch
+from transformers.modeling_outputs import ImageClassifierOutputWithNoAttention
+
+from docling_ibm_models.backends import (
+    OnnxRuntimeModel,
+    default_onnx_file,
+    resolve_backend,
+)
+from docling_ibm_models.onnx_export import export_onnx
+
+
+class _TinyClassifier(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 8, 3, stride=2)
+        self.fc = torch.nn.Linear(8, 4)
+
+    def forward(self, pixel_values):
+        return self.fc(self.conv(pixel_values).mean(dim=(2, 3)))
+
+
+def test_resolve_backend():
+    assert resolve_backend(None, "cpu") == "torch"
+    assert resolve_backend("", "cpu") == "torch"
+    assert resolve_backend("torch", "cuda") == "torch"
+    assert resolve_backend("ONNXRuntime", torch.device("cpu")) == "onnxruntime"
+    assert default_onnx_file("/m/model.safetensors") == "/m/model.onnx"
+    assert default_onnx_file("/m/tf.safetensors", "_encoder") == "/m/tf_encoder.onnx"
+
+    with pytest.raises(ValueError):
+        resolve_backend("tensorrt", "cpu")
+    with pytest.raises(ValueError):
+        resolve_backend("onnxruntime", "cuda")
+
+
+def test_onnxruntime_model(tmp_path):
+    r"""
+    An exported model gives the outputs of the torch model for any batch size,
+    with positional or keyword inputs
+    """
+    pytest.importorskip("onnxruntime")
+
+    torch.manual_seed(0)
+    model = _TinyClassifier().eval()
+    onnx_file = export_onnx(
+        model,
+        (torch.rand(1, 3, 32, 32),),
+        str(tmp_path / "tiny.onnx"),
+        ["pixel_values"],
+        ["logits"],
+    )
+    assert os.listdir(tmp_path) == ["tiny.onnx"], "Temporary export file left"
+
+    ort_model = OnnxRuntimeModel(onnx_file, intra_op_num_threads=1)
+    x = torch.rand(3, 3, 32, 32)
+    with torch.no_grad():
+        expected = model(x)
+    assert torch.allclose(ort_model(x), expected, atol=1e-5)
+    # Unknown keyword inputs are ignored
+    assert torch.allclose(ort_model(pixel_values=x, pixel_mask=x), expected, atol=1e-5)
+
+    wrapped = OnnxRuntimeModel(
+        onnx_file,
+        output_cls=ImageClassifierOutputWithNoAttention,
+        graph_optimization_level="disable",
+    )
+    assert torch.allclose(wrapped(x).logits, expected, atol=1e-5)
+
+    # A forked process creates its own session
+    session = ort_model._get_session()
+    ort_model._session_pid = -1
+    assert ort_model._get_session() is not session
+    assert ort_model._get_session() is ort_model._get_session()
+
+    with pytest.raises(FileNotFoundError):
+        OnnxRuntimeModel(str(tmp_path / "missing.onnx"))
+    with pytest.raises(ValueError):
+        OnnxRuntimeModel(onnx_file, graph_optimization_level="max")
@@ -2,6 +2,8 @@
 # Copyright IBM Corp. 2024 - 2024
 # SPDX-License-Identifier: MIT
 #
+import difflib
+import json
 import os
 import numpy as np
 import pytest
@@ -139,3 +141,43 @@ def test_code_formula_predictor(init: dict):
 
     outputs = code_formula_predictor.predict(images, labels, temperature)
     assert outputs == gts
+
+
+def test_code_formula_predictor_quantized(init: dict, tmp_path):
+    r"""
+    Accuracy-delta report of the int8 CodeFormulaPredictor against fp32 and the
+    ground truth of the test images
+    """
+    fp32 = CodeFormulaPredictor(init["artifact_path"], device="cpu", num_threads=2)
+    int8 = CodeFormulaPredictor(
+        init["artifact_path"],
+        device="cpu",
+        num_threads=2,
+        quantize="int8",
+        quantize_cache_dir=str(tmp_path),
+    )
+    assert fp32.info()["quantize"] is None
+    assert int8.info()["quantize"] == "int8"
+
+    temperature = init["info"]["temperature"]
+    report = []
+    for d in init["test_imgs"]:
+        with Image.open(d["image_path"]) as img, open(d["gt_path"], "r") as gt_fp:
+            gt = gt_fp.read()
+            fp32_output = fp32.predict([img], [d["label"]], temperature)[0]
+            int8_output = int8.predict([img], [d["label"]], temperature)[0]
+        report.append(
+            {
+                "label": d["label"],
+                "fp32_exact": fp32_output == gt,
+                "int8_exact": int8_output == gt,
+                "int8_vs_fp32_similarity": difflib.SequenceMatcher(
+                    None, fp32_output, int8_output
+                ).ratio(),
+            }
+        )
+
+    print("int8 vs fp32 accuracy delta:")
+    print(json.dumps(report, indent=2))
+    for r in report:
+        assert r["int8_vs_fp32_similarity"] >= 0.9
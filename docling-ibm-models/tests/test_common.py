@@ -4,6 +4,9 @@
 #
 import json
 import tempfile
+import time
+
+import pytest
 
 import docling_ibm_models.tableformer.common as c
 
@@ -87,3 +90,14 @@ def test_read_config():
         # Read the tmp file and extract the config
         config = c.read_config(fp.name)
         assert isinstance(config, dict)
+
+
+def test_check_deadline():
+    r"""
+    Testing the check_deadline() function
+    """
+    c.check_deadline(None, "anything")
+    c.check_deadline(time.monotonic() + 60, "anything")
+    with pytest.raises(c.DeadlineExceeded, match="before table 1"):
+        c.check_deadline(time.monotonic() - 1, "table 1")
+    assert issubclass(c.DeadlineExceeded, TimeoutError)
@@ -4,6 +4,7 @@
 #
 import os
 import numpy as np
+import torch
 import pytest
 from PIL import Image
 
@@ -96,3 +97,37 @@ def test_figure_classifier(init: dict):
     outputs = figure_classifier.predict(images)
     outputs = [output[0][0] for output in outputs]
     assert outputs == labels
+
+
+def test_figure_classifier_onnxruntime(tmp_path):
+    r"""
+    The onnxruntime backend gives the predictions of the torch backend.
+    Uses a randomly initialized EfficientNet-b0 exported with the command line.
+    """
+    pytest.importorskip("onnxruntime")
+    from transformers import AutoModelForImageClassification, EfficientNetConfig
+
+    from docling_ibm_models.onnx_export import main as onnx_export_main
+
+    torch.manual_seed(0)
+    config = EfficientNetConfig(image_size=224, num_labels=16)
+    AutoModelForImageClassification.from_config(config).save_pretrained(tmp_path)
+    onnx_export_main(["figure", str(tmp_path)])
+    assert os.path.isfile(tmp_path / "model.onnx")
+
+    torch_classifier = DocumentFigureClassifierPredictor(str(tmp_path))
+    ort_classifier = DocumentFigureClassifierPredictor(
+        str(tmp_path), backend="onnxruntime"
+    )
+    assert ort_classifier.info()["backend"] == "onnxruntime"
+
+    rng = np.random.default_rng(0)
+    images = [
+        rng.integers(0, 255, size=(300, 200, 3), dtype=np.uint8) for _ in range(3)
+    ]
+    for torch_preds, ort_preds in zip(
+        torch_classifier.predict(images), ort_classifier.predict(images)
+    ):
+        assert [c for c, _ in torch_preds] == [c for c, _ in ort_preds]
+        for (_, p), (_, q) in zip(torch_preds, ort_preds):
+            assert abs(p - q) < 1e-4
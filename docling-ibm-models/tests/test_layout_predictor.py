@@ -105,3 +105,117 @@ def test_layoutpredictor(init: dict):
                 assert pred["r"] >= 0 and pred["r"] <= w
                 assert pred["b"] >= 0 and pred["b"] <= h
             assert i + 1 == init["pred_bboxes"]
+
+
+def _box_iou(a: dict, b: dict) -> float:
+    iw = max(0.0, min(a["r"], b["r"]) - max(a["l"], b["l"]))
+    ih = max(0.0, min(a["b"], b["b"]) - max(a["t"], b["t"]))
+    inter = iw * ih
+    union = (
+        (a["r"] - a["l"]) * (a["b"] - a["t"])
+        + (b["r"] - b["l"]) * (b["b"] - b["t"])
+        - inter
+    )
+    return inter / union if union > 0 else 0.0
+
+
+def test_layoutpredictor_quantized(init: dict, tmp_path):
+    r"""
+    Accuracy-delta report of the int8 LayoutPredictor against fp32 on the test
+    images: every fp32 box is matched to the int8 box of the same label with the
+    highest IoU
+    """
+    fp32 = LayoutPredictor(init["artifact_path"], device="cpu", num_threads=2)
+    int8 = LayoutPredictor(
+        init["artifact_path"],
+        device="cpu",
+        num_threads=2,
+        quantize="int8",
+        quantize_cache_dir=str(tmp_path),
+    )
+    assert fp32.info()["quantize"] is None
+    assert int8.info()["quantize"] == "int8"
+    assert len(os.listdir(tmp_path)) == 1, "Quantized model is not cached"
+
+    report = []
+    for img_fn in init["test_imgs"]:
+        with Image.open(img_fn) as img:
+            fp32_preds = list(fp32.predict(img))
+            int8_preds = list(int8.predict(img))
+
+        ious = []
+        score_deltas = []
+        for a in fp32_preds:
+            same_label = [b for b in int8_preds if b["label"] == a["label"]]
+            best = max(same_label, key=lambda b: _box_iou(a, b), default=None)
+            ious.append(_box_iou(a, best) if best is not None else 0.0)
+            if best is not None:
+                score_deltas.append(abs(a["confidence"] - best["confidence"]))
+        report.append(
+            {
+                "image": os.path.basename(img_fn),
+                "fp32_boxes": len(fp32_preds),
+                "int8_boxes": len(int8_preds),
+                "matched": sum(iou >= 0.5 for iou in ious),
+                "mean_iou": float(np.mean(ious)) if ious else 1.0,
+                "max_score_delta": max(score_deltas, default=0.0),
+            }
+        )
+
+    print("int8 vs fp32 accuracy delta:")
+    print(json.dumps(report, indent=2))
+    for r in report:
+        assert r["matched"] >= 0.8 * r["fp32_boxes"]
+        assert r["mean_iou"] >= 0.8
+
+
+def test_layoutpredictor_onnxruntime(init: dict, tmp_path):
+    r"""
+    The onnxruntime backend runs the exported model with the same pre- and
+    post-processing and predicts the same boxes as the torch backend
+    """
+    pytest.importorskip("onnxruntime")
+    from docling_ibm_models.onnx_export import export_layout_model
+
+    onnx_file = export_layout_model(
+        init["artifact_path"], onnx_file=str(tmp_path / "model.onnx")
+    )
+    torch_predictor = LayoutPredictor(
+        init["artifact_path"], device="cpu", num_threads=2
+    )
+    ort_predictor = LayoutPredictor(
+        init["artifact_path"],
+        device="cpu",
+        num_threads=2,
+        backend="onnxruntime",
+        onnx_file=onnx_file,
+        backend_options={"graph_optimization_level": "all"},
+    )
+    assert ort_predictor.info()["backend"] == "onnxruntime"
+    assert ort_predictor.info()["model_name"] == torch_predictor.info()["model_name"]
+
+    for img_fn in init["test_imgs"]:
+        with Image.open(img_fn) as img:
+            torch_preds = list(torch_predictor.predict(img))
+            ort_preds = ort_predictor.predict_batch([img, img])
+
+        for preds in ort_preds:
+            assert len(preds) == len(torch_preds)
+            for a, b in zip(torch_preds, preds):
+                assert a["label"] == b["label"]
+                assert abs(a["confidence"] - b["confidence"]) < 1e-3
+                assert _box_iou(a, b) > 0.99
+
+    with pytest.raises(FileNotFoundError):
+        LayoutPredictor(
+            init["artifact_path"],
+            backend="onnxruntime",
+            onnx_file=str(tmp_path / "missing.onnx"),
+        )
+    with pytest.raises(ValueError):
+        LayoutPredictor(
+            init["artifact_path"],
+            backend="onnxruntime",
+            onnx_file=onnx_file,
+            quantize="int8",
+        )
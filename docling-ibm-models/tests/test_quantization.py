@@ -0,0 +1,81 @@
+#
+# Copyright IBM Corp. 2024 - 2024
+# SPDX-License-Identifier: MIT
+#
+import os
+
+import pytest
+import torch
+
+from docling_ibm_models.quantization import (
+    load_quantized_model,
+    quantized_cache_file,
+    resolve_quantize,
+)
+
+
+def _tiny_model():
+    return torch.nn.Sequential(
+        torch.nn.Linear(16, 32), torch.nn.ReLU(), torch.nn.Linear(32, 4)
+    )
+
+
+def test_resolve_quantize():
+    assert resolve_quantize(None, "cpu") is None
+    assert resolve_quantize("", "cpu") is None
+    assert resolve_quantize("none", "cpu") is None
+    assert resolve_quantize("INT8", "cpu") == "int8"
+    assert resolve_quantize("int8", torch.device("cpu")) == "int8"
+
+    with pytest.raises(ValueError):
+        resolve_quantize("int4", "cpu")
+    with pytest.raises(ValueError):
+        resolve_quantize("int8", "cuda")
+
+
+def test_load_quantized_model(tmp_path):
+    r"""
+    The quantized model is cached on disk; a cached model skips loading the fp32
+    weights and gives the same outputs
+    """
+    weights_fn = str(tmp_path / "model.safetensors")
+    with open(weights_fn, "wb") as fp:
+        fp.write(b"weights")
+    cache_dir = str(tmp_path / "cache")
+
+    fp32_loads = []
+
+    def load_fp32():
+        fp32_loads.append(1)
+        torch.manual_seed(0)
+        return _tiny_model()
+
+    int8 = load_quantized_model(load_fp32, _tiny_model, weights_fn, "int8", cache_dir)
+    assert isinstance(int8[0], torch.ao.nn.quantized.dynamic.Linear)
+    cache_fn = quantized_cache_file(weights_fn, cache_dir, "int8")
+    assert os.path.isfile(cache_fn)
+
+    cached = load_quantized_model(load_fp32, _tiny_model, weights_fn, "int8", cache_dir)
+    assert len(fp32_loads) == 1, "Cached model loaded the fp32 weights"
+
+    x = torch.rand(8, 16)
+    with torch.no_grad():
+        assert torch.equal(int8(x), cached(x))
+        fp32_out = load_fp32()(x)
+        rel_err = ((int8(x) - fp32_out).norm() / fp32_out.norm()).item()
+    assert rel_err < 0.05
+
+    # A corrupted cache falls back to quantizing the fp32 model
+    with open(cache_fn, "wb") as fp:
+        fp.write(b"corrupted")
+    recovered = load_quantized_model(
+        load_fp32, _tiny_model, weights_fn, "int8", cache_dir
+    )
+    assert len(fp32_loads) == 3
+    with torch.no_grad():
+        assert torch.equal(int8(x), recovered(x))
+
+    # Other weights, other cache file
+    with open(weights_fn, "wb") as fp:
+        fp.write(b"new weights")
+    assert quantized_cache_file(weights_fn, cache_dir, "int8") != cache_fn
@@ -2,17 +2,31 @@
 # Copyright IBM Corp. 2024 - 2024
 # SPDX-License-Identifier: MIT
 #
+import copy
 import glob
+import itertools
 import json
 import os
+import time
 from pathlib import Path
 
+import numpy as np
 import torch
 import pytest
 import cv2
 from PIL import Image, ImageDraw
 from huggingface_hub import snapshot_download
 
+from safetensors.torch import save_model
+
+from docling_ibm_models.backends import OnnxRuntimeModel
+from docling_ibm_models.onnx_export import export_tableformer_encoder
+from docling_ibm_models.tableformer.common import DeadlineExceeded
+import docling_ibm_models.tableformer.models.table04_rs.tablemodel04_rs as tablemodel04_rs
+from docling_ibm_models.tableformer.models.table04_rs.tablemodel04_rs import \
+    TableModel04_rs
+from docling_ibm_models.tableformer.models.table04_rs.transformer_rs import \
+    TMDecoderCache
 from docling_ibm_models.tableformer.utils.app_profiler import AggProfiler
 import docling_ibm_models.tableformer.data_management.tf_predictor as tf_predictor
 from docling_ibm_models.tableformer.data_management.tf_predictor import \
@@ -426,6 +440,477 @@ def init() -> list[dict]:
         config["model"]["save_dir"] = save_dir
     return configs
 
+@pytest.fixture(scope="module")
+def random_weights_config(tmp_path_factory) -> dict:
+    r"""
+    test_config with randomly initialized weights, for tests that exercise the
+    inference code paths rather than the prediction quality
+    """
+    save_dir = tmp_path_factory.mktemp("tableformer_random")
+    config = copy.deepcopy(test_config)
+    config["model"]["save_dir"] = str(save_dir)
+    config["predict"]["profiling"] = False
+
+    torch.manual_seed(0)
+    model = TableModel04_rs(config, {"word_map": config["dataset_wordmap"]}, "cpu")
+    save_model(model, str(save_dir / "tableformer_random.safetensors"))
+    return config
+
+
+def _blank_page(width=800, height=1000) -> dict:
+    return {
+        "width": width,
+        "height": height,
+        "image": np.full((height, width, 3), 255, dtype=np.uint8),
+        "tokens": [],
+    }
+
+
+def test_tf_predictor_deadline(random_weights_config):
+    r"""
+    multi_table_predict stops at its deadline: before the first table if it
+    has already passed, and between decode steps while a table is decoded
+    """
+    predictor = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+
+    with pytest.raises(DeadlineExceeded, match="table 0"):
+        predictor.multi_table_predict(
+            _blank_page(), [[0, 0, 400, 300]], deadline=time.monotonic() - 1
+        )
+
+    # Random weights never emit <end>, so decoding would run for max_steps
+    t0 = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="decode step"):
+        predictor.multi_table_predict(
+            _blank_page(), [[0, 0, 400, 300]], deadline=t0 + 1.0
+        )
+    assert time.monotonic() - t0 < 10, "Decoding did not stop at the deadline"
+
+
+def test_tf_predictor_batched_encoder(random_weights_config, monkeypatch):
+    r"""
+    multi_table_predict encodes all the tables of a page in one batch and gives
+    the same output as predicting every table on its own
+    """
+    config = copy.deepcopy(random_weights_config)
+    # Random weights never emit <end>, keep decoding short
+    config["predict"]["max_steps"] = 30
+    # Lockstep decoding is only equal up to float rounding, see below
+    config["predict"]["batch_decode"] = False
+    predictor = TFPredictor(config, device="cpu", num_threads=2)
+
+    rng = np.random.default_rng(0)
+    page = _blank_page()
+    page["image"] = rng.integers(0, 255, size=page["image"].shape, dtype=np.uint8)
+    table_bboxes = [[20, 30, 420, 330], [100, 400, 700, 650], [50, 700, 300, 980]]
+
+    model = predictor.get_model()
+    encode = model.encode
+    encodes = []
+
+    def counting_encode(imgs):
+        encodes.append(imgs.size(0))
+        return encode(imgs)
+
+    monkeypatch.setattr(model, "encode", counting_encode)
+
+    for do_matching in (True, False):
+        bboxes = copy.deepcopy(table_bboxes)
+        encodes.clear()
+        batched = predictor.multi_table_predict(page, bboxes, do_matching=do_matching)
+        assert encodes == [3], "Tables are not encoded in one batch"
+        assert bboxes == table_bboxes, "Table bboxes are not restored"
+
+        single = []
+        for table_bbox in table_bboxes:
+            single += predictor.multi_table_predict(
+                page, [list(table_bbox)], do_matching=do_matching
+            )
+        assert encodes == [3, 1, 1, 1]
+        assert len(batched) == 3
+        assert batched == single
+
+    assert predictor.multi_table_predict(page, []) == []
+
+
+def test_tf_predictor_batched_decode(random_weights_config, monkeypatch):
+    r"""
+    The tag sequences of the tables of a page are decoded in lockstep, with the
+    same tags and the same bboxes up to float rounding as decoding every table
+    on its own
+    """
+    config = copy.deepcopy(random_weights_config)
+    config["predict"]["max_steps"] = 30
+    predictor = TFPredictor(config, device="cpu", num_threads=2)
+    model = predictor.get_model()
+
+    rng = np.random.default_rng(0)
+    imgs = torch.rand(3, 3, 448, 448, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        batched = model.predict_batch(imgs, 30, 1)
+        single = [model.predict(imgs[i : i + 1], 30, 1) for i in range(3)]
+    assert len(batched) == 3
+    for (seq, cls, coord), (seq1, cls1, coord1) in zip(batched, single):
+        assert seq == seq1
+        assert torch.allclose(cls, cls1, atol=1e-4)
+        assert torch.allclose(coord, coord1, atol=1e-4)
+
+    # Tables that end early leave the batch, the others keep decoding
+    lengths = itertools.cycle([5, 12, 8])
+    end_tag = config["dataset_wordmap"]["word_map_tag"]["<end>"]
+
+    class EndingState(tablemodel04_rs._TagDecodeState):
+        def __init__(self, word_map):
+            super().__init__(word_map)
+            self._length = next(lengths)
+
+        def step(self, new_tag, tag_H):
+            if len(self.output_tags) == self._length - 1:
+                new_tag = end_tag
+            return super().step(new_tag, tag_H)
+
+    monkeypatch.setattr(tablemodel04_rs, "_TagDecodeState", EndingState)
+    with torch.no_grad():
+        batched = model.predict_batch(imgs, 30, 1)
+        single = [model.predict(imgs[i : i + 1], 30, 1) for i in range(3)]
+    assert [len(seq) for seq, _, _ in batched] == [6, 13, 9]
+    for (seq, cls, coord), (seq1, cls1, coord1) in zip(batched, single):
+        assert seq == seq1
+        assert seq[-1] == end_tag
+        assert torch.allclose(coord, coord1, atol=1e-4)
+    monkeypatch.undo()
+
+    page = _blank_page()
+    page["image"] = rng.integers(0, 255, size=page["image"].shape, dtype=np.uint8)
+    table_bboxes = [[20, 30, 420, 330], [100, 400, 700, 650], [50, 700, 300, 980]]
+    batched = predictor.multi_table_predict(page, copy.deepcopy(table_bboxes))
+    config["predict"]["batch_decode"] = False
+    per_table = TFPredictor(config, device="cpu", num_threads=2)
+    single = per_table.multi_table_predict(page, copy.deepcopy(table_bboxes))
+    assert len(batched) == len(single) == 3
+    for out, out1 in zip(batched, single):
+        details, details1 = out["predict_details"], out1["predict_details"]
+        assert details["prediction"]["rs_seq"] == details1["prediction"]["rs_seq"]
+        np.testing.assert_allclose(
+            details["prediction"]["bboxes"], details1["prediction"]["bboxes"], atol=1e-2
+        )
+
+
+def test_tf_decoder_kv_cache(random_weights_config):
+    r"""
+    Incremental decoding with the key/value cache gives the same decoder outputs
+    as running the decoder over the whole prefix at every step
+    """
+    predictor = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+    model = predictor.get_model()
+    transformer = model._tag_transformer
+    decoder = transformer._decoder
+
+    gen = torch.Generator().manual_seed(0)
+    imgs = torch.rand(3, 3, 448, 448, generator=gen)
+    # Longer than the initial capacity of the cache, so that it grows
+    tags = torch.randint(0, 10, (150, 3), generator=gen)
+    with torch.no_grad():
+        _, memory = model.encode(imgs)
+        cache = TMDecoderCache(decoder, memory, len(tags))
+        prefix_cache = None
+        for t in range(len(tags)):
+            embedding = transformer._embedding(tags[: t + 1])
+            prefix, prefix_cache = decoder(
+                transformer._positional_encoding(embedding), memory, prefix_cache
+            )
+            step = decoder.step(
+                transformer._positional_encoding(embedding[-1:], offset=t), cache
+            )
+            assert torch.allclose(step[-1], prefix[-1], atol=1e-4), "step {}".format(t)
+        assert cache.length == len(tags)
+        with pytest.raises(IndexError):
+            decoder.step(embedding[-1:], cache)
+
+        # Dropping a sequence from the batch keeps the cache of the others
+        cache = TMDecoderCache(decoder, memory, 10)
+        for t in range(4):
+            embedding = transformer._positional_encoding(
+                transformer._embedding(tags[t : t + 1]), offset=t
+            )
+            step = decoder.step(embedding, cache)
+        cache.select(torch.tensor([0, 2]))
+        embedding = transformer._positional_encoding(
+            transformer._embedding(tags[4:5]), offset=4
+        )
+        step = decoder.step(embedding[:, [0, 2]], cache)
+        prefix_cache = None
+        for t in range(5):
+            prefix, prefix_cache = decoder(
+                transformer._positional_encoding(transformer._embedding(tags[: t + 1])),
+                memory,
+                prefix_cache,
+            )
+        assert torch.allclose(step[-1], prefix[-1, [0, 2]], atol=1e-4)
+
+    # The encoder attention mask is built once and not copied for the batch
+    mask = model._encoder_mask(3, 784)
+    assert mask.shape == (3 * transformer._n_heads, 784, 784)
+    assert not mask.any()
+    assert model._encoder_mask(5, 784).data_ptr() == mask.data_ptr()
+
+
+def test_tf_bbox_decoder_mini_batches(random_weights_config):
+    r"""
+    The bbox decoder decodes the cells in mini batches, with the same outputs as
+    decoding every cell on its own
+    """
+    predictor = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+    bbox_decoder = predictor.get_model()._bbox_decoder
+
+    gen = torch.Generator().manual_seed(0)
+    enc_out = torch.rand(1, 28, 28, 256, generator=gen)
+    # Not a multiple of the mini batch size
+    tag_H = [torch.rand(1, 512, generator=gen) for _ in range(70)]
+    with torch.no_grad():
+        classes, bboxes = bbox_decoder.inference(enc_out, tag_H)
+        cells = [bbox_decoder.inference(enc_out, [cell_H]) for cell_H in tag_H]
+        empty_classes, empty_bboxes = bbox_decoder.inference(enc_out, [])
+    assert classes.shape == (70, 3)
+    assert bboxes.shape == (70, 4)
+    assert torch.allclose(classes, torch.cat([c for c, _ in cells]), atol=1e-5)
+    assert torch.allclose(bboxes, torch.cat([b for _, b in cells]), atol=1e-5)
+    assert len(empty_classes) == 0 and len(empty_bboxes) == 0
+
+
+def test_tf_merge_span_bboxes(random_weights_config):
+    r"""
+    The first bbox of every horizontal span is merged with its last one, which
+    is removed; a span that is not closed is merged with the last bbox
+    """
+    predictor = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+    model = predictor.get_model()
+
+    gen = torch.Generator().manual_seed(0)
+    outputs_class = torch.rand(7, 3, generator=gen)
+    outputs_coord = torch.rand(7, 4, generator=gen)
+    classes, coords = model._merge_span_bboxes(
+        outputs_class, outputs_coord, {1: 3, 4: -1}
+    )
+    assert torch.equal(classes, outputs_class[[0, 1, 2, 4, 5, 6]])
+    assert torch.equal(coords[[0, 2, 4, 5]], outputs_coord[[0, 2, 5, 6]])
+    assert torch.equal(
+        coords[1], model.mergebboxes(outputs_coord[1], outputs_coord[3])
+    )
+    assert torch.equal(
+        coords[3], model.mergebboxes(outputs_coord[4], outputs_coord[6])
+    )
+    # cxcywh of the box from the left of the first to the right of the last cell
+    merged = model.mergebboxes(
+        torch.tensor([1.0, 1.0, 2.0, 2.0]), torch.tensor([5.0, 1.5, 2.0, 1.0])
+    )
+    assert merged.tolist() == [3.0, 1.0, 6.0, 2.0]
+
+    classes, coords = model._merge_span_bboxes(outputs_class, outputs_coord, {})
+    assert torch.equal(coords, outputs_coord)
+    classes, coords = model._merge_span_bboxes(
+        torch.empty(0, 3), torch.empty(0, 4), {}
+    )
+    assert len(classes) == 0 and len(coords) == 0
+
+
+def _bbox_iou(a, b):
+    r"""
+    IoU of two [x1, y1, x2, y2] boxes
+    """
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _tag_encoder_output(model, img):
+    r"""
+    Output of the tag transformer encoder for an image, as computed by predict()
+    """
+    with torch.no_grad():
+        enc_out = model._encoder(img)
+        filtered = model._tag_transformer._input_filter(
+            enc_out.permute(0, 3, 1, 2)
+        ).permute(0, 2, 3, 1)
+        enc_inputs = filtered.reshape(img.size(0), -1, filtered.size(-1))
+        return model._tag_transformer._encoder(enc_inputs.permute(1, 0, 2))
+
+
+def test_tf_predictor_quantized(random_weights_config, tmp_path):
+    r"""
+    int8 mode quantizes the Linear layers, caches the quantized model on disk and
+    stays close to the fp32 model
+    """
+    cache_dir = str(tmp_path / "quantized")
+    fp32 = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+    int8 = TFPredictor(
+        random_weights_config,
+        device="cpu",
+        num_threads=2,
+        quantize="int8",
+        quantize_cache_dir=cache_dir,
+    )
+    assert fp32.get_quantize() is None
+    assert int8.get_quantize() == "int8"
+
+    dynamic_linear = torch.ao.nn.quantized.dynamic.Linear
+    model = int8.get_model()
+    assert isinstance(model._tag_transformer._fc, dynamic_linear)
+    assert isinstance(model._bbox_decoder._class_embed, dynamic_linear)
+    assert len(os.listdir(cache_dir)) == 1, "Quantized model is not cached"
+
+    # Loaded from the cache: same weights, same outputs
+    cached = TFPredictor(
+        random_weights_config,
+        device="cpu",
+        num_threads=2,
+        quantize="int8",
+        quantize_cache_dir=cache_dir,
+    )
+    torch.manual_seed(0)
+    img = torch.rand(1, 3, 448, 448)
+    int8_out = _tag_encoder_output(model, img)
+    assert torch.equal(int8_out, _tag_encoder_output(cached.get_model(), img))
+
+    # Accuracy delta against fp32
+    fp32_out = _tag_encoder_output(fp32.get_model(), img)
+    rel_err = ((int8_out - fp32_out).norm() / fp32_out.norm()).item()
+    print("int8 vs fp32 tag encoder relative error: {:.4f}".format(rel_err))
+    assert rel_err < 0.1
+
+    with pytest.raises(ValueError):
+        TFPredictor(random_weights_config, device="cpu", quantize="int4")
+    with pytest.raises(ValueError):
+        TFPredictor(random_weights_config, device="cuda", quantize="int8")
+
+
+def test_tf_predictor_onnxruntime(random_weights_config, tmp_path):
+    r"""
+    The onnxruntime backend runs the exported image encoder in place of the torch
+    one; the encoder output and everything computed from it stay the same
+    """
+    pytest.importorskip("onnxruntime")
+
+    with pytest.raises(FileNotFoundError):
+        TFPredictor(
+            random_weights_config,
+            backend="onnxruntime",
+            onnx_file=str(tmp_path / "missing.onnx"),
+        )
+
+    torch_predictor = TFPredictor(random_weights_config, device="cpu", num_threads=2)
+    onnx_file = export_tableformer_encoder(
+        random_weights_config, onnx_file=str(tmp_path / "encoder.onnx")
+    )
+    ort_predictor = TFPredictor(
+        random_weights_config,
+        device="cpu",
+        num_threads=2,
+        backend="onnxruntime",
+        onnx_file=onnx_file,
+        backend_options={"intra_op_num_threads": 2, "allow_spinning": False},
+    )
+    assert torch_predictor.get_backend() == "torch"
+    assert ort_predictor.get_backend() == "onnxruntime"
+    assert isinstance(ort_predictor.get_model()._encoder, OnnxRuntimeModel)
+
+    # Dynamic batch dimension
+    torch.manual_seed(0)
+    img = torch.rand(2, 3, 448, 448)
+    torch_model = torch_predictor.get_model()
+    ort_model = ort_predictor.get_model()
+    with torch.no_grad():
+        assert torch.allclose(
+            ort_model._encoder(img), torch_model._encoder(img), atol=1e-4
+        )
+    assert torch.allclose(
+        _tag_encoder_output(ort_model, img),
+        _tag_encoder_output(torch_model, img),
+        atol=1e-3,
+    )
+
+    with pytest.raises(ValueError):
+        TFPredictor(random_weights_config, backend="tensorrt")
+    with pytest.raises(ValueError):
+        TFPredictor(random_weights_config, device="cuda", backend="onnxruntime")
+
+
+def test_tf_predictor_quantized_accuracy(init, tmp_path):
+    r"""
+    Accuracy-delta report of the int8 model against fp32 on the test fixtures:
+    table shapes, cell counts and the IoU of the predicted cell bboxes
+    """
+    fp32 = TFPredictor(init[0], device="cpu", num_threads=2)
+    int8 = TFPredictor(
+        init[0],
+        device="cpu",
+        num_threads=2,
+        quantize="int8",
+        quantize_cache_dir=str(tmp_path),
+    )
+
+    report = []
+    for table_json_fn, png_image_fn, table_bboxes in zip(
+        docling_api_data["table_jsons"],
+        docling_api_data["png_images"],
+        docling_api_data["table_bboxes"],
+    ):
+        with open(table_json_fn, "r") as fp:
+            iocr_page = json.load(fp)["pages"][0]
+        iocr_page["image"] = cv2.imread(png_image_fn)
+
+        outputs = []
+        for predictor in (fp32, int8):
+            t0 = time.perf_counter()
+            tables = predictor.multi_table_predict(
+                iocr_page,
+                copy.deepcopy(table_bboxes),
+                do_matching=True,
+                correct_overlapping_cells=False,
+                sort_row_col_indexes=True,
+            )
+            outputs.append((tables, time.perf_counter() - t0))
+
+        (fp32_tables, fp32_sec), (int8_tables, int8_sec) = outputs
+        for t, (fp32_table, int8_table) in enumerate(zip(fp32_tables, int8_tables)):
+            fp32_details = fp32_table["predict_details"]
+            int8_details = int8_table["predict_details"]
+            fp32_bboxes = fp32_details["prediction_bboxes_page"]
+            int8_bboxes = int8_details["prediction_bboxes_page"]
+            # Best match in the int8 prediction for every fp32 cell
+            ious = [
+                max((_bbox_iou(a, b) for b in int8_bboxes), default=0.0)
+                for a in fp32_bboxes
+            ]
+            report.append(
+                {
+                    "page": os.path.basename(png_image_fn),
+                    "table": t,
+                    "same_shape": (
+                        fp32_details.get("num_rows") == int8_details.get("num_rows")
+                        and fp32_details.get("num_cols")
+                        == int8_details.get("num_cols")
+                    ),
+                    "fp32_cells": len(fp32_bboxes),
+                    "int8_cells": len(int8_bboxes),
+                    "mean_iou": float(np.mean(ious)) if ious else 1.0,
+                    "fp32_sec": round(fp32_sec, 3),
+                    "int8_sec": round(int8_sec, 3),
+                }
+            )
+
+    print("int8 vs fp32 accuracy delta:")
+    print(json.dumps(report, indent=2))
+    assert report, "No tables predicted"
+    same_shape = sum(r["same_shape"] for r in report) / len(report)
+    mean_iou = float(np.mean([r["mean_iou"] for r in report]))
+    print("same_shape={:.2f} mean_iou={:.3f}".format(same_shape, mean_iou))
+    assert same_shape >= 0.5
+    assert mean_iou >= 0.8
+
+
 def test_tf_predictor(init):
     r"""
     Test the TFPredictor
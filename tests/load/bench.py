@@ -0,0 +1,657 @@
+"""
+Load test and capacity benchmark for the layout and table services.
+
+Drives POST /predict with a corpus of sample pages (and table bbox sets) at a
+fixed concurrency (closed loop: N clients, each sends its next request when
+the previous one returns) or a fixed rate (open loop: requests are sent on
+schedule whether or not earlier ones returned; latency is measured from the
+scheduled send time, so a server that falls behind is not hidden by the
+client waiting for it). Every load point reports p50/p90/p99 latency,
+throughput and error rate.
+
+With --threads the tool starts a local uvicorn instance of the service per
+value of LAYOUT_NUM_THREADS / TABLE_NUM_THREADS, waits for /readyz and runs
+every load point against it; without it, it benchmarks the instance at --url.
+The report is JSON (--output) and two reports can be compared with the
+compare subcommand.
+
+Corpus (--corpus): a directory of PNG/JPEG/WebP pages. For the table service
+every page needs a sidecar <page>.json with {"table_bboxes": [[x1,y1,x2,y2], ...]}.
+Without a corpus, synthetic pages are generated (needs Pillow).
+
+Results are not served from the result cache: every request carries
+X-Cache-Bypass: 1 unless --use-cache is given.
+
+Examples:
+  python tests/load/bench.py run --service layout --threads 1,2,4 \\
+      --concurrency 1,4,8 --duration 30 --output layout.json
+  python tests/load/bench.py run --service table --url http://127.0.0.1:8001 \\
+      --rate 2,4 --duration 60 --output table.json
+  python tests/load/bench.py compare baseline.json layout.json
+"""
+
+import argparse
+import http.client
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+REPORT_VERSION = 1
+IMAGE_SUFFIXES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+SERVICES = {
+    "layout": {"port": 8000, "threads_env": "LAYOUT_NUM_THREADS"},
+    "table": {"port": 8001, "threads_env": "TABLE_NUM_THREADS"},
+}
+
+
+@dataclass
+class Payload:
+    name: str
+    body: bytes
+    content_type: str
+
+
+@dataclass
+class Sample:
+    latency_sec: float
+    status: int  # 0 if the request failed without an HTTP response
+
+
+@dataclass
+class LoadPoint:
+    mode: str  # "concurrency" or "rate"
+    value: float
+    samples: list[Sample] = field(default_factory=list)
+    elapsed_sec: float = 0.0
+
+
+# --- corpus ---
+
+
+def _multipart(
+    fields: list[tuple[str, str | None, bytes, str | None]],
+) -> tuple[bytes, str]:
+    """Encode (name, filename, data, content type) form fields as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, filename, data, content_type in fields:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        head = f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type is not None:
+            head += f"Content-Type: {content_type}\r\n"
+        parts.append(head.encode() + b"\r\n" + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _payload(
+    service: str, name: str, image: bytes, content_type: str, table_bboxes=None
+) -> Payload:
+    fields = [("file", name, image, content_type)]
+    if service == "table":
+        fields.append(("table_bboxes", None, json.dumps(table_bboxes).encode(), None))
+    body, multipart_type = _multipart(fields)
+    return Payload(name, body, multipart_type)
+
+
+def load_corpus(service: str, corpus_dir: Path) -> list[Payload]:
+    payloads = []
+    for path in sorted(corpus_dir.iterdir()):
+        content_type = IMAGE_SUFFIXES.get(path.suffix.lower())
+        if content_type is None:
+            continue
+        table_bboxes = None
+        if service == "table":
+            sidecar = path.with_suffix(".json")
+            if not sidecar.exists():
+                raise SystemExit(f"{path.name}: table corpus pages need {sidecar.name}")
+            table_bboxes = json.loads(sidecar.read_text())["table_bboxes"]
+        payloads.append(
+            _payload(service, path.name, path.read_bytes(), content_type, table_bboxes)
+        )
+    if not payloads:
+        raise SystemExit(f"No PNG/JPEG/WebP pages in {corpus_dir}")
+    return payloads
+
+
+def synthetic_corpus(service: str, num_pages: int = 4) -> list[Payload]:
+    """Letter-size pages at 150 dpi with text lines and one ruled table."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        raise SystemExit("Pillow is needed to generate a corpus; pass --corpus instead")
+
+    payloads = []
+    for i in range(num_pages):
+        width, height = 1275, 1650
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        y = 100
+        for line in range(12 + 4 * i):
+            draw.rectangle([100, y, 100 + 700 + 37 * (line % 10), y + 14], fill="black")
+            y += 28
+        rows, cols = 4 + i, 3 + i % 3
+        x1, y1 = 100, y + 60
+        x2, y2 = width - 100, y1 + 40 * rows
+        for r in range(rows + 1):
+            draw.line([x1, y1 + 40 * r, x2, y1 + 40 * r], fill="black", width=2)
+        for c in range(cols + 1):
+            x = x1 + (x2 - x1) * c // cols
+            draw.line([x, y1, x, y2], fill="black", width=2)
+        buf = io.BytesIO()
+        image.save(buf, "PNG")
+        payloads.append(
+            _payload(
+                service,
+                f"synthetic-{i}.png",
+                buf.getvalue(),
+                "image/png",
+                [[x1, y1, x2, y2]],
+            )
+        )
+    return payloads
+
+
+# --- HTTP client ---
+
+
+class _Connection:
+    """A keep-alive connection; each client thread owns one."""
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urllib.parse.urlsplit(url)
+        self._host = parsed.hostname
+        self._port = parsed.port or 80
+        self._timeout = timeout
+        self._conn: http.client.HTTPConnection | None = None
+
+    def request(
+        self, method: str, path: str, body: bytes | None = None, headers=None
+    ) -> int:
+        for attempt in range(2):
+            reused = self._conn is not None
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(
+                    self._host, self._port, timeout=self._timeout
+                )
+            try:
+                self._conn.request(method, path, body, headers or {})
+                response = self._conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                self.close()
+                # The server may have closed an idle keep-alive connection
+                if not reused or attempt == 1:
+                    raise
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _send(conn: _Connection, payload: Payload, headers: dict) -> int:
+    try:
+        return conn.request(
+            "POST",
+            "/predict",
+            payload.body,
+            {**headers, "Content-Type": payload.content_type},
+        )
+    except (http.client.HTTPException, OSError):
+        return 0
+
+
+# --- load generation ---
+
+
+def run_concurrency(
+    url, payloads, headers, concurrency, duration, warmup, timeout
+) -> LoadPoint:
+    point = LoadPoint("concurrency", concurrency)
+    next_payload = itertools.cycle(payloads).__next__
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        conn = _Connection(url, timeout)
+        while True:
+            sent_at = time.perf_counter()
+            if sent_at >= stop_at:
+                break
+            with lock:
+                payload = next_payload()
+            status = _send(conn, payload, headers)
+            # Requests still in flight at the end are counted, the window only
+            # decides which ones are measured
+            if sent_at >= measure_from:
+                with lock:
+                    point.samples.append(Sample(time.perf_counter() - sent_at, status))
+        conn.close()
+
+    threads = [
+        threading.Thread(target=client, daemon=True) for _ in range(int(concurrency))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    point.elapsed_sec = time.perf_counter() - measure_from
+    return point
+
+
+def run_rate(
+    url, payloads, headers, rate, duration, warmup, timeout, max_inflight
+) -> LoadPoint:
+    point = LoadPoint("rate", rate)
+    lock = threading.Lock()
+    local = threading.local()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    total = int(rate * (warmup + duration))
+
+    def send(scheduled_at: float, payload: Payload):
+        if not hasattr(local, "conn"):
+            local.conn = _Connection(url, timeout)
+        status = _send(local.conn, payload, headers)
+        if scheduled_at >= measure_from:
+            with lock:
+                point.samples.append(Sample(time.perf_counter() - scheduled_at, status))
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for i, payload in zip(range(total), itertools.cycle(payloads)):
+            scheduled_at = start + i / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled_at, payload)
+    point.elapsed_sec = time.perf_counter() - measure_from
+    return point
+
+
+# --- statistics ---
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Linear interpolation between closest ranks, q in [0, 100]."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    value = sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (
+        rank - low
+    )
+    return round(value, 2)
+
+
+def summarize(point: LoadPoint) -> dict:
+    ok = sorted(s.latency_sec * 1000 for s in point.samples if 200 <= s.status < 300)
+    statuses: dict[str, int] = {}
+    for s in point.samples:
+        key = str(s.status) if s.status else "connection_error"
+        statuses[key] = statuses.get(key, 0) + 1
+    requests = len(point.samples)
+    errors = requests - len(ok)
+    return {
+        "mode": point.mode,
+        point.mode: point.value,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "throughput_rps": (
+            round(len(ok) / point.elapsed_sec, 3) if point.elapsed_sec > 0 else 0.0
+        ),
+        # Latency of successful requests only; None if there were none
+        "latency_ms": {
+            "p50": percentile(ok, 50),
+            "p90": percentile(ok, 90),
+            "p99": percentile(ok, 99),
+            "mean": round(sum(ok) / len(ok), 2) if ok else None,
+            "max": round(ok[-1], 2) if ok else None,
+        },
+        "status_codes": statuses,
+    }
+
+
+# --- local server ---
+
+
+class LocalServer:
+    """A uvicorn instance of one of the services, started from its app directory."""
+
+    def __init__(self, service: str, port: int, env: dict[str, str], log_dir: Path):
+        self.url = f"http://127.0.0.1:{port}"
+        self._service = service
+        self._port = port
+        self._env = env
+        self._log_path = log_dir / f"{service}-{port}-{int(time.time())}.log"
+        self._process: subprocess.Popen | None = None
+
+    def start(self, ready_timeout: float) -> None:
+        log = open(self._log_path, "wb")
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "src.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self._port),
+            ],
+            cwd=REPO_ROOT / "apps" / self._service,
+            env={**os.environ, **self._env},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        log.close()
+
+        conn = _Connection(self.url, timeout=5)
+        deadline = time.monotonic() + ready_timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise SystemExit(
+                    f"{self._service} exited during startup, see {self._log_path}"
+                )
+            try:
+                if conn.request("GET", "/readyz") == 200:
+                    conn.close()
+                    return
+                # /livez fails once model startup has failed, /readyz only says "not yet"
+                if conn.request("GET", "/livez") != 200:
+                    self.stop()
+                    raise SystemExit(
+                        f"{self._service} model startup failed, see {self._log_path}"
+                    )
+            except (http.client.HTTPException, OSError):
+                pass
+            time.sleep(1)
+        self.stop()
+        raise SystemExit(
+            f"{self._service} not ready after {ready_timeout}s, see {self._log_path}"
+        )
+
+    def stop(self) -> None:
+        if self._process is None or self._process.poll() is not None:
+            return
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+# --- commands ---
+
+
+def _parse_list(value: str, cast):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def _parse_env(items: list[str]) -> dict[str, str]:
+    env = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects KEY=VALUE, got {item!r}")
+        env[key] = value
+    return env
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_result(threads, result: dict) -> None:
+    latency = {
+        k: "-" if v is None else f"{v:.1f}" for k, v in result["latency_ms"].items()
+    }
+    print(
+        f"threads={threads if threads is not None else '-':>3} {result['mode']}={result[result['mode']]:<6g} "
+        f"requests={result['requests']:<6d} rps={result['throughput_rps']:<8.2f} "
+        f"p50={latency['p50']:<9} p90={latency['p90']:<9} p99={latency['p99']:<9} "
+        f"errors={result['error_rate']:.2%}",
+        flush=True,
+    )
+
+
+def _require_ready(url: str) -> None:
+    conn = _Connection(url, timeout=10)
+    try:
+        status = conn.request("GET", "/readyz")
+    except (http.client.HTTPException, OSError) as e:
+        raise SystemExit(f"Cannot reach {url}: {e}")
+    finally:
+        conn.close()
+    if status != 200:
+        raise SystemExit(f"{url}/readyz returned {status}, the service is not ready")
+
+
+def _run_points(args, url, payloads, headers) -> list[dict]:
+    results = []
+    points = [("concurrency", c) for c in args.concurrency] + [
+        ("rate", r) for r in args.rate
+    ]
+    for mode, value in points:
+        if mode == "concurrency":
+            point = run_concurrency(
+                url, payloads, headers, value, args.duration, args.warmup, args.timeout
+            )
+        else:
+            point = run_rate(
+                url,
+                payloads,
+                headers,
+                value,
+                args.duration,
+                args.warmup,
+                args.timeout,
+                args.max_inflight,
+            )
+        results.append(summarize(point))
+    return results
+
+
+def cmd_run(args) -> None:
+    service = SERVICES[args.service]
+    args.concurrency = _parse_list(args.concurrency, int) if args.concurrency else []
+    args.rate = _parse_list(args.rate, float) if args.rate else []
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1]
+    threads_sweep = _parse_list(args.threads, int) if args.threads else [None]
+    extra_env = _parse_env(args.env)
+
+    payloads = (
+        load_corpus(args.service, Path(args.corpus))
+        if args.corpus
+        else synthetic_corpus(args.service)
+    )
+    headers = {"X-Tenant-ID": args.tenant}
+    if not args.use_cache:
+        headers["X-Cache-Bypass"] = "1"
+
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "service": args.service,
+        "config": {
+            "duration_sec": args.duration,
+            "warmup_sec": args.warmup,
+            "corpus": args.corpus or "synthetic",
+            "corpus_pages": len(payloads),
+            "use_cache": args.use_cache,
+            "env": extra_env,
+        },
+        "results": [],
+    }
+
+    log_dir = Path(tempfile.gettempdir())
+    for threads in threads_sweep:
+        if threads is None:
+            url = args.url or f"http://127.0.0.1:{service['port']}"
+            _require_ready(url)
+            for result in _run_points(args, url, payloads, headers):
+                _print_result(threads, result)
+                report["results"].append({"threads": None, **result})
+            continue
+
+        env = {**extra_env, service["threads_env"]: str(threads)}
+        server = LocalServer(args.service, args.port or service["port"], env, log_dir)
+        server.start(args.ready_timeout)
+        try:
+            for result in _run_points(args, server.url, payloads, headers):
+                _print_result(threads, result)
+                report["results"].append({"threads": threads, **result})
+        finally:
+            server.stop()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {args.output}")
+
+
+def _point_key(result: dict) -> tuple:
+    return result["threads"], result["mode"], result[result["mode"]]
+
+
+def cmd_compare(args) -> None:
+    """Print the change of every load point present in both reports."""
+    base = json.loads(Path(args.baseline).read_text())
+    new = json.loads(Path(args.candidate).read_text())
+    base_points = {_point_key(r): r for r in base["results"]}
+    print(f"{base.get('git_commit')} -> {new.get('git_commit')} ({new['service']})")
+    for result in new["results"]:
+        before = base_points.get(_point_key(result))
+        if before is None:
+            continue
+        threads, mode, value = _point_key(result)
+        changes = []
+        for label, old, cur in [
+            ("rps", before["throughput_rps"], result["throughput_rps"]),
+            ("p50", before["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            ("p90", before["latency_ms"]["p90"], result["latency_ms"]["p90"]),
+            ("p99", before["latency_ms"]["p99"], result["latency_ms"]["p99"]),
+        ]:
+            if old is None or cur is None:
+                changes.append(f"{label} {old}->{cur}")
+                continue
+            delta = f"{(cur - old) / old:+.1%}" if old else "n/a"
+            changes.append(f"{label} {old:g}->{cur:g} ({delta})")
+        changes.append(f"errors {before['error_rate']:.2%}->{result['error_rate']:.2%}")
+        print(f"threads={threads} {mode}={value:g}: " + ", ".join(changes))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="benchmark a service and write a report")
+    run.add_argument("--service", choices=sorted(SERVICES), required=True)
+    run.add_argument(
+        "--url", help="benchmark a running instance (default: the service's local port)"
+    )
+    run.add_argument(
+        "--threads",
+        help="comma-separated *_NUM_THREADS values; starts a local uvicorn per value",
+    )
+    run.add_argument("--port", type=int, help="port for the local uvicorn instances")
+    run.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="extra env for local instances",
+    )
+    run.add_argument("--concurrency", help="comma-separated closed-loop client counts")
+    run.add_argument(
+        "--rate", help="comma-separated open-loop request rates (requests/s)"
+    )
+    run.add_argument(
+        "--duration", type=float, default=30.0, help="measured seconds per load point"
+    )
+    run.add_argument(
+        "--warmup",
+        type=float,
+        default=5.0,
+        help="unmeasured seconds before each load point",
+    )
+    run.add_argument(
+        "--corpus", help="directory of sample pages (default: synthetic pages)"
+    )
+    run.add_argument(
+        "--tenant", default="bench", help="X-Tenant-ID sent with every request"
+    )
+    run.add_argument(
+        "--use-cache", action="store_true", help="do not send X-Cache-Bypass"
+    )
+    run.add_argument(
+        "--timeout", type=float, default=120.0, help="per-request timeout in seconds"
+    )
+    run.add_argument(
+        "--max-inflight",
+        type=int,
+        default=256,
+        help="client threads for open-loop load",
+    )
+    run.add_argument(
+        "--ready-timeout", type=float, default=600.0, help="seconds to wait for /readyz"
+    )
+    run.add_argument("--output", help="write the JSON report here")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="compare two reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()